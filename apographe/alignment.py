@@ -0,0 +1,356 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Align places with a gazetteer held locally, using spatial and name indexes
+"""
+
+from apographe.cells import CellIndex, DEFAULT_RESOLUTION, expand_each
+from apographe.languages_and_scripts import name_keys
+from apographe.linked_places_format import derive_all
+from apographe.storage import pool_size
+from apographe.text import phonetic_key
+from concurrent.futures import ProcessPoolExecutor
+import logging
+from math import ceil
+
+logger = logging.getLogger(__name__)
+
+# most internal places matched in one task when aligning across processes
+ALIGN_BATCH = 2000
+NAME_MODES = ("exact", "phonetic", "similar", "none")
+# size of the q-grams compared to find similar names, and their padding
+QGRAM_SIZE = 2
+QGRAM_PAD = "#"
+# least similarity of names matched by names="similar" unless another is given
+DEFAULT_THRESHOLD = 0.75
+# most candidate places whose names are compared directly, not through q-grams
+SCAN_LIMIT = 32
+
+# indexes of the gazetteer aligned against, in each worker process
+_worker_indexes = None
+
+
+def name_slugs(place):
+    """
+    The set of (non-empty) name slugs of a place's names and title: the match
+    keys kept by its NameCollection and Properties (see text.name_key).
+    """
+    slugs = set(place.names.match_keys)
+    if place.properties.title_key:
+        slugs.add(place.properties.title_key)
+    return slugs
+
+
+def phonetic_slugs(place):
+    """
+    The set of phonetic keys (see text.phonetic_key) of a place's names and
+    title. Names and titles with no Latin form are keyed by their romanizations
+    (see languages_and_scripts.name_keys).
+    """
+    slugs = set(place.names.phonetic_keys)
+    for name in place.names.unromanized:
+        for s in name.name_strings:
+            slugs.update(name_keys(s, name.language_subtag or "und")[1])
+    title_key = place.properties.title_key
+    if title_key:
+        slug = phonetic_key(title_key)
+        if slug:
+            slugs.add(slug)
+        else:
+            slugs.update(name_keys(place.properties.title)[1])
+    return slugs
+
+
+def qgrams(slug: str, q: int = QGRAM_SIZE):
+    """The set of q-grams of a slug, padded so its ends count as q-grams too."""
+    padded = f"{QGRAM_PAD * (q - 1)}{slug}{QGRAM_PAD * (q - 1)}"
+    return frozenset(padded[i : i + q] for i in range(len(padded) - q + 1))
+
+
+def similarity(slug: str, other: str, q: int = QGRAM_SIZE):
+    """The Dice coefficient of the q-grams of two slugs, from 0.0 to 1.0."""
+    return _dice(qgrams(slug, q), qgrams(other, q))
+
+
+def _dice(grams: frozenset, other_grams: frozenset):
+    return 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+
+
+class NameIndex:
+    """
+    Keys of places, indexed by the slugs of their names (see name_slugs, or
+    phonetic_slugs), with an inverted index of the slugs' q-grams for finding
+    similar slugs (built when first needed).
+    """
+
+    def __init__(self):
+        self._slugs = dict()  # sets of place keys, by name slug
+        self._key_slugs = dict()  # sets of name slugs, by place key
+        self._grams = None  # sets of slugs, by q-gram
+        self._slug_grams = dict()  # q-grams, by slug
+
+    def add(self, key, slugs):
+        """Index the place with key under each of slugs."""
+        for slug in slugs:
+            try:
+                self._slugs[slug].add(key)
+            except KeyError:
+                self._slugs[slug] = {key}
+                if self._grams is not None:
+                    self._add_grams(slug)
+            try:
+                self._key_slugs[key].add(slug)
+            except KeyError:
+                self._key_slugs[key] = {slug}
+
+    def add_places(self, places: dict, slugs_of=name_slugs):
+        """
+        Index each of places, a dictionary of places by key, under the slugs
+        slugs_of returns for it.
+        """
+        for key, place in places.items():
+            self.add(key, slugs_of(place))
+
+    def lookup(self, slugs, among: set = None):
+        """
+        Get the set of keys of places with any of slugs, limited to the keys in
+        among if it is given (which is cheaper than filtering afterwards when a
+        slug is shared by many places).
+        """
+        result = set()
+        for slug in slugs:
+            try:
+                keys = self._slugs[slug]
+            except KeyError:
+                continue
+            if among is None:
+                result.update(keys)
+            else:
+                result.update(among & keys)
+        return result
+
+    def similar(self, slug: str, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Get the indexed slugs whose similarity() to slug is at least threshold,
+        as a dictionary of scores by slug. Two slugs can only be that similar if
+        they share a minimum number of q-grams, so candidates are drawn only from
+        the postings of the rarest of slug's q-grams that any such slug must
+        include, and then scored.
+        """
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError(
+                f"Expected a similarity threshold above 0 and at most 1 but got "
+                f"{threshold}."
+            )
+        if self._grams is None:
+            self._grams = dict()
+            for other in self._slugs:
+                self._add_grams(other)
+        grams = qgrams(slug)
+        n = len(grams)
+        # sharing s of its m q-grams, a slug scores at most 2s / (n + s), and at
+        # most 2m / (n + m) or 2n / (n + m), which bounds both s and m
+        needed = ceil(threshold * n / (2.0 - threshold) - 1e-9)
+        longest = n * (2.0 - threshold) / threshold + 1e-9
+        postings = sorted([self._grams.get(gram, set()) for gram in grams], key=len)
+        scores = dict()
+        for other in set().union(*postings[: n - needed + 1]):
+            other_grams = self._slug_grams[other]
+            m = len(other_grams)
+            if m < needed or m > longest:
+                continue
+            score = 2 * len(grams & other_grams) / (n + m)
+            if score >= threshold:
+                scores[other] = score
+        return scores
+
+    def match(self, slugs, threshold: float = 1.0, among: set = None):
+        """
+        Get the keys of places with a slug at least threshold similar to any of
+        slugs (see similar; a threshold of 1.0 requires equal slugs), limited to
+        the keys in among if it is given. Returns a dictionary of each key's best
+        score. When among holds no more than SCAN_LIMIT keys, their slugs are
+        scored directly rather than searched for in the q-gram index.
+        """
+        result = dict()
+        if threshold < 1.0 and among is not None and len(among) <= SCAN_LIMIT:
+            all_grams = [qgrams(slug) for slug in slugs]
+            for key in among:
+                for other in self._key_slugs.get(key, ()):
+                    other_grams = qgrams(other)
+                    for grams in all_grams:
+                        score = _dice(grams, other_grams)
+                        if score >= threshold and score > result.get(key, 0.0):
+                            result[key] = score
+            return result
+        for slug in slugs:
+            if threshold >= 1.0:
+                similar = {slug: 1.0} if slug in self._slugs else dict()
+            else:
+                similar = self.similar(slug, threshold)
+            for other, score in similar.items():
+                keys = self._slugs[other]
+                if among is not None:
+                    keys = among & keys
+                for key in keys:
+                    if score > result.get(key, 0.0):
+                        result[key] = score
+        return result
+
+    def _add_grams(self, slug: str):
+        grams = qgrams(slug)
+        self._slug_grams[slug] = grams
+        for gram in grams:
+            try:
+                self._grams[gram].add(slug)
+            except KeyError:
+                self._grams[gram] = {slug}
+
+    def __contains__(self, slug):
+        return slug in self._slugs
+
+    def __len__(self):
+        return len(self._slugs)
+
+
+class LocalGazetteer:
+    """
+    A gazetteer read from the local filesystem (see Manager.load), with the
+    spatial and name indexes used to align other places with it. Indexes are
+    built when first needed and kept.
+    """
+
+    def __init__(self, places: dict, path=None):
+        self.places = places  # places by key
+        self.path = path
+        self._cell_indexes = dict()  # by resolution
+        self._name_index = None
+        self._phonetic_index = None
+
+    def cell_index(self, resolution: int = DEFAULT_RESOLUTION):
+        """Get the CellIndex of these places at resolution."""
+        try:
+            return self._cell_indexes[resolution]
+        except KeyError:
+            pass
+        derive_all(list(self.places.values()))
+        index = CellIndex(resolution)
+        index.add_places(self.places)
+        self._cell_indexes[resolution] = index
+        logger.debug(
+            f"indexed {len(self.places)} places in {len(index)} cells at "
+            f"resolution {resolution}"
+        )
+        return index
+
+    @property
+    def name_index(self):
+        """Get the NameIndex of these places."""
+        if self._name_index is None:
+            self._name_index = NameIndex()
+            self._name_index.add_places(self.places)
+        return self._name_index
+
+    @property
+    def phonetic_index(self):
+        """Get the NameIndex of these places by phonetic_slugs."""
+        if self._phonetic_index is None:
+            self._phonetic_index = NameIndex()
+            self._phonetic_index.add_places(self.places, phonetic_slugs)
+        return self._phonetic_index
+
+    def __len__(self):
+        return len(self.places)
+
+
+def align_places(
+    places: dict,
+    gazetteer: LocalGazetteer,
+    names: str = "exact",
+    resolution: int = DEFAULT_RESOLUTION,
+    rings: int = 1,
+    processes: int = 1,
+    threshold: float = DEFAULT_THRESHOLD,
+):
+    """
+    Align each of places (a dictionary of places by key) with the places of a
+    LocalGazetteer. Candidates share a cell of resolution with the place, once
+    its cells are expanded by rings of neighbors (see CellIndex.join); with
+    names="exact", they must also share a name slug with it, with
+    names="phonetic", a phonetic slug (see phonetic_slugs), and with
+    names="similar", a name slug at least threshold similar to one of its own
+    (see NameIndex.similar). Both sides are indexed, so no pair of places is
+    compared directly. With processes other than 1 (0 for one per core),
+    batches of places are matched across a pool of processes, each holding a
+    copy of the gazetteer's indexes. Returns a dictionary, by key of place, of
+    lists of (gazetteer key, name score) in order of descending score, then
+    key; the score is None with names="none".
+    """
+    if names not in NAME_MODES:
+        raise NotImplementedError(f"name_mode = {names} is not supported")
+    if names != "similar":
+        threshold = 1.0
+    keys = list(places.keys())
+    derive_all(list(places.values()))
+    cell_index = gazetteer.cell_index(resolution)
+    name_index = None
+    slugs = [None] * len(keys)
+    if names == "phonetic":
+        name_index = gazetteer.phonetic_index
+        slugs = [phonetic_slugs(places[k]) for k in keys]
+    elif names != "none":
+        name_index = gazetteer.name_index
+        slugs = [name_slugs(places[k]) for k in keys]
+    cells = expand_each(list(cell_index.covers(places).values()), rings)
+    processes = pool_size(processes)
+    batches = [
+        (cells[i : i + ALIGN_BATCH], slugs[i : i + ALIGN_BATCH], threshold)
+        for i in range(0, len(keys), ALIGN_BATCH)
+    ]
+    if processes == 1 or len(batches) < 2:
+        results = [_match(*batch, cell_index, name_index) for batch in batches]
+    else:
+        logger.debug(
+            f"aligning {len(keys)} places with {len(gazetteer)} places "
+            f"using {processes} processes"
+        )
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_worker,
+            initargs=(cell_index, name_index),
+        ) as executor:
+            results = list(executor.map(_match_batch, batches))
+    matches = [m for batch_matches in results for m in batch_matches]
+    return dict(zip(keys, matches))
+
+
+def _init_worker(cell_index, name_index):
+    global _worker_indexes
+    _worker_indexes = (cell_index, name_index)
+
+
+def _match_batch(batch: tuple):
+    """
+    Match a batch of (expanded cells, name slugs, threshold) against the
+    worker's indexes.
+    """
+    return _match(*batch, *_worker_indexes)
+
+
+def _match(all_cells: list, all_slugs: list, threshold: float, cell_index, name_index):
+    matches = list()
+    for cells, slugs in zip(all_cells, all_slugs):
+        candidates = cell_index.lookup(cells)
+        if name_index is None:
+            matches.append([(key, None) for key in sorted(candidates)])
+            continue
+        scores = dict()
+        if candidates:
+            scores = name_index.match(slugs, threshold, among=candidates)
+        matches.append(sorted(scores.items(), key=lambda item: (-item[1], item[0])))
+    return matches
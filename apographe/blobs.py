@@ -0,0 +1,73 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Content-addressed storage of place payloads on the local filesystem
+"""
+
+from hashlib import sha256
+import json
+import logging
+from pathlib import Path
+from uuid import uuid4
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+def encode_payload(data):
+    """Serialize a JSON-compatible payload to compact, canonical UTF-8 bytes."""
+    return json.dumps(
+        data, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def decode_payload(content: bytes):
+    """Reverse encode_payload()."""
+    return json.loads(content.decode("utf-8"))
+
+
+class BlobStore:
+    """
+    A directory of zlib-compressed blobs, each named by the SHA-256 digest of its
+    uncompressed content. Identical payloads are stored once, and a blob never
+    changes once written, so blobs can be shared safely across processes.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path).expanduser().resolve()
+
+    def filepath(self, key: str):
+        """Determine where the blob with key is stored."""
+        return self.path / key[:2] / key
+
+    def put(self, content: bytes):
+        """Store content (if not already stored) and return its key."""
+        key = sha256(content).hexdigest()
+        filepath = self.filepath(key)
+        if not filepath.exists():
+            filepath.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = filepath.with_name(f"{key}.{uuid4().hex}.tmp")
+            with open(tmp_path, "wb") as fp:
+                fp.write(zlib.compress(content))
+            del fp
+            tmp_path.replace(filepath)
+            logger.debug(f"stored blob {key}")
+        return key
+
+    def get(self, key: str):
+        """Return the content stored under key or raise KeyError."""
+        try:
+            with open(self.filepath(key), "rb") as fp:
+                compressed = fp.read()
+            del fp
+        except FileNotFoundError:
+            raise KeyError(key)
+        return zlib.decompress(compressed)
+
+    def __contains__(self, key):
+        return self.filepath(key).exists()
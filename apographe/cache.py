@@ -0,0 +1,184 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+In-process caches of parsed places and place responses
+"""
+
+from collections import OrderedDict
+from hashlib import md5
+import logging
+from threading import Lock
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PLACES = 2048
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_MAX_RESPONSES = 4096
+
+
+def response_validator(response):
+    """
+    Get a string that changes whenever the content of a response changes.
+    Prefer the ETag or Last-Modified headers; fall back on a digest of the body.
+    """
+    for header in ["ETag", "Last-Modified"]:
+        try:
+            v = response.headers[header]
+        except KeyError:
+            continue
+        if v:
+            return f"{header}:{v}"
+    return f"md5:{md5(response.content).hexdigest()}"
+
+
+class PlaceCache:
+    """
+    Least-recently-used cache of fully constructed Place objects.
+    Entries are evicted when either the number of places or their estimated
+    size in bytes exceeds the configured maximum. Cached places must be treated
+    as read-only: hand out place.copy() rather than the cached object.
+    """
+
+    def __init__(
+        self, max_places: int = DEFAULT_MAX_PLACES, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.max_places = max_places
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached place for key or raise KeyError."""
+        with self._lock:
+            try:
+                place, size = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return place
+
+    def put(self, key, place, size: int = 0):
+        """Store place under key, evicting least-recently-used entries as needed."""
+        if size > self.max_bytes or self.max_places < 1:
+            return
+        with self._lock:
+            try:
+                old_place, old_size = self._entries.pop(key)
+            except KeyError:
+                pass
+            else:
+                self._bytes -= old_size
+            self._entries[key] = (place, size)
+            self._bytes += size
+            while (
+                len(self._entries) > self.max_places or self._bytes > self.max_bytes
+            ):
+                evicted_key, (evicted_place, evicted_size) = self._entries.popitem(
+                    last=False
+                )
+                self._bytes -= evicted_size
+                self.evictions += 1
+                logger.debug(f"evicted {evicted_key} ({evicted_size} bytes)")
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries = OrderedDict()
+            self._bytes = 0
+
+    def items(self):
+        """
+        List (key, place) for each entry, least recently used first, without
+        counting as use.
+        """
+        with self._lock:
+            return [(key, place) for key, (place, size) in self._entries.items()]
+
+    @property
+    def size(self):
+        """Report the estimated size of the cached places in bytes."""
+        return self._bytes
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseStore:
+    """
+    The most recent response for each place URI, so that a web backend can
+    serve it immediately (even if stale) while revalidating in the background.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_RESPONSES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._revalidating = set()
+        self._lock = Lock()
+
+    def get(self, uri: str):
+        """Return (response, age in seconds) for uri or raise KeyError."""
+        with self._lock:
+            response, stored = self._entries[uri]
+            self._entries.move_to_end(uri)
+            return (response, monotonic() - stored)
+
+    def put(self, uri: str, response):
+        """Store response as the current version of uri."""
+        with self._lock:
+            self._entries[uri] = (response, monotonic())
+            self._entries.move_to_end(uri)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, uri: str):
+        """Mark the stored response for uri as fresh (e.g., after 304 Not Modified)."""
+        with self._lock:
+            try:
+                response, stored = self._entries[uri]
+            except KeyError:
+                return
+            self._entries[uri] = (response, monotonic())
+
+    def claim(self, uri: str):
+        """Claim revalidation of uri; return False if it is already under way."""
+        with self._lock:
+            if uri in self._revalidating:
+                return False
+            self._revalidating.add(uri)
+            return True
+
+    def release(self, uri: str):
+        """Mark revalidation of uri as finished."""
+        with self._lock:
+            self._revalidating.discard(uri)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._entries = OrderedDict()
+
+    def __contains__(self, uri):
+        return uri in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# shared by all gazetteer interfaces in this process
+place_cache = PlaceCache()
+response_store = ResponseStore()
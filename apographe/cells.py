@@ -0,0 +1,328 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Hierarchical spatial cell keys (geohashes) and cell-keyed indexes of places
+"""
+
+from bisect import bisect_left
+import logging
+from math import ceil
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# precision of the cell key kept with each place's derived geometry (~5 m)
+CELL_PRECISION = 9
+# default precision of cells joined on when aligning (~5 km)
+DEFAULT_RESOLUTION = 5
+# most cells used to cover one place's bounds before coarser cells are used
+MAX_COVER_CELLS = 256
+# approximate length of a degree of latitude, in meters
+METERS_PER_DEGREE = 111320.0
+
+_ALPHABET_CODES = np.frombuffer(ALPHABET.encode("ascii"), dtype=np.uint8)
+_DIGITS = np.full(256, -1, dtype=np.int64)
+_DIGITS[_ALPHABET_CODES] = np.arange(len(ALPHABET))
+
+
+def _bits(precision):
+    """Number of (longitude, latitude) bits in cells of precision."""
+    precision = np.asarray(precision, dtype=np.int64)
+    return ((5 * precision + 1) // 2, (5 * precision) // 2)
+
+
+def _indices(lons, lats, precision):
+    """Column and row, in the grid of cells of precision, of each coordinate."""
+    lon_bits, lat_bits = _bits(precision)
+    columns = np.left_shift(1, lon_bits)
+    rows = np.left_shift(1, lat_bits)
+    x = np.floor((np.asarray(lons, dtype=float) + 180.0) / 360.0 * columns)
+    y = np.floor((np.asarray(lats, dtype=float) + 90.0) / 180.0 * rows)
+    return (
+        np.clip(x, 0, columns - 1).astype(np.int64),
+        np.clip(y, 0, rows - 1).astype(np.int64),
+    )
+
+
+def _hash(x, y, precision: int):
+    """The cells of precision at each column x and row y of its grid."""
+    x = np.asarray(x, dtype=np.int64)
+    y = np.asarray(y, dtype=np.int64)
+    lon_bits, lat_bits = (int(b) for b in _bits(precision))
+    code = np.zeros(x.shape, dtype=np.int64)
+    for k in range(5 * precision):
+        if k % 2:
+            bit = np.right_shift(y, lat_bits - 1 - k // 2) & 1
+        else:
+            bit = np.right_shift(x, lon_bits - 1 - k // 2) & 1
+        code = np.left_shift(code, 1) | bit
+    shifts = 5 * np.arange(precision - 1, -1, -1, dtype=np.int64)
+    digits = np.right_shift(code.reshape(-1, 1), shifts) & 31
+    characters = np.ascontiguousarray(_ALPHABET_CODES[digits])
+    return characters.view(f"S{precision}").reshape(-1).astype(str).tolist()
+
+
+def _unhash(cells: list, precision: int):
+    """Reverse _hash() for a list of cells of the same precision."""
+    content = "".join(cells).encode("ascii")
+    digits = _DIGITS[np.frombuffer(content, dtype=np.uint8)].reshape(-1, precision)
+    if (digits < 0).any():
+        raise ValueError(f"Invalid cell in {cells}.")
+    lon_bits, lat_bits = (int(b) for b in _bits(precision))
+    x = np.zeros(len(cells), dtype=np.int64)
+    y = np.zeros(len(cells), dtype=np.int64)
+    for k in range(5 * precision):
+        bit = np.right_shift(digits[:, k // 5], 4 - k % 5) & 1
+        if k % 2:
+            y = np.left_shift(y, 1) | bit
+        else:
+            x = np.left_shift(x, 1) | bit
+    return (x, y)
+
+
+def encode(lons, lats, precision: int = CELL_PRECISION):
+    """
+    Get the geohash cell of precision (1 to 12 characters) that contains each of
+    a sequence of WGS84 coordinates. A cell's prefixes are the coarser cells that
+    contain it.
+    """
+    if not 0 < precision <= 12:
+        raise ValueError(
+            f"Expected a cell precision from 1 to 12 but got {precision}."
+        )
+    x, y = _indices(lons, lats, precision)
+    return _hash(x.reshape(-1), y.reshape(-1), precision)
+
+
+def cell_bounds(cell: str):
+    """The (west, south, east, north) bounds of a cell, in degrees."""
+    precision = len(cell)
+    (x,), (y,) = _unhash([cell], precision)
+    width, height = cell_size(precision)
+    west = -180.0 + int(x) * width
+    south = -90.0 + int(y) * height
+    return (west, south, west + width, south + height)
+
+
+def cell_size(precision: int):
+    """The (width, height) of cells of precision, in degrees."""
+    lon_bits, lat_bits = (int(b) for b in _bits(precision))
+    return (360.0 / (1 << lon_bits), 180.0 / (1 << lat_bits))
+
+
+def expand(cells, rings: int = 1):
+    """
+    Get the set of cells within rings of each of cells (including the cells
+    themselves), at each cell's own precision, so cells of mixed precision can
+    be expanded together. Rings wrap around the antimeridian and stop at the
+    poles.
+    """
+    return expand_each([cells], rings)[0]
+
+
+def expand_each(groups: list, rings: int):
+    """Get expand() of each of a list of groups of cells, in one batch."""
+    result = [set(cells) for cells in groups]
+    if rings < 1:
+        return result
+    by_precision = dict()
+    for i, cells in enumerate(result):
+        for cell in cells:
+            try:
+                by_precision[len(cell)].append((i, cell))
+            except KeyError:
+                by_precision[len(cell)] = [(i, cell)]
+    offsets = np.arange(-rings, rings + 1)
+    dx, dy = (d.reshape(-1) for d in np.meshgrid(offsets, offsets))
+    for precision, these in by_precision.items():
+        lon_bits, lat_bits = (int(b) for b in _bits(precision))
+        owners = np.array([i for i, cell in these], dtype=np.int64)
+        x, y = _unhash([cell for i, cell in these], precision)
+        x = (x.reshape(-1, 1) + dx) % (1 << lon_bits)
+        y = y.reshape(-1, 1) + dy
+        inside = (y >= 0) & (y < (1 << lat_bits))
+        owners = np.broadcast_to(owners.reshape(-1, 1), x.shape)[inside].tolist()
+        for i, cell in zip(owners, _hash(x[inside], y[inside], precision)):
+            result[i].add(cell)
+    return result
+
+
+def rings_for_distance(distance: float, precision: int = DEFAULT_RESOLUTION):
+    """
+    The number of rings of cells of precision (see expand()) that reach at least
+    distance (in meters) north and south of a cell; at least one.
+    """
+    cell_height = cell_size(precision)[1] * METERS_PER_DEGREE
+    return max(1, ceil(distance / cell_height))
+
+
+def neighbors(cell: str):
+    """The set of cells adjacent to cell, at its precision."""
+    return expand([cell]) - {cell}
+
+
+def covering_cells(
+    bounds, precision: int = DEFAULT_RESOLUTION, max_cells: int = MAX_COVER_CELLS
+):
+    """
+    Get the cells that cover each of a sequence of (west, south, east, north)
+    bounds, as a list of lists of cells. Bounds with west greater than east cross
+    the antimeridian (see geo.bubble_bounds). Where more than max_cells cells of
+    precision would be needed, coarser cells are used instead. Bounds with no
+    extent (NaN) get no cells.
+    """
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    valid = ~np.isnan(bounds).any(axis=1)
+    bounds = np.where(valid.reshape(-1, 1), bounds, 0.0)
+    crossing = bounds[:, 0] > bounds[:, 2]
+    precisions = np.full(len(bounds), precision, dtype=np.int64)
+    while True:
+        x0, y0 = _indices(bounds[:, 0], bounds[:, 1], precisions)
+        x1, y1 = _indices(bounds[:, 2], bounds[:, 3], precisions)
+        columns = np.left_shift(1, _bits(precisions)[0])
+        widths = np.where(crossing, x1 + columns - x0, x1 - x0) + 1
+        widths = np.minimum(widths, columns)
+        counts = widths * (y1 - y0 + 1)
+        coarsen = valid & (counts > max_cells) & (precisions > 1)
+        if not coarsen.any():
+            break
+        precisions[coarsen] -= 1
+    counts[~valid] = 0
+    result = [list() for i in range(len(bounds))]
+    if not counts.any():
+        return result
+    # enumerate the cells of all bounds at once, without a Python loop
+    owners = np.repeat(np.arange(len(bounds)), counts)
+    starts = np.cumsum(counts) - counts
+    local = np.arange(counts.sum()) - starts[owners]
+    xs = (x0[owners] + local % widths[owners]) % columns[owners]
+    ys = y0[owners] + local // widths[owners]
+    owner_precisions = precisions[owners]
+    for p in np.unique(owner_precisions).tolist():
+        selected = owner_precisions == p
+        cells = _hash(xs[selected], ys[selected], p)
+        for i, cell in zip(owners[selected].tolist(), cells):
+            result[i].append(cell)
+    return result
+
+
+def derived_cells(
+    derived: list, precision: int = DEFAULT_RESOLUTION, max_cells: int = MAX_COVER_CELLS
+):
+    """
+    Get the cells of precision that cover each of a list of DerivedGeometry (or
+    None), as covering_cells() would for their bounds. A point's cell is taken
+    from the cell key already derived for it.
+    """
+    result = [list() for d in derived]
+    extended = list()
+    for i, d in enumerate(derived):
+        if d is None:
+            continue
+        west, south, east, north = d.bounds
+        if west == east and south == north and precision <= len(d.cell):
+            result[i] = [d.cell[:precision]]
+        else:
+            extended.append(i)
+    if extended:
+        covers = covering_cells(
+            [derived[i].bounds for i in extended], precision, max_cells
+        )
+        for i, cells in zip(extended, covers):
+            result[i] = cells
+    return result
+
+
+class CellIndex:
+    """
+    Keys of items indexed by the cells that cover them at a fixed resolution,
+    for joining two sets of places on cell keys rather than searching a
+    gazetteer for each place. Items too large to cover with max_cells cells of
+    the resolution are indexed by coarser cells, so a lookup matches items whose
+    cells contain, or are contained by, the cells looked up.
+    """
+
+    def __init__(
+        self, resolution: int = DEFAULT_RESOLUTION, max_cells: int = MAX_COVER_CELLS
+    ):
+        self.resolution = resolution
+        self.max_cells = max_cells
+        self._cells = dict()  # sets of item keys, by cell
+        self._precisions = set()  # precisions of the cells indexed
+        self._sorted = None  # the indexed cells, in order, built when needed
+
+    def add(self, key, cells):
+        """Index the item with key under each of cells."""
+        for cell in cells:
+            try:
+                self._cells[cell].add(key)
+            except KeyError:
+                self._cells[cell] = {key}
+                self._precisions.add(len(cell))
+                self._sorted = None
+
+    def add_places(self, places: dict):
+        """
+        Index each of places, a dictionary of places by key, under the cells that
+        cover its geometry. Places without a geometry are skipped. Derive the
+        places' geometries in a batch first (see linked_places_format.derive_all)
+        to avoid deriving them one at a time.
+        """
+        for key, cells in self.covers(places).items():
+            self.add(key, cells)
+
+    def lookup(self, cells):
+        """Get the set of keys of items in, containing, or within any of cells."""
+        result = set()
+        precisions = sorted(self._precisions)
+        finest = max(precisions, default=0)
+        for cell in cells:
+            for precision in precisions:
+                if precision > len(cell):
+                    break
+                try:
+                    result.update(self._cells[cell[:precision]])
+                except KeyError:
+                    pass
+            if len(cell) < finest:
+                if self._sorted is None:
+                    self._sorted = sorted(self._cells)
+                i = bisect_left(self._sorted, cell)
+                while i < len(self._sorted) and self._sorted[i].startswith(cell):
+                    if len(self._sorted[i]) > len(cell):
+                        result.update(self._cells[self._sorted[i]])
+                    i += 1
+        return result
+
+    def join(self, places: dict, rings: int = 1):
+        """
+        Get, for each of places (a dictionary of places by key), the set of keys
+        of indexed items that share a cell with it, once its cells are expanded
+        by rings of neighboring cells (see expand()).
+        """
+        covers = self.covers(places)
+        expanded = expand_each(list(covers.values()), rings)
+        return {key: self.lookup(cells) for key, cells in zip(covers, expanded)}
+
+    def covers(self, places: dict):
+        """
+        Get the cells of the index's resolution that cover each of places (a
+        dictionary of places by key), by key.
+        """
+        keys = list(places.keys())
+        covers = derived_cells(
+            [places[k].derived for k in keys], self.resolution, self.max_cells
+        )
+        return dict(zip(keys, covers))
+
+    def __contains__(self, cell):
+        return cell in self._cells
+
+    def __len__(self):
+        return len(self._cells)
@@ -91,8 +91,12 @@ class EDHQuery(Query):
 
 
 class EDH(BackendWeb, Gazetteer):
-    def __init__(self):
-        Gazetteer.__init__(self, name="Pleiades")
+    def __init__(self, **overrides):
+        Gazetteer.__init__(
+            self,
+            name="Pleiades",
+            uri_prefixes=["edh.ub.uni-heidelberg.de/edh/geographie/"],
+        )
         kwargs = {
             "place_netloc": "edh.ub.uni-heidelberg.de",
             "place_scheme": "https",
@@ -102,6 +106,8 @@ class EDH(BackendWeb, Gazetteer):
             "search_scheme": "https",
             "search_path": "/data/api/geographie/suche",
         }
+        # e.g., place_netloc and place_scheme to point at a local test server
+        kwargs.update(overrides)
         BackendWeb.__init__(self, **kwargs)
 
     def get(self, id: str):
@@ -116,7 +122,10 @@ class EDH(BackendWeb, Gazetteer):
         return getattr(self, f"_edh_{backend}_search")(query)
 
     def _edh_web_get(self, id: str):
-        data = BackendWeb.get(self, id).json()
+        r = BackendWeb.get(self, id)
+        return self._web_place(id, r, self._edh_place)
+
+    def _edh_place(self, id: str, data: dict):
         from pprint import pformat
         import logging
 
@@ -0,0 +1,85 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Coalesce identical in-flight calls (single-flight)
+"""
+
+import logging
+from threading import Event, Lock
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """One in-flight call and its eventual outcome."""
+
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single call.
+    The first caller for a key does the work; callers arriving while it is
+    still in flight wait for it and share its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls = dict()
+
+    def do(self, key, func, *args, **kwargs):
+        """Call func(*args, **kwargs) unless a call for key is already in flight."""
+        with self._lock:
+            try:
+                call = self._calls[key]
+            except KeyError:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+            else:
+                call.waiters += 1
+                leader = False
+        if not leader:
+            logger.debug(f"joining in-flight call for {key}")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key)
+            call.done.set()
+        return call.result
+
+    def in_flight(self, key=None):
+        """Report the number of calls in flight (for key, if given)."""
+        with self._lock:
+            if key is None:
+                return len(self._calls)
+            try:
+                self._calls[key]
+            except KeyError:
+                return 0
+            return 1
+
+    def waiting(self, key):
+        """Report the number of callers waiting on the in-flight call for key."""
+        with self._lock:
+            try:
+                return self._calls[key].waiters
+            except KeyError:
+                return 0
@@ -10,13 +10,30 @@ Base class for gazetteers
 """
 
 from apographe.place import Place
+from urllib.parse import urlsplit
 
 
 class Gazetteer:
     """Base mixin for providing functionality common to gazetteers."""
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, uri_prefixes: list = None):
         self.name = name
+        # host and path (without scheme) that precede a place ID in the
+        # gazetteer's canonical place URIs, e.g. "pleiades.stoa.org/places/"
+        if uri_prefixes is None:
+            uri_prefixes = list()
+        self.uri_prefixes = uri_prefixes
+
+    def id_from_uri(self, uri: str):
+        """Get the place ID from one of this gazetteer's place URIs, or None."""
+        parts = urlsplit(uri)
+        path = f"{parts.netloc}{parts.path}"
+        for prefix in self.uri_prefixes:
+            if path.startswith(prefix):
+                id = path[len(prefix) :].split("/")[0]
+                if id:
+                    return id
+        return None
 
     def make_place(self, id: str, raw: dict):
         """Create a standardized place object"""
@@ -8,14 +8,61 @@
 geographic utilities
 """
 
+from apographe.cells import CELL_PRECISION, encode
+from hashlib import md5
 import logging
-from math import asin, atan2, cos, degrees, pi, radians, sin
+from math import pi
+import numpy as np
 from os import minor
+import shapely
+from shapely.errors import GEOSException
 from shapely.geometry import LineString, Point
-from shapely.ops import unary_union
+from shapely.geometry import shape as shapely_shape
 
 logger = logging.getLogger(__name__)
 
+EARTH_RADIUS = 6378137.0  # WGS84 mean radius, in meters
+# tolerance, in degrees, of the simplified footprint in a DerivedGeometry
+FOOTPRINT_TOLERANCE = 0.001
+
+
+def _bearings():
+    # accumulated exactly as the original scalar loop did, which yields 39
+    # bearings (the last a hair short of 2 pi), so results are unchanged
+    bearings = list()
+    bearing = 0.0
+    while bearing < 2.0 * pi:
+        bearings.append(bearing)
+        bearing += pi / 19.0
+    return np.array(bearings)
+
+
+# bearings (in radians) of the termini that outline a bubble
+BEARINGS = _bearings()
+
+
+def termini(lons, lats, distances):
+    """
+    Calculate the destination points at each of BEARINGS from each origin.
+    lons and lats are WGS84 degrees, distances are meters, and all three are
+    broadcast together. Returns (lons, lats) arrays of degrees with one more
+    dimension than the inputs, for the bearings.
+    """
+    lon = np.radians(np.asarray(lons, dtype=float))[..., np.newaxis]
+    lat = np.radians(np.asarray(lats, dtype=float))[..., np.newaxis]
+    angular_distance = (np.asarray(distances, dtype=float) / EARTH_RADIUS)[
+        ..., np.newaxis
+    ]
+    dest_lat = np.arcsin(
+        np.sin(lat) * np.cos(angular_distance)
+        + np.cos(lat) * np.sin(angular_distance) * np.cos(BEARINGS)
+    )
+    dest_lon = lon + np.arctan2(
+        np.sin(BEARINGS) * np.sin(angular_distance) * np.cos(lat),
+        np.cos(angular_distance) - np.sin(lat) * np.sin(dest_lat),
+    )
+    return (np.degrees(dest_lon), np.degrees(dest_lat))
+
 
 def bubble(
     origin_shape,
@@ -30,37 +77,313 @@ def bubble(
     buffer_distance and radius_minimum are in meters.
     returned shape is in WGS84 lat/lon
     """
-    origin = origin_shape.centroid
-    origin_lon = radians(origin.x)
-    origin_lat = radians(origin.y)
-    distance = max(
-        origin_shape.length / 2 * radius_multiplier + buffer_distance, radius_minimum
+    return bubbles(
+        [origin_shape],
+        buffer_distance=buffer_distance,
+        radius_multiplier=radius_multiplier,
+        radius_minimum=radius_minimum,
+        radius_maximum=radius_maximum,
+    )[0]
+
+
+def bubbles(
+    origin_shapes,
+    buffer_distance=0,
+    radius_multiplier=1,
+    radius_minimum=1,
+    radius_maximum=10000,
+):
+    """
+    Calculate bubble() for each of a sequence of shapes in one call.
+    The keyword arguments may be scalars or arrays with one value per shape.
+    Returns a numpy array of shapes.
+    """
+    shapes = _shape_array(origin_shapes)
+    result = np.empty(len(shapes), dtype=object)
+    if not len(shapes):
+        return result
+    origins = shapely.centroid(shapes)
+    distances = _radii(shapes, buffer_distance, radius_multiplier, radius_minimum)
+    lons, lats = termini(shapely.get_x(origins), shapely.get_y(origins), distances)
+    if logger.isEnabledFor(logging.DEBUG):
+        for x, y in zip(lons.ravel(), lats.ravel()):
+            logger.debug(f"terminus: POINT ({x} {y})")
+    # points get the hull of their termini, other shapes a buffered hull
+    points = _is_point(shapes)
+    if points.any():
+        coords = np.stack([lons[points], lats[points]], axis=-1)
+        result[points] = shapely.convex_hull(shapely.multipoints(coords))
+    others = ~points
+    if others.any():
+        d_dd = _hausdorff_distances(shapes[others], lons[others], lats[others])
+        result[others] = shapely.buffer(
+            shapely.convex_hull(shapes[others]), d_dd, quad_segs=16
+        )  # the resolution BaseGeometry.buffer() uses
+    return result
+
+
+def bubble_bounds(
+    origin_shapes,
+    buffer_distance=0,
+    radius_multiplier=1,
+    radius_minimum=1,
+    radius_maximum=10000,
+):
+    """
+    Calculate the bounds of bubbles() for a sequence of shapes without building
+    the bubbles. Returns an array with a (west, south, east, north) row of WGS84
+    degrees per shape. For a point, the bounds are those of the geodesic circle
+    around it; for other shapes, the shape's bounds are expanded by the distance
+    bubble() would buffer its hull. Longitudes are wrapped into [-180, 180], so a
+    west greater than east marks bounds that cross the antimeridian (see
+    split_bounds); bounds that reach a pole span all longitudes.
+    """
+    shapes = _shape_array(origin_shapes)
+    bounds = np.empty((len(shapes), 4))
+    if not len(shapes):
+        return bounds
+    origins = shapely.centroid(shapes)
+    origin_lons = shapely.get_x(origins)
+    origin_lats = shapely.get_y(origins)
+    distances = np.broadcast_to(
+        _radii(shapes, buffer_distance, radius_multiplier, radius_minimum),
+        (len(shapes),),
     )
-    earth_radius = 6378137.0  # WGS84 mean radius
-    angular_distance = distance / earth_radius
-    termini = list()
-    bearing = 0.0
-    while True:
-        if bearing >= 2.0 * pi:
-            break
-        dest_lat = asin(
-            sin(origin_lat) * cos(angular_distance)
-            + cos(origin_lat) * sin(angular_distance) * cos(bearing)
+    points = _is_point(shapes)
+    if points.any():
+        angular_distance = distances[points] / EARTH_RADIUS
+        lat = np.radians(origin_lats[points])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.sin(angular_distance) / np.cos(lat)
+        # circles that reach a pole are caught below; clip keeps arcsin quiet
+        ratio = np.clip(np.nan_to_num(ratio, nan=1.0), -1.0, 1.0)
+        delta_lon = np.degrees(np.arcsin(ratio))
+        bounds[points, 0] = origin_lons[points] - delta_lon
+        bounds[points, 1] = np.degrees(lat - angular_distance)
+        bounds[points, 2] = origin_lons[points] + delta_lon
+        bounds[points, 3] = np.degrees(lat + angular_distance)
+    others = ~points
+    if others.any():
+        lons, lats = termini(
+            origin_lons[others], origin_lats[others], distances[others]
         )
-        dest_lon = origin_lon + atan2(
-            sin(bearing) * sin(angular_distance) * cos(origin_lat),
-            cos(angular_distance) - sin(origin_lat) * sin(dest_lat),
+        d_dd = _hausdorff_distances(shapes[others], lons, lats)
+        bounds[others] = shapely.bounds(shapes[others]) + np.stack(
+            [-d_dd, -d_dd, d_dd, d_dd], axis=-1
         )
-        termini.append(Point(degrees(dest_lon), degrees(dest_lat)))
-        bearing += pi / 19.0
-    for t in termini:
-        logger.debug(f"terminus: {t.wkt}")
-    if isinstance(origin_shape, Point):
-        bub = unary_union(termini).convex_hull
-    else:
-        d_dd = max([t.hausdorff_distance(origin_shape) for t in termini])
-        bub = origin_shape.convex_hull.buffer(d_dd)
-    return bub
+    west, south, east, north = bounds.T
+    everywhere = (north >= 90.0) | (south <= -90.0) | (east - west >= 360.0)
+    west[everywhere] = -180.0
+    east[everywhere] = 180.0
+    west[west < -180.0] += 360.0
+    east[east > 180.0] -= 360.0
+    np.clip(south, -90.0, 90.0, out=south)
+    np.clip(north, -90.0, 90.0, out=north)
+    return bounds
+
+
+def split_bounds(bounds):
+    """
+    Split (west, south, east, north) bounds that cross the antimeridian into a
+    list of the two boxes on either side of it; other bounds are returned alone.
+    """
+    west, south, east, north = [float(v) for v in bounds]
+    if west > east:
+        return [(west, south, 180.0, north), (-180.0, south, east, north)]
+    return [(west, south, east, north)]
+
+
+def _shape_array(origin_shapes):
+    shapes = np.asarray(origin_shapes, dtype=object)
+    if shapes.ndim != 1:
+        shapes = shapes.reshape(-1)
+    return shapes
+
+
+def _is_point(shapes):
+    return np.array([isinstance(s, Point) for s in shapes], dtype=bool)
+
+
+def _radii(shapes, buffer_distance, radius_multiplier, radius_minimum):
+    """The bubble radius, in meters, for each of shapes."""
+    return np.maximum(
+        shapely.length(shapes) / 2 * np.asarray(radius_multiplier, dtype=float)
+        + np.asarray(buffer_distance, dtype=float),
+        np.asarray(radius_minimum, dtype=float),
+    )
+
+
+def _hausdorff_distances(shapes, lons, lats):
+    """
+    The largest Hausdorff distance, in degrees, between any of each shape's
+    termini and the shape. The (discrete) Hausdorff distance from a terminus to
+    a shape is its distance from the farthest vertex, so this is the largest over
+    all pairs of termini and vertices, found without building terminus points.
+    """
+    coords, index = shapely.get_coordinates(shapes, return_index=True)
+    vertex_distances = np.hypot(
+        lons[index] - coords[:, 0:1], lats[index] - coords[:, 1:2]
+    ).max(axis=1)
+    d_dd = np.zeros(len(shapes))
+    np.maximum.at(d_dd, index, vertex_distances)
+    return d_dd
+
+
+class DerivedGeometry:
+    """
+    Shapes and measures derived from a place's geometry, kept so that they need
+    not be recomputed: convex hull, centroid, bounds, representative point (one
+    guaranteed to lie on the geometry), a simplified footprint, and the cell
+    key (geohash) of the representative point, whose prefixes are the coarser
+    cells that contain it (see cells.encode()). key identifies the geometry they
+    were derived from (see geometry_key()).
+    """
+
+    __slots__ = (
+        "key",
+        "hull",
+        "centroid",
+        "bounds",
+        "representative_point",
+        "footprint",
+        "cell",
+    )
+
+    def __init__(
+        self, key, hull, centroid, bounds, representative_point, footprint, cell
+    ):
+        self.key = key
+        self.hull = hull
+        self.centroid = centroid
+        self.bounds = bounds
+        self.representative_point = representative_point
+        self.footprint = footprint
+        self.cell = cell
+
+
+def geometry_key(geometry):
+    """Identify a geometry by the MD5 digest of its WKB."""
+    return md5(shapely.to_wkb(geometry)).hexdigest()
+
+
+def derive_geometries(geometries, tolerance: float = FOOTPRINT_TOLERANCE):
+    """
+    Compute a DerivedGeometry for each of a sequence of geometries in one batch.
+    Footprints are simplified to tolerance (in degrees), preserving topology.
+    """
+    shapes = _shape_array(geometries)
+    keys = [md5(wkb).hexdigest() for wkb in shapely.to_wkb(shapes).tolist()]
+    hulls = shapely.convex_hull(shapes)
+    centroids = shapely.centroid(shapes)
+    bounds = shapely.bounds(shapes).tolist()
+    points = shapely.point_on_surface(shapes)
+    footprints = shapely.simplify(shapes, tolerance, preserve_topology=True)
+    return [
+        DerivedGeometry(*values)
+        for values in zip(
+            keys,
+            hulls.tolist(),
+            centroids.tolist(),
+            [tuple(b) for b in bounds],
+            points.tolist(),
+            footprints.tolist(),
+            point_cells(points),
+        )
+    ]
+
+
+def point_cells(points, precision: int = CELL_PRECISION):
+    """The cell of precision containing each of points; "" for empty points."""
+    points = _shape_array(points)
+    cells = [""] * len(points)
+    present = ~shapely.is_empty(points)
+    if present.any():
+        found = encode(
+            shapely.get_x(points[present]), shapely.get_y(points[present]), precision
+        )
+        for i, cell in zip(np.flatnonzero(present).tolist(), found):
+            cells[i] = cell
+    return cells
+
+
+def geometries_from_geojson(items):
+    """
+    Build shapely geometries from a sequence of GeoJSON geometry dictionaries.
+    Geometries of each type are gathered into coordinate arrays and built with
+    shapely's vectorized constructors (the members of geometry collections
+    included); any that cannot be (empty parts or mixed-dimension coordinates)
+    are built one at a time with shape(). Returns a numpy array of shapes in the
+    same order as items.
+    """
+    items = list(items)
+    result = np.empty(len(items), dtype=object)
+    positions = dict()
+    for i, item in enumerate(items):
+        try:
+            positions[item["type"]].append(i)
+        except KeyError:
+            positions[item["type"]] = [i]
+    for geom_type, these_positions in positions.items():
+        try:
+            if geom_type == "GeometryCollection":
+                members, index = _parts(
+                    [items[i]["geometries"] for i in these_positions]
+                )
+                built = shapely.geometrycollections(
+                    geometries_from_geojson(members), indices=index
+                )
+            else:
+                coordinates = [items[i]["coordinates"] for i in these_positions]
+                built = _GEOJSON_BUILDERS[geom_type](coordinates)
+            if len(built) != len(these_positions):
+                raise ValueError("empty parts")
+        except (KeyError, IndexError, TypeError, ValueError, GEOSException):
+            built = [shapely_shape(items[i]) for i in these_positions]
+        result[these_positions] = built
+    return result
+
+
+def _parts(items: list):
+    """Flatten items one level, with the index of the item each part belongs to."""
+    lengths = [len(item) for item in items]
+    if not all(lengths):
+        raise ValueError("empty parts")
+    flat = [part for item in items for part in item]
+    return (flat, np.repeat(np.arange(len(items)), lengths))
+
+
+def _points(coordinates: list):
+    return shapely.points(np.array(coordinates, dtype=float))
+
+
+def _linestrings(coordinates: list):
+    positions, index = _parts(coordinates)
+    return shapely.linestrings(np.array(positions, dtype=float), indices=index)
+
+
+def _polygons(coordinates: list):
+    rings, index = _parts(coordinates)
+    positions, ring_index = _parts(rings)
+    rings = shapely.linearrings(np.array(positions, dtype=float), indices=ring_index)
+    return shapely.polygons(rings, indices=index)
+
+
+def _multi(constructor, part_builder):
+    def build(coordinates: list):
+        parts, index = _parts(coordinates)
+        return constructor(part_builder(parts), indices=index)
+
+    return build
+
+
+_GEOJSON_BUILDERS = {
+    "Point": _points,
+    "LineString": _linestrings,
+    "Polygon": _polygons,
+    "MultiPoint": _multi(shapely.multipoints, _points),
+    "MultiLineString": _multi(shapely.multilinestrings, _linestrings),
+    "MultiPolygon": _multi(shapely.multipolygons, _polygons),
+}
 
 
 def axes(origin_shape):
@@ -39,8 +39,10 @@ class IDAIQuery(Query):
 class IDAI(BackendWeb, Gazetteer):
     """Interface for the iDAI Gazetteer of the German Archaeological Institute."""
 
-    def __init__(self):
-        Gazetteer.__init__(self, name="iDAI")
+    def __init__(self, **overrides):
+        Gazetteer.__init__(
+            self, name="iDAI", uri_prefixes=["gazetteer.dainst.org/place/"]
+        )
         # NB: iDAI sets the following response headers
         # Cache-Control: no-cache, no-store, max-age=0, must-revalidate
         # Expires: 0
@@ -59,6 +61,9 @@ class IDAI(BackendWeb, Gazetteer):
             "cache_control": False,
             "expire_after": 21600,
         }
+        # e.g., place_netloc and place_scheme to point at a local test server, or
+        # stale_while_revalidate to serve repeat place requests (see BackendWeb)
+        kwargs.update(overrides)
         BackendWeb.__init__(self, **kwargs)
 
     def get(self, id: str):
@@ -110,7 +115,10 @@ class IDAI(BackendWeb, Gazetteer):
         return list(d.values())
 
     def _idai_web_get(self, id: str):
-        data = BackendWeb.get(self, id).json()
+        r = BackendWeb.get(self, id)
+        return self._web_place(id, r, self._idai_place)
+
+    def _idai_place(self, id: str, data: dict):
         kwargs = self._kwargs_from_json(data)
         place = Place(id=id, raw=data, **kwargs)
         logger = logging.getLogger(self.__class__.__name__ + "._ida_web_get()")
@@ -127,6 +135,9 @@ class IDAI(BackendWeb, Gazetteer):
         names.extend([self._kwargs_from_json_name(n) for n in data["names"]])
         kwargs["names"] = self._dedupe_names(names)
         kwargs["geometries"] = [self._kwargs_from_json_geometry(data["prefLocation"])]
+        place_types = data.get("types") or []
+        if place_types:
+            kwargs["types"] = place_types
 
         desc = ""
         ancient_names = "/".join(
@@ -145,12 +156,11 @@ class IDAI(BackendWeb, Gazetteer):
             desc += f": {ancient_names}"
         if desc:
             desc += " ("
-        place_types = "; ".join(sorted([pt.replace("-", " ") for pt in data["types"]]))
-        desc += place_types
+        desc += "; ".join(sorted([pt.replace("-", " ") for pt in place_types]))
         if "(" in desc:
             desc += ")"
         kwargs["descriptions"] = [
-            {"value": desc, "lang_code": "en", "id": f"{data['@id']}"}
+            {"value": desc, "language_tag": "en", "id": f"{data['@id']}"}
         ]
         return kwargs
 
@@ -118,16 +118,44 @@ class Interpreter:
         Attempt to align one or more items in the internal gazetteer with items in an external gazetteer.
             > align {gazetteer name} {internal place id}
             > align {gazetteer name}
-            > align {gazetteer name} {internal place id} names:{"exact" | "similar" | "none" }
-              defaults to "exact"
+            > align {gazetteer name} {internal place id} names:{"exact" | "phonetic" | "similar" | "none" }
+              defaults to "exact"; "phonetic" also ignores doubled letters and
+              variant spellings, and matches names in other scripts by their romanizations
+            > align {gazetteer name} {internal place id} names:similar threshold:0.8
+              (names at least this similar, from 0 to 1, default 0.75; hits are scored)
             > align {gazetteer name} {internal place id} proximity:{positive integer meters | "none" }
               defaults to 2 x the geometric footprint of the internal place or 5k, whichever is larger
+            > align {gazetteer name} candidates:cells resolution:{1-12} rings:{n}
+              (match against the gazetteer's cached places by shared geohash cells of the
+              given resolution, default 5, and n rings of neighboring cells, default 1,
+              instead of searching the gazetteer; only places fetched this session and
+              still in the bounded place cache are candidates, so prefetch them first
+              or align with a dataset for a complete match)
+            > align {gazetteer name} {internal place id} top:3 min_score:0.5
+              (rank hits by a score from 0 to 1 combining distance, name similarity,
+              feature types, and descriptions, keeping the top n of each place, 0 for
+              all, that score at least min_score, default 0; also with a dataset)
+            > align dataset:{path} {internal place id}
+            > align dataset:~/pleiades.snapshot processes:0
+              (align with a gazetteer saved locally, in any form "load" reads, by shared
+              cells and names; accepts names, proximity, resolution, and rings as
+              above, and processes:N to read and match with N processes, 0 for one per core)
         """
-        if not (0 < len(args) < 3):
+        if "dataset" in kwargs:
+            if len(args) > 1:
+                raise UsageError(
+                    self,
+                    "align",
+                    f"Expected no more than one positional argument (internal id) with a dataset, "
+                    f"but got {len(args)} arguments.",
+                    *args,
+                    **kwargs,
+                )
+        elif not (0 < len(args) < 3):
             raise UsageError(
                 self,
                 "align",
-                f"Expected one or two positional arguments (gazetteer name and internal id) and up to two keyword arguments ('names' and 'proximity'), "
+                f"Expected one or two positional arguments (gazetteer name and internal id) and keyword arguments ('names', 'threshold', 'proximity', 'candidates', 'resolution', 'rings', 'top', 'min_score'), "
                 f"but got {len(args)} arguments.",
                 *args,
                 **kwargs,
@@ -137,16 +165,24 @@ class Interpreter:
         self.logger.error(pformat(hits, indent=4))
         for internal_id in sorted(list(hits.keys())):
             for h in hits[internal_id]:
+                # the ranking score if hits were ranked, else any name score
+                score = h.get("rank_score", h.get("score"))
                 rows.append(
                     (
                         f"[bold]{internal_id}[/bold]",
                         f"[bold]{h['id']}[/bold]",
+                        "" if score is None else f"{score:.2f}",
                         f"[bold]{h['title']}[/bold]\n{h['uri']}\n{h['summary']}",
                     )
                 )
         return self._rich_table(
             title=f"alignment results",
-            columns=(("Internal ID", {}), ("Gazetteer ID", {}), ("Summary", {})),
+            columns=(
+                ("Internal ID", {}),
+                ("Gazetteer ID", {}),
+                ("Score", {"justify": "right"}),
+                ("Summary", {}),
+            ),
             rows=rows,
         )
 
@@ -298,6 +334,12 @@ class Interpreter:
         Load LPF JSON files on the local filesystem into the internal gazetteer.
             > load /where/there/mygazetteer
             > load ~/gazetteers/thisgazetteer
+            > load ~/gazetteers/thisgazetteer lazy:true
+              (defer building names, descriptions, and geometries until each place is used)
+            > load ~/gazetteers/thisgazetteer processes:4
+              (read files with a pool of 4 processes; processes:0 for one per core)
+            > load ~/gazetteers/thisgazetteer.snapshot
+              (restore a snapshot made with "save snapshot")
         """
         if len(args) != 1:
             raise UsageError(
@@ -305,7 +347,79 @@ class Interpreter:
                 "load",
                 f"Expected one argument for the directory pathname to use in load the internal gazetteer, but instead got {len(args)} arguments.",
             )
-        return self.manager.load(args[0])
+        load_kwargs = dict()
+        for k, v in kwargs.items():
+            if k == "lazy":
+                load_kwargs[k] = v.lower() in ["true", "yes", "1"]
+            elif k == "processes":
+                load_kwargs[k] = int(v)
+            else:
+                raise UsageError(
+                    self, "load", f"unexpected argument '{k}'", *args, **kwargs
+                )
+        return self.manager.load(args[0], **load_kwargs)
+
+    def _cmd_prefetch(self, *args, **kwargs):
+        """
+        Warm the caches for places in a gazetteer in the background before accession or align.
+            > prefetch pleiades 295374 295375
+            > prefetch pleiades imports:pids
+              (prefetch all items in previously imported dataset "pids" - see "import")
+            > prefetch pleiades internal
+              (prefetch the places in the gazetteer referenced by the internal gazetteer)
+            > prefetch pleiades imports:pids state:~/pids-prefetch.json workers:2
+              (record progress in a particular file; repeat the command to resume)
+            > prefetch status
+            > prefetch stop pleiades
+        """
+        if not args:
+            raise UsageError(
+                self, "prefetch", "A gazetteer name is required.", *args, **kwargs
+            )
+        if args[0] == "status":
+            return self._rich_table(
+                title="Prefetch progress",
+                columns=(("gazetteer", {}), ("progress", {})),
+                rows=[
+                    (
+                        f"[bold]{p['gazetteer']}[/bold]",
+                        f"{p['done']} of {p['total']} done ({p['resumed']} resumed), "
+                        f"{p['failed']} failed, {p['remaining']} remaining\n"
+                        f"{p['rate']:.2f} places/second over {p['elapsed']:.1f} seconds"
+                        + (" (running)" if p["running"] else ""),
+                    )
+                    for p in self.manager.prefetch_status()
+                ],
+            )
+        if args[0] == "stop":
+            if len(args) != 2:
+                raise UsageError(
+                    self, "prefetch", "A gazetteer name is required.", *args, **kwargs
+                )
+            gazetteer_name = args[1].lower()
+            try:
+                self.manager.prefetches[gazetteer_name].stop()
+            except KeyError:
+                return f"There is no prefetch from {gazetteer_name} to stop."
+            return f"Stopping prefetch from {gazetteer_name}."
+        gazetteer_name = args[0].lower()
+        ids = [a for a in args[1:] if a != "internal"]
+        prefetch_kwargs = {"internal": "internal" in args[1:]}
+        for k, v in kwargs.items():
+            if k == "workers":
+                prefetch_kwargs[k] = int(v)
+            elif k in ["imports", "state"]:
+                prefetch_kwargs[k] = v
+            else:
+                raise UsageError(
+                    self, "prefetch", f"unexpected argument '{k}'", *args, **kwargs
+                )
+        try:
+            return self.manager.prefetch(gazetteer_name, *ids, **prefetch_kwargs)
+        except ValueError as err:
+            raise UsageError(self, "prefetch", str(err), *args, **kwargs)
+        except RuntimeError as err:
+            return str(err)
 
     def _cmd_quit(self, *args, **kwargs):
         """
@@ -323,6 +437,14 @@ class Interpreter:
               (saves all places to a single file named "mygazetteer.json" in the "there" directory)
             > save each ~/gazetteers/thisgazetteer
               (saves each place to a separate json file in the "thisgazetteer" directory)
+            > save each ~/gazetteers/thisgazetteer processes:4
+              (encode places with a pool of 4 processes; processes:0 for one per core)
+            > save shards ~/gazetteers/thisgazetteer
+              (saves places in files of about 1,000 places each, plus a manifest;
+              saving again only rewrites changed shards)
+            > save shards ~/gazetteers/thisgazetteer shard_size:5000
+            > save snapshot ~/gazetteers/thisgazetteer.snapshot
+              (saves a binary snapshot that loads much faster than LPF JSON)
         """
         if len(args) > 2:
             raise UsageError(
@@ -330,7 +452,15 @@ class Interpreter:
                 "save",
                 f"Expected no more than two arguments to use in saving the internal gazetteer, but instead got {len(args)} arguments.",
             )
-        return self.manager.save(*args)
+        save_kwargs = dict()
+        for k, v in kwargs.items():
+            if k in ["processes", "shard_size"]:
+                save_kwargs[k] = int(v)
+            else:
+                raise UsageError(
+                    self, "save", f"unexpected argument '{k}'", *args, **kwargs
+                )
+        return self.manager.save(*args, **save_kwargs)
 
     def _cmd_search(self, *args, **kwargs):
         """
@@ -9,11 +9,14 @@
 Metadata, vocabularies, and utilities for languages and scripts
 """
 from apographe.arabic_romanov import romanov
+from apographe.serialization import slot_names
+from apographe.text import name_key, phonetic_key
 
 # cltk does not work yet under python 3.10.x
 # from cltk.phonology.arabic import romanization as cltk_arabic_romanization
 
 # camel-tools does not work yet under python 3.10.x
+from functools import lru_cache
 import iuliia
 from language_tags import tags
 import logging
@@ -324,9 +327,75 @@ def romanize(s: str, language_code="und"):
     return romanizations
 
 
+@lru_cache(maxsize=65536)
+def name_keys(s: str, language_code="und"):
+    """
+    Get the match keys (see text.name_key) and phonetic keys (see
+    text.phonetic_key) of a name string, as a tuple of two frozensets. Strings
+    not in the Latin script are romanized first (see romanize) and keyed by
+    their romanizations as well. Each distinct string and language is keyed
+    once per process.
+    """
+    key = name_key(s)
+    keys = {key}
+    phonetic = {phonetic_key(key)}
+    if key and phonetic == {""}:
+        try:
+            romanizations = romanize(s, language_code)
+        except RuntimeError:
+            romanizations = set()  # a script without a romanizer
+        for r in romanizations:
+            key = name_key(r)
+            keys.add(key)
+            phonetic.add(phonetic_key(key))
+    keys.discard("")
+    phonetic.discard("")
+    return (frozenset(keys), frozenset(phonetic))
+
+
+# one shared (read-only) object per distinct language tag or subtag
+_interned_tags = dict()
+
+
+def intern_tag(tag):
+    """Get the shared instance of a language_tags Tag or Subtag equal to tag."""
+    if tag is None:
+        return None
+    key = (type(tag).__name__, getattr(tag, "type", None), tag.format)
+    return _interned_tags.setdefault(key, tag)
+
+
+@lru_cache(maxsize=4096)
+def parse_language_tag(value: str):
+    """
+    Parse a language tag and derive its subtags, once per distinct value per process.
+    Returns interned (tag, language subtag, region subtag, script subtag) objects,
+    falling back on the language's default script; raises ValueError if invalid.
+    """
+    tag = tags.tag(value)
+    if not tag.valid:
+        # eventually try to fix this
+        raise ValueError(
+            f"Invalid language tag '{value}': {'; '.join([str(e) for e in tag.errors])}"
+        )
+    language = intern_tag(tag.language)
+    script = intern_tag(tag.script)
+    if script is None and language is not None:
+        script = intern_tag(language.script)
+    return (intern_tag(tag), language, intern_tag(tag.region), script)
+
+
 class LanguageAware:
     """A mixin base class for making types language-aware."""
 
+    __slots__ = (
+        "_language_tag",
+        "_language_subtag",
+        "_script_subtag",
+        "_region_subtag",
+        "_extra",
+    )
+
     def __init__(self, **kwargs):
         self._language_tag = None
         self._language_subtag = None
@@ -336,8 +405,48 @@ class LanguageAware:
         for k, v in kwargs.items():
             try:
                 setattr(self, k, v)
+            except AttributeError:
+                if hasattr(type(self), k):
+                    continue  # e.g., a read-only property
+                # keep keys with no attribute of their own (e.g., "attested"
+                # in EDH names) so that they serialize as they came in
+                try:
+                    self._extra[k] = v
+                except AttributeError:
+                    self._extra = {k: v}
+
+    @property
+    def extra(self):
+        """Keyword values with no attribute of their own, by key."""
+        try:
+            return dict(self._extra)
+        except AttributeError:
+            return dict()
+
+    def __getstate__(self):
+        # pickle the tag string rather than the tag objects, so unpickled (or
+        # copied) instances share the interned objects of the receiving process
+        state = dict()
+        for name in slot_names(type(self)):
+            try:
+                state[name] = getattr(self, name)
             except AttributeError:
                 pass
+        for name in ["_language_subtag", "_script_subtag", "_region_subtag"]:
+            state.pop(name, None)
+        if state["_language_tag"] is not None:
+            state["_language_tag"] = state["_language_tag"].format
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        if self._language_tag is None:
+            self._language_subtag = None
+            self._script_subtag = None
+            self._region_subtag = None
+        else:
+            self.language_tag = self._language_tag
 
     @property
     def language_tag(self):
@@ -348,19 +457,12 @@ class LanguageAware:
 
     @language_tag.setter
     def language_tag(self, value: str):
-        tag = tags.tag(value)
-        if tag.valid:
-            self._language_tag = tag
-            self._language_subtag = tag.language
-            self._region_subtag = tag.region
-            self._script_subtag = tag.script
-            if self._script_subtag is None:
-                self._script_subtag = self._language_subtag.script
-        else:
-            # eventually try to fix this
-            raise ValueError(
-                f"Invalid language tag '{value}': {'; '.join([str(e) for e in tag.errors])}"
-            )
+        (
+            self._language_tag,
+            self._language_subtag,
+            self._region_subtag,
+            self._script_subtag,
+        ) = parse_language_tag(value)
 
     @property
     def language_subtag(self):
@@ -11,16 +11,17 @@ https://github.com/LinkedPasts/linked-places-format
 """
 
 from apographe.countries import ccodes_valid, country_names
+from apographe.geo import derive_geometries, geometries_from_geojson
 from apographe.languages_and_scripts import LanguageAware
 from apographe.serialization import Serialization, ApographeEncoder
-from apographe.text import normtext
-from copy import deepcopy
+from apographe.text import name_key, normtext, phonetic_key
 import geojson
 from hashlib import md5
 import json
 import logging
 from pathlib import Path
 from pprint import pformat
+from shapely.geometry.base import BaseGeometry
 from shapely.geometry.collection import GeometryCollection
 from shapely.geometry import mapping as shapely_mapping
 from shapely.geometry import shape as shapely_shape
@@ -39,8 +40,11 @@ def dump(obj, fp, ensure_ascii=True, indent=None, sort_keys=False):
     fp.write(dumps(obj, ensure_ascii=ensure_ascii, indent=indent, sort_keys=sort_keys))
 
 
-def dumps(obj, ensure_ascii=True, indent=None, sort_keys=False):
-    """Serialize obj to Linked Places Format GeoJSON and return as string."""
+def dumps(obj, ensure_ascii=True, indent=None, sort_keys=False, encoder=None):
+    """
+    Serialize obj to Linked Places Format GeoJSON and return as string.
+    Pass an ApographeEncoder as encoder to reuse it (and its settings) across calls.
+    """
     if not isinstance(obj, (list, Serialization)):
         raise TypeError(type(obj))
     dumpd = {
@@ -52,6 +56,8 @@ def dumps(obj, ensure_ascii=True, indent=None, sort_keys=False):
         dumpd["features"].extend(obj)
     else:
         dumpd["features"].append(obj)
+    if encoder is not None:
+        return encoder.encode(dumpd)
     return json.dumps(
         obj=dumpd,
         ensure_ascii=False,
@@ -68,12 +74,16 @@ def load(fp):
 
 
 class Description(LanguageAware, Serialization):
+    __slots__ = ("_description_key", "_value", "_source", "id")
+    _omit = Serialization._omit | {
+        "_description_key",
+        "_language_subtag",
+        "_script_subtag",
+        "_region_subtag",
+    }
+
     def __init__(self, value: str = "", source: str = "", **kwargs):
         LanguageAware.__init__(self, **kwargs)
-        Serialization.__init__(
-            self,
-            omit=["_name_key", "_language_subtag", "_script_subtag", "_region_subtag"],
-        )
         self._description_key = None
         self._value = ""
         self._source = ""
@@ -86,7 +96,7 @@ class Description(LanguageAware, Serialization):
         if self._description_key:
             return self._description_key
         else:
-            return md5(self._value.encode("utf-8"))
+            return md5(self._value.encode("utf-8")).hexdigest()
 
     @property
     def source(self):
@@ -138,6 +148,11 @@ class DescriptionCollection(Serialization):
     def descriptions(self):
         return list(self._descriptions.values())
 
+    @property
+    def words(self):
+        """The slugs of the words in these descriptions."""
+        return {word for word, keys in self._index.items() if word and keys}
+
     @descriptions.setter
     def descriptions(self, values):
         for description in values:
@@ -202,13 +217,16 @@ class DescriptionCollection(Serialization):
 
 
 class Name(LanguageAware, Serialization):
+    __slots__ = ("_romanizations", "_toponym", "_name_key", "id")
+    _omit = Serialization._omit | {
+        "_name_key",
+        "_language_subtag",
+        "_script_subtag",
+        "_region_subtag",
+    }
+
     def __init__(self, toponym: str = "", romanizations=[], **kwargs):
         LanguageAware.__init__(self, **kwargs)
-        Serialization.__init__(
-            self,
-            omit=["_name_key", "_language_subtag", "_script_subtag", "_region_subtag"],
-        )
-
         self._romanizations = set()
         self._toponym = None
         self._name_key = None
@@ -229,7 +247,7 @@ class Name(LanguageAware, Serialization):
 
     @property
     def name_strings(self):
-        strings = deepcopy(self._romanizations)
+        strings = set(self._romanizations)  # str values need no deep copy
         strings.add(self._toponym)
         strings = list(strings)
         strings = [s for s in strings if s]
@@ -270,11 +288,20 @@ class Name(LanguageAware, Serialization):
 
 class NameCollection(Serialization):
     def __init__(self, names=[], **kwargs):
-        Serialization.__init__(self, omit=["_index"], promote="names", refactor=list)
+        Serialization.__init__(
+            self,
+            omit=["_index", "_keys", "_phonetic", "_unromanized"],
+            promote="names",
+            refactor=list,
+        )
         logger = logging.getLogger(self.__class__.__name__)
-        logger.debug(pformat(names, indent=4))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(pformat(names, indent=4))
         self._names = dict()
-        self._index = dict()
+        self._index = dict()  # sets of name keys, by name string
+        self._keys = dict()  # sets of name keys, by match key (see text.name_key)
+        self._phonetic = None  # sets of name keys, by phonetic key, when needed
+        self._unromanized = set()  # keys of names with no phonetic key
         if names:
             self.names = names
 
@@ -285,6 +312,51 @@ class NameCollection(Serialization):
             strings.update(n.name_strings)
         return list(strings)
 
+    @property
+    def match_keys(self):
+        """
+        The match keys (see text.name_key) of all the strings of these names,
+        toponyms and romanizations alike, computed as names are added. This is a
+        live, set-like view: test membership or intersect it with a set.
+        """
+        return self._keys.keys()
+
+    @property
+    def phonetic_keys(self):
+        """
+        The phonetic keys (see text.phonetic_key) of the match keys of these
+        names, as a set-like view like match_keys. They are computed from the
+        match keys when first needed and kept until names are added or removed.
+        """
+        return self._phonetic_index().keys()
+
+    @property
+    def unromanized(self):
+        """
+        The names with letters but no phonetic key, because none of their strings
+        is in the Latin script; key them with languages_and_scripts.name_keys.
+        """
+        self._phonetic_index()
+        return [self._names[k] for k in self._unromanized]
+
+    def _phonetic_index(self):
+        if self._phonetic is None:
+            self._phonetic = dict()
+            lettered = set()
+            romanized = set()
+            for match_key, name_keys in self._keys.items():
+                lettered.update(name_keys)
+                key = phonetic_key(match_key)
+                if not key:
+                    continue
+                romanized.update(name_keys)
+                try:
+                    self._phonetic[key].update(name_keys)
+                except KeyError:
+                    self._phonetic[key] = set(name_keys)
+            self._unromanized = lettered - romanized
+        return self._phonetic
+
     @property
     def names(self):
         return list(self._names.values())
@@ -298,6 +370,9 @@ class NameCollection(Serialization):
     def names(self):
         self._names = dict()
         self._index = dict()
+        self._keys = dict()
+        self._phonetic = None
+        self._unromanized = set()
 
     def add_name(self, value):
         if isinstance(value, Name):
@@ -317,12 +392,33 @@ class NameCollection(Serialization):
             i = len([k for k in self._names.keys() if k.startswith(name_key)])
             name_key = f"{name_key}-{str(i)}"
             self._names[name_key] = name
+        self._index_name(name_key, name)
+
+    def _index_name(self, key: str, name: Name, match_keys: dict = None):
+        """
+        Index name (stored under key) by its strings and their match keys, which
+        are looked up in match_keys (a dictionary of match keys by string) first,
+        if given, to avoid recomputing them for strings seen before.
+        """
         for ns in name.name_strings:
             try:
-                self._index[ns]
+                self._index[ns].add(key)
             except KeyError:
-                self._index[ns] = set()
-            self._index[ns].add(name_key)
+                self._index[ns] = {key}
+            if match_keys is None:
+                match_key = name_key(ns)
+            else:
+                try:
+                    match_key = match_keys[ns]
+                except KeyError:
+                    match_key = match_keys[ns] = name_key(ns)
+            if not match_key:
+                continue
+            try:
+                self._keys[match_key].add(key)
+            except KeyError:
+                self._keys[match_key] = {key}
+        self._phonetic = None
 
     def get_names(self, s: str):
         try:
@@ -331,18 +427,14 @@ class NameCollection(Serialization):
             pass
         else:
             return [self._names[k] for k in list(name_keys)]
+        try:
+            name_keys = self._keys[name_key(s)]
+        except KeyError:
+            pass
+        else:
+            return [self._names[k] for k in list(name_keys)]
         s_low = s.lower()
-        lower_index = None
-        if s_low != s:
-            lower_index = {k.lower(): v for k, v in self._index.items()}
-            try:
-                name_keys = lower_index[s_low]
-            except KeyError:
-                pass
-            else:
-                return [self._names[k] for k in list(name_keys)]
-        if lower_index is None:
-            lower_index = {k.lower(): v for k, v in self._index.items()}
+        lower_index = {k.lower(): v for k, v in self._index.items()}
         name_keys = set()
         for k in [k for k in list(lower_index.keys()) if s_low in k]:
             try:
@@ -359,6 +451,11 @@ class NameCollection(Serialization):
         index_keys = [k for k, v in self._index.items() if name_key in v]
         for k in index_keys:
             self._index[k].remove(name_key)
+        for k in [k for k, v in self._keys.items() if name_key in v]:
+            self._keys[k].remove(name_key)
+            if not self._keys[k]:
+                del self._keys[k]
+        self._phonetic = None
 
     def __iter__(self):
         return iter(self._names.values())
@@ -368,19 +465,30 @@ class NameCollection(Serialization):
 
 
 class Properties(Serialization):
+    __slots__ = ("_title", "_ccodes", "_types", "_title_key")
+    _omit = Serialization._omit | {"_title_key"}
+
     def __init__(
-        self, title: str = "", ccodes: list = [], properties: dict = {}, **kwargs
+        self,
+        title: str = "",
+        ccodes: list = [],
+        types: list = [],
+        properties: dict = {},
+        **kwargs,
     ):
-        Serialization.__init__(self)
         self._title = ""
         self._ccodes = set()
+        self._types = set()
+        self._title_key = None
 
         if title:
             self.title = title
         if ccodes:
             self.ccodes = ccodes
+        if types:
+            self.types = types
         if properties:
-            for k in ["title", "ccodes"]:
+            for k in ["title", "ccodes", "types"]:
                 try:
                     v = properties[k]
                 except KeyError:
@@ -426,6 +534,25 @@ class Properties(Serialization):
                 except KeyError:
                     raise original
 
+    # feature types (e.g., "settlement"): slugs of arbitrary vocabulary terms
+    @property
+    def types(self):
+        return sorted(self._types)
+
+    @types.setter
+    def types(self, types: list = []):
+        self._types = set()
+        for t in types:
+            self.add_type(t)
+
+    def add_type(self, value: str):
+        v = slugify(value)
+        if v:
+            self._types.add(v)
+
+    def remove_type(self, value: str):
+        self._types.remove(slugify(value))
+
     # title: arbitrary unicode strings
     @property
     def title(self):
@@ -434,16 +561,77 @@ class Properties(Serialization):
     @title.setter
     def title(self, title: str):
         self._title = normtext(title)
+        self._title_key = None
+
+    @property
+    def title_key(self):
+        """The match key of the title (see text.name_key), computed once."""
+        if self._title_key is None:
+            self._title_key = name_key(self._title)
+        return self._title_key
+
+
+def _shape(geometry):
+    if isinstance(geometry, BaseGeometry):
+        return geometry
+    return shapely_shape(geometry)
+
+
+def derive_all(features: list):
+    """
+    Compute the DerivedGeometry of each of features (with a geometry) that does
+    not yet have one, all in one batch.
+    """
+    pending = [
+        f for f in features if f._derived is None and not isinstance(f.geometry, list)
+    ]
+    for f, derived in zip(pending, derive_geometries([f.geometry for f in pending])):
+        f._derived = derived
+
+
+def make_geometries(features: list):
+    """
+    Build the geometry Feature would for each of a list of feature dictionaries
+    ("geometries" or "geometry" GeoJSON), constructing all of their shapes in one
+    batch with geometries_from_geojson(). Returns a list with a shapely geometry,
+    or an empty list for none, per feature.
+    """
+    geojson = list()
+    counts = list()
+    for feature in features:
+        try:
+            geometries = feature["geometries"]
+        except KeyError:
+            try:
+                geometries = [feature["geometry"]]
+            except KeyError:
+                geometries = []
+        geojson.extend(geometries)
+        counts.append(len(geometries))
+    shapes = geometries_from_geojson(geojson)
+    result = list()
+    i = 0
+    for count in counts:
+        if count == 1:
+            result.append(shapes[i])
+        elif count > 1:
+            result.append(GeometryCollection(list(shapes[i : i + count])))
+        else:
+            result.append(list())
+        i += count
+    return result
 
 
 class Feature:
     def __init__(self, id: str = None, uri: URI = None, **kwargs):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.debug(pformat(kwargs, indent=4))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(pformat(kwargs, indent=4))
 
         self._id_internal = uuid4().hex
         self._id = None
         self._uri = None
+        self._derived = None
 
         if id:
             self.id = id
@@ -453,21 +641,49 @@ class Feature:
         self.properties = Properties(**kwargs)
         self.names = NameCollection(**kwargs)
         self.descriptions = DescriptionCollection(**kwargs)
+        self.geometry = self._make_geometry(**kwargs)
+
+    @staticmethod
+    def _make_geometry(**kwargs):
+        """
+        Build a shapely geometry from GeoJSON 'geometries' or 'geometry' kwargs.
+        Shapely geometries (e.g. from make_geometries()) are used as they are.
+        """
         try:
             geometries = kwargs["geometries"]
         except KeyError:
             try:
                 geometry = kwargs["geometry"]
             except KeyError:
-                self.geometry = list()
+                return list()
             else:
-                self.geometry = shapely_shape(geometry)
+                return _shape(geometry)
         else:
             if len(geometries) == 1:
-                self.geometry = shapely_shape(geometries[0])
+                return _shape(geometries[0])
             elif len(geometries) > 1:
-                geo_collection = [shapely_shape(g) for g in geometries]
-                self.geometry = GeometryCollection(geo_collection)
+                geo_collection = [_shape(g) for g in geometries]
+                return GeometryCollection(geo_collection)
+            return list()
+
+    @property
+    def derived(self):
+        """
+        The DerivedGeometry of the feature's geometry (None if it has none),
+        computed when first used and kept until the geometry is replaced.
+        """
+        if self._derived is None and not isinstance(self.geometry, list):
+            self._derived = derive_geometries([self.geometry])[0]
+        return self._derived
+
+    @property
+    def geometry(self):
+        return self._geometry
+
+    @geometry.setter
+    def geometry(self, value):
+        self._geometry = value
+        self._derived = None
 
     @property
     def id(self):
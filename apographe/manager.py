@@ -9,35 +9,66 @@
 Manage higher-level operations for an API
 """
 from unicodedata import name
+from apographe.alignment import (
+    align_places,
+    DEFAULT_THRESHOLD,
+    LocalGazetteer,
+    name_slugs,
+    NAME_MODES,
+    NameIndex,
+    phonetic_slugs,
+)
+from apographe.cache import place_cache
+from apographe.cells import CellIndex, DEFAULT_RESOLUTION, rings_for_distance
 from apographe.gazetteer import Gazetteer
-from apographe.geo import bubble
+from apographe.geo import bubble_bounds, split_bounds
 from apographe.idai import IDAI, IDAIQuery
-from apographe.linked_places_format import dump, load
+from apographe.linked_places_format import derive_all, dump
 from apographe.place import Place
+from apographe.prefetch import Prefetcher
+from apographe.ranking import rank_hits
+from apographe.snapshot import dump_snapshot, load_snapshot, SNAPSHOT_SUFFIX
 from apographe.pleiades import Pleiades, PleiadesQuery
+from apographe.storage import (
+    iter_read_places,
+    read_manifest,
+    SHARD_SIZE,
+    write_places,
+    write_shards,
+)
 from apographe.vici import Vici, ViciQuery
 from copy import deepcopy
+from hashlib import md5
 from inspect import getdoc
 import logging
 from pathlib import Path, PurePath
 from pprint import pformat
-import regex
 from shapely.ops import unary_union
 from slugify import slugify
 from sys import platform
 
+# where prefetch progress is recorded so that interrupted prefetches can resume
+PREFETCH_STATE_DIR = Path("~/.apographe/prefetch")
+
 
 class Manager:
     """API"""
 
-    def __init__(self):
+    def __init__(self, gazetteer_config: dict = None):
         self.apographe = dict()  # local list of places
+        # keyword arguments for gazetteer interfaces, by gazetteer name, e.g.
+        # {"pleiades": {"place_netloc": "localhost:8000", "place_scheme": "http"}}
+        if gazetteer_config is None:
+            gazetteer_config = dict()
+        self._gazetteer_config = gazetteer_config
         self._gazetteers = {
             "idai": (IDAI, IDAIQuery),
             "pleiades": (Pleiades, PleiadesQuery),
             "vici": (Vici, ViciQuery),
         }
         self.imports = dict()  # imported data
+        self.datasets = dict()  # local gazetteers to align with, by path
+        self.prefetches = dict()  # background cache-warming jobs, by gazetteer name
         self._search_results = dict()  # keep track of all search results this session
         self.logger = logging.getLogger(self.__class__.__name__)
 
@@ -80,7 +111,16 @@ class Manager:
         return hits
 
     def align(self, *args, **kwargs):
-        """Attempt to align one or more items in the internal gazetteer with items in an external gazetteer."""
+        """
+        Attempt to align one or more items in the internal gazetteer with items in an external gazetteer.
+
+        With candidates="cells", candidates come only from the gazetteer's places
+        in the parsed-place cache (see _cell_candidates), so places not fetched
+        this session, or since evicted, are missed; align with a dataset for a
+        complete join.
+        """
+        if "dataset" in kwargs:
+            return self._align_dataset(*args, **kwargs)
         gazetteer_name = args[0]
         if len(args) == 2:
             internal_candidates = [self.apographe[args[1]]]
@@ -91,80 +131,258 @@ class Manager:
         except KeyError:
             name_mode = "exact"
         self.logger.debug(f"name_mode: {name_mode}")
-        if name_mode not in ["exact", "none"]:
+        if name_mode not in NAME_MODES:
             raise NotImplementedError(f"name_mode = {name_mode} is not supported")
+        try:
+            threshold = float(kwargs["threshold"])
+        except KeyError:
+            threshold = DEFAULT_THRESHOLD
         try:
             proximity = int(kwargs["proximity"])
         except KeyError:
             proximity = None
+        try:
+            candidate_mode = kwargs["candidates"]
+        except KeyError:
+            candidate_mode = "search"
+        self.logger.debug(f"candidate_mode: {candidate_mode}")
+        if candidate_mode not in ["search", "cells"]:
+            raise NotImplementedError(
+                f"candidate_mode = {candidate_mode} is not supported"
+            )
+        ranking = "top" in kwargs or "min_score" in kwargs
+        candidate_places = dict()  # the places of the hits to rank, by ID
         solid_hits = dict()
-        for internal_candidate in internal_candidates:
+        derive_all(internal_candidates)
+        if candidate_mode == "cells":
+            try:
+                resolution = int(kwargs["resolution"])
+            except KeyError:
+                resolution = DEFAULT_RESOLUTION
+            try:
+                rings = int(kwargs["rings"])
+            except KeyError:
+                rings = 1
+                if proximity:
+                    rings = rings_for_distance(proximity, resolution)
+            all_cell_places = self._cell_candidates(
+                gazetteer_name, internal_candidates, resolution, rings
+            )
+        else:
+            hulls = [c.derived.hull for c in internal_candidates]
+            if proximity:
+                all_bounds = bubble_bounds(hulls, buffer_distance=proximity)
+            else:
+                all_bounds = bubble_bounds(
+                    hulls, radius_multiplier=2, radius_minimum=5000
+                )
+        for i, internal_candidate in enumerate(internal_candidates):
 
             # spatial candidates
-            hull = internal_candidate.geometry.convex_hull
-            if proximity:
-                bub = bubble(hull, buffer_distance=proximity)
+            if candidate_mode == "cells":
+                spatial_places = all_cell_places[i]
+                spatial_hits = [
+                    self._place_hit(pid, spatial_places[pid])
+                    for pid in sorted(spatial_places)
+                ]
             else:
-                bub = bubble(hull, radius_multiplier=2, radius_minimum=5000)
-            bbox = bub.bounds
-            self.logger.debug(f"bbox: {bbox}")
-            spatial_hits = self.search(gazetteer_name, bbox=bbox)
+                spatial_places = None
+                spatial_hits = dict()
+                for bbox in split_bounds(all_bounds[i]):
+                    self.logger.debug(f"bbox: {bbox}")
+                    for hit in self.search(gazetteer_name, bbox=bbox):
+                        spatial_hits[hit["id"]] = hit
+                spatial_hits = list(spatial_hits.values())
             self.logger.debug(pformat(spatial_hits, indent=4))
 
             # name matches among the spatial candidates
-            if name_mode != "none":
+            if name_mode == "similar":
+                if spatial_places is None:
+                    spatial_places = self._spatial_places(gazetteer_name, spatial_hits)
+                name_index = NameIndex()
+                name_index.add_places(spatial_places)
+                scores = name_index.match(name_slugs(internal_candidate), threshold)
+                self.logger.debug(f"name scores: {scores}")
+                solid_hits[internal_candidate.id] = sorted(
+                    [
+                        dict(h, score=scores[h["id"]])
+                        for h in spatial_hits
+                        if h["id"] in scores
+                    ],
+                    key=lambda h: (-h["score"], h["id"]),
+                )
+            elif name_mode != "none":
                 self.logger.debug(f"name_mode: {name_mode}")
-                internal_names = internal_candidate.names.name_strings
-                internal_names.append(internal_candidate.properties.title)
-                internal_names = [
-                    regex.sub("[^\p{Letter}]+", "", name_string).lower()
-                    for name_string in internal_names
-                ]
-                self.logger.debug(f"internal_names: {internal_names}")
-                if internal_names:
-                    gazetteer_interface, gazetteer_query_class = self.get_gazetteer(
-                        gazetteer_name
-                    )
-                    spatial_places = {
-                        h["id"]: gazetteer_interface.get(h["id"]) for h in spatial_hits
-                    }
-                    self.logger.debug(f"spatial_places: {len(spatial_places)}")
-                    spatial_name_index = dict()
-                    for pid, place in spatial_places.items():
-                        names = place.names.name_strings
-                        names.append(place.properties.title)
-                        for name_string in set(names):
-                            name_slug = regex.sub(
-                                "[^\p{Letter}]+", "", name_string
-                            ).lower()
-                            try:
-                                spatial_name_index[name_slug]
-                            except KeyError:
-                                spatial_name_index[name_slug] = set()
-                            finally:
-                                spatial_name_index[name_slug].add(pid)
-                    self.logger.debug(
-                        f"spatial_name_index:\n{pformat(spatial_name_index, indent=4)}"
-                    )
-                    possible_matches = set()
-                    for internal_name in internal_names:
-                        try:
-                            external_pids = spatial_name_index[internal_name]
-                        except KeyError:
-                            pass
-                        else:
-                            possible_matches.update(external_pids)
-                        self.logger.debug(
-                            f"possible_matches after internal_name={internal_name}: {possible_matches}"
+                if name_mode == "phonetic":
+                    internal_keys = phonetic_slugs(internal_candidate)
+                else:
+                    internal_keys = name_slugs(internal_candidate)
+                self.logger.debug(f"internal name keys: {internal_keys}")
+                possible_matches = set()
+                if internal_keys:
+                    if spatial_places is None:
+                        spatial_places = self._spatial_places(
+                            gazetteer_name, spatial_hits
                         )
-                    solid_hits[internal_candidate.id] = [
-                        h for h in spatial_hits if h["id"] in possible_matches
-                    ]
+                    self.logger.debug(f"spatial_places: {len(spatial_places)}")
+                    # the places' keys were computed as their names were added
+                    if name_mode == "phonetic":
+                        possible_matches = {
+                            pid
+                            for pid, place in spatial_places.items()
+                            if not internal_keys.isdisjoint(phonetic_slugs(place))
+                        }
+                    else:
+                        possible_matches = {
+                            pid
+                            for pid, place in spatial_places.items()
+                            if place.properties.title_key in internal_keys
+                            or not internal_keys.isdisjoint(place.names.match_keys)
+                        }
+                self.logger.debug(f"possible_matches: {possible_matches}")
+                solid_hits[internal_candidate.id] = [
+                    h for h in spatial_hits if h["id"] in possible_matches
+                ]
             else:
                 solid_hits[internal_candidate.id] = spatial_hits
             self.logger.debug(f"solid_hits:\n{pformat(solid_hits, indent=4)}")
+            if ranking:
+                if spatial_places is None:
+                    spatial_places = self._spatial_places(
+                        gazetteer_name, solid_hits[internal_candidate.id]
+                    )
+                candidate_places.update(spatial_places)
+        if ranking:
+            solid_hits = self._rank(
+                solid_hits,
+                {c.id: c for c in internal_candidates},
+                candidate_places,
+                kwargs.get("top"),
+                kwargs.get("min_score"),
+            )
         return solid_hits
 
+    def _align_dataset(
+        self,
+        *args,
+        dataset: str,
+        names: str = "exact",
+        proximity=None,
+        resolution=DEFAULT_RESOLUTION,
+        rings=None,
+        processes=1,
+        threshold=DEFAULT_THRESHOLD,
+        top=None,
+        min_score=None,
+    ):
+        """
+        Align one (args[0]) or all places in the internal gazetteer with the
+        places saved in a local dataset (anything load can read), by shared cells
+        and names, without contacting any gazetteer (see alignment.align_places).
+        The dataset and its indexes are kept for later alignments. With top or
+        min_score, hits are ranked (see _rank).
+        """
+        resolution = int(resolution)
+        processes = int(processes)
+        if rings is None:
+            rings = 1
+            if proximity:
+                rings = rings_for_distance(int(proximity), resolution)
+        gazetteer = self.get_dataset(dataset, processes=processes)
+        if args:
+            internal = {args[0]: self.apographe[args[0]]}
+        else:
+            internal = self.apographe
+        matches = align_places(
+            internal,
+            gazetteer,
+            names=names,
+            resolution=resolution,
+            rings=int(rings),
+            processes=processes,
+            threshold=float(threshold),
+        )
+        hits = dict()
+        for key, these_matches in matches.items():
+            hits[key] = list()
+            for k, score in these_matches:
+                hit = self._place_hit(k, gazetteer.places[k])
+                if score is not None:
+                    hit["score"] = score
+                hits[key].append(hit)
+        if top is not None or min_score is not None:
+            hits = self._rank(hits, internal, gazetteer.places, top, min_score)
+        return hits
+
+    def _rank(self, hits: dict, places: dict, candidates: dict, top, min_score):
+        """
+        Rank align hits by a score combining distance, names, feature types, and
+        descriptions (see ranking.rank_hits), keeping the top (all if 0 or None)
+        hits of each place that score at least min_score (0 if None).
+        """
+        k = None
+        if top is not None and int(top) > 0:
+            k = int(top)
+        threshold = 0.0
+        if min_score is not None:
+            threshold = float(min_score)
+        return rank_hits(hits, places, candidates, k=k, threshold=threshold)
+
+    def _spatial_places(self, gazetteer_name, spatial_hits: list):
+        """Get the place for each of a list of search hits, by ID."""
+        gazetteer_interface, gazetteer_query_class = self.get_gazetteer(gazetteer_name)
+        return {h["id"]: gazetteer_interface.get(h["id"]) for h in spatial_hits}
+
+    def _cell_candidates(
+        self, gazetteer_name, internal_candidates: list, resolution: int, rings: int
+    ):
+        """
+        Find the spatial candidates for each of internal_candidates by joining
+        on cell keys against the gazetteer's cached places (see
+        BackendWeb.cached_places), rather than searching the gazetteer. Return a
+        list of dictionaries of places by gazetteer ID, one per internal candidate.
+        The parsed-place cache is bounded and holds only places fetched this
+        session, so the join is only as complete as the cache (prefetch the
+        gazetteer's places first, or align with a dataset).
+        """
+        gazetteer_interface, gazetteer_query_class = self.get_gazetteer(gazetteer_name)
+        external = gazetteer_interface.cached_places()
+        message = (
+            f"cells: joining against only the {len(external)} {gazetteer_name} "
+            f"places in the parsed-place cache (at most {place_cache.max_places}, "
+            f"{place_cache.evictions} evicted so far); places not in the cache are "
+            f"not candidates"
+        )
+        if place_cache.evictions or not external:
+            self.logger.warning(message)
+        else:
+            self.logger.info(message)
+        derive_all(list(external.values()))
+        index = CellIndex(resolution)
+        index.add_places(external)
+        self.logger.debug(
+            f"cell index of {len(external)} cached {gazetteer_name} places: "
+            f"{len(index)} cells at resolution {resolution}"
+        )
+        joined = index.join(dict(enumerate(internal_candidates)), rings)
+        return [
+            {pid: external[pid] for pid in joined[i]}
+            for i in range(len(internal_candidates))
+        ]
+
+    def _place_hit(self, pid: str, place: Place):
+        """Summarize a gazetteer place like a search hit."""
+        try:
+            summary = place.descriptions.description_strings[0]
+        except IndexError:
+            summary = ""
+        return {
+            "id": pid,
+            "title": place.properties.title,
+            "uri": place.uri,
+            "summary": summary,
+        }
+
     def change(self, place_id: str, **kwargs):
         self.logger.debug(f"id: {id}")
         self.logger.debug(pformat(kwargs, indent=4))
@@ -210,6 +428,22 @@ class Manager:
                 raise
         return (gazetteer_interface, gazetteer_query_class)
 
+    def get_dataset(self, where: str, processes: int = 1):
+        """
+        Get the local gazetteer saved at 'where' (see load) for alignment,
+        reading it (across processes, as load would) if it has not been read.
+        """
+        path = str(Path(where).expanduser().resolve())
+        try:
+            return self.datasets[path]
+        except KeyError:
+            pass
+        places = dict()
+        self._read_places(path, places, lazy=False, processes=processes)
+        self.datasets[path] = LocalGazetteer(places, path)
+        self.logger.debug(f"read dataset of {len(places)} places from {path}")
+        return self.datasets[path]
+
     def get_place(self, place_key):
         """Get a place from the internal gazetteer."""
         try:
@@ -256,38 +490,182 @@ class Manager:
             )
         return hits
 
-    def load(self, where: str):
-        """Load JSONLPF files at 'where' as places in the internal gazetteer"""
+    def load(self, where: str, lazy: bool = False, processes: int = 1):
+        """
+        Load JSONLPF files at 'where' as places in the internal gazetteer. If 'where'
+        holds a shard manifest (see save), the shards it lists are loaded under the
+        place keys they were saved with. A path ending in ".snapshot" is loaded
+        as a snapshot (see save). Places already loaded are never replaced: a place
+        whose key is taken is added under its id, its title slug, or "file:id",
+        whichever is free first.
+        With lazy=True, each place's names, descriptions, and geometry are only
+        constructed when first used (see LazyPlace). With processes other than 1,
+        files are parsed and places built across a pool of that many processes
+        (0 for one per core); places are added in the same order either way.
+        """
+        path = self._read_places(where, self.apographe, lazy, processes)
+        return f"Read {len(self.apographe)} places from {str(path)}."
+
+    def _read_places(self, where: str, places: dict, lazy: bool, processes: int):
+        """Add the places saved at 'where' to places (see load); return the path."""
         path = Path(where)
         if len(path.parts) == 1:
             NotImplementedError(where)
         path = path.expanduser().resolve()
-        if path.is_dir():
-            for filepath in path.glob("*.json"):
+        if path.suffix == SNAPSHOT_SUFFIX:
+            for place_key, place in load_snapshot(path).items():
+                self._add_place(places, place, path.name, place_key)
+        elif path.is_dir():
+            manifest = read_manifest(path)
+            if manifest is None:
+                filepaths = list(path.glob("*.json"))
+                keys = dict()
+            else:
+                filepaths = [path / shard["file"] for shard in manifest["shards"]]
+                keys = {shard["file"]: shard["keys"] for shard in manifest["shards"]}
+            for filepath, these_places in iter_read_places(
+                filepaths, lazy=lazy, processes=processes
+            ):
                 fn = filepath.name
-                with open(filepath, "r", encoding="utf-8") as fp:
-                    features = load(fp)
-                del fp
-                places = [Place(**f) for f in features]
-                for place in places:
-                    for place_id in [
-                        place.id,
-                        f"{slugify(place.properties.title)}",
-                        f"{slugify(fn.split('.')[0])}:{place.id}",
-                    ]:
-                        try:
-                            self.apographe[place_id]
-                        except KeyError:
-                            self.apographe[place_id] = place
-                            break
-                    try:
-                        self.apographe[place_id]
-                    except KeyError:
-                        raise RuntimeError()
-        return f"Read {len(self.apographe)} places from {str(path)}."
+                try:
+                    place_keys = keys[fn]
+                except KeyError:
+                    pass
+                else:
+                    if len(place_keys) != len(these_places):
+                        raise RuntimeError(
+                            f"Expected {len(place_keys)} places in shard {fn} but "
+                            f"found {len(these_places)}."
+                        )
+                    for place_key, place in zip(place_keys, these_places):
+                        self._add_place(places, place, fn, place_key)
+                    continue
+                for place in these_places:
+                    self._add_place(places, place, fn)
+        return path
+
+    def _add_place(self, places: dict, place, filename: str, place_key=None):
+        """
+        Add place to places under the first free key among place_key (if any), its
+        id, its title slug, and "filename:id", so that a place already loaded is
+        never replaced.
+        """
+        candidates = [
+            place.id,
+            f"{slugify(place.properties.title)}",
+            f"{slugify(filename.split('.')[0])}:{place.id}",
+        ]
+        if place_key is not None:
+            candidates.insert(0, place_key)
+        for candidate in candidates:
+            try:
+                places[candidate]
+            except KeyError:
+                places[candidate] = place
+                return candidate
+        raise RuntimeError(
+            f"Cannot add place {place.id} from {filename} because its keys "
+            f"{candidates} are already taken."
+        )
+
+    def prefetch(
+        self,
+        gazetteer_name: str,
+        *args,
+        imports: str = None,
+        internal: bool = False,
+        state: str = None,
+        workers: int = None,
+    ):
+        """
+        Warm the caches for places in a gazetteer by fetching them in the background.
+        Place IDs are taken from args, from a previously imported list (imports), and/or
+        from the URIs of places in the internal gazetteer (internal). Progress is
+        recorded in a state file (by default under ~/.apographe/prefetch) so that
+        repeating the same prefetch resumes where the last one left off.
+        """
+        try:
+            prefetcher = self.prefetches[gazetteer_name]
+        except KeyError:
+            pass
+        else:
+            if prefetcher.running:
+                raise RuntimeError(
+                    f"A prefetch from {gazetteer_name} is already running."
+                )
+        gazetteer_interface, gazetteer_query_class = self.get_gazetteer(gazetteer_name)
+        ids = list(args)
+        sources = list()
+        if imports:
+            try:
+                imported = self.imports[imports]
+            except KeyError:
+                raise ValueError(f"There is no import named '{imports}'.")
+            if isinstance(imported, str):
+                imported = [imported]
+            ids.extend(imported)
+            sources.append(imports)
+        if internal:
+            for place in self.apographe.values():
+                uris = [place.uri] + [
+                    d.source for d in place.descriptions.descriptions if d.source
+                ]
+                for uri in uris:
+                    if uri:
+                        id = gazetteer_interface.id_from_uri(uri)
+                        if id:
+                            ids.append(id)
+            sources.append("internal")
+        if not ids:
+            raise ValueError(f"No {gazetteer_name} place IDs to prefetch.")
+        if state is None:
+            if args:
+                sources.append(md5(" ".join(args).encode("utf-8")).hexdigest()[:8])
+            state = PREFETCH_STATE_DIR / f"{gazetteer_name}-{'-'.join(sources)}.json"
+        prefetcher = Prefetcher(
+            gazetteer_interface, ids, state_path=state, workers=workers
+        )
+        self.prefetches[gazetteer_name] = prefetcher
+        prefetcher.start()
+        progress = prefetcher.progress()
+        return (
+            f"Prefetching {progress['total'] - progress['resumed']} of "
+            f"{progress['total']} {gazetteer_name} places in the background "
+            f"(progress recorded in {prefetcher.state_path})."
+        )
+
+    def prefetch_status(self):
+        """Report the progress of each prefetch started this session."""
+        return [
+            self.prefetches[gazetteer_name].progress()
+            for gazetteer_name in sorted(self.prefetches.keys())
+        ]
 
-    def save(self, mode: str = "all", where: str = ""):
-        """Save the places in the internal gazetteer to the directory at where"""
+    def save(
+        self,
+        mode: str = "all",
+        where: str = "",
+        processes: int = 1,
+        shard_size: int = SHARD_SIZE,
+    ):
+        """
+        Save the places in the internal gazetteer to the directory at where.
+        Mode "all" writes one file, "each" one file per place, and "shards" files of
+        about shard_size places each plus a manifest; saving shards again only
+        rewrites the shards whose places have changed. Mode "snapshot" writes a
+        binary snapshot (where is a directory or a path ending in ".snapshot") that
+        load() restores much faster than LPF, which remains the interchange
+        format. With modes "each" and
+        "shards", processes > 1 encodes places across a process pool (0 for one
+        process per core) while the files are written.
+        """
+        if mode == "snapshot":
+            path = Path(where).expanduser().resolve()
+            if path.suffix != SNAPSHOT_SUFFIX:
+                path = path / f"all{SNAPSHOT_SUFFIX}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            dump_snapshot(self.apographe, path)
+            return f"Wrote {len(self.apographe)} places to {str(path)}."
         filename = None
         dirpath = None
         if where:
@@ -299,7 +677,7 @@ class Manager:
                 filename = f"{where}.json"
             elif mode == "all":
                 filename = "all.json"
-            elif mode not in ["all", "each"]:
+            elif mode not in ["all", "each", "shards"]:
                 filename = f"{mode}.json"
             if filename:
                 if filename == f"{where}.json" and len(path.parts) == 1:
@@ -334,18 +712,31 @@ class Manager:
             del fp
             return f"Wrote {len(self.apographe)} places to {str(dirpath / filename)}."
         elif mode == "each" and dirpath and not filename:
-            # save each place to a separate LPF file
-            i = 0
+            # save each place to a separate LPF file, numbering the files of
+            # place keys that slugify alike
+            items = list()
+            names = set()
             for place_key, place in self.apographe.items():
-                slug = slugify(place_key)
-                filename = f"{slug}.json"
-                self.logger.debug(f"saving {str(dirpath / filename)}.")
-                self.logger.debug(filename)
-                with open(dirpath / filename, "w", encoding="utf-8") as fp:
-                    dump(place, fp, ensure_ascii=False, indent=4, sort_keys=True)
-                del fp
-                i += 1
+                stem = slugify(place_key)
+                name = f"{stem}.json"
+                n = 1
+                while name in names:
+                    n += 1
+                    name = f"{stem}-{n}.json"
+                names.add(name)
+                items.append((dirpath / name, place))
+            self.logger.debug(f"saving {len(items)} files to {str(dirpath)}.")
+            i = write_places(items, processes=processes)
             return f"Wrote {i} files for {len(self.apographe)} places to {str(path)}."
+        elif mode == "shards" and dirpath and not filename:
+            # save places in LPF files of about shard_size places each
+            written, count = write_shards(
+                dirpath, self.apographe, shard_size=shard_size, processes=processes
+            )
+            return (
+                f"Wrote {written} of {count} shards for {len(self.apographe)} places "
+                f"to {str(path)}."
+            )
         elif mode and dirpath and filename:
             # save individual to a single file
             raise NotImplementedError()
@@ -416,7 +807,11 @@ class Manager:
         except KeyError:
             raise ValueError(gazetteer_name)
         if not isinstance(gaz_info[0], Gazetteer):
-            gaz = gaz_info[0]()
+            try:
+                gaz_kwargs = self._gazetteer_config[gazetteer_name]
+            except KeyError:
+                gaz_kwargs = dict()
+            gaz = gaz_info[0](**gaz_kwargs)
             gaz.backend = "web"
             self._gazetteers[gazetteer_name] = (gaz, gaz_info[1])
             gaz_info = self._gazetteers[gazetteer_name]
@@ -0,0 +1,490 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Local stand-in HTTP server emulating the supported gazetteer web endpoints
+"""
+
+from apographe.replay import ReplayArchive
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+from pathlib import Path
+import pkg_resources
+from random import Random
+from shapely.geometry import box, Point, shape
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+# places in each gazetteer's own JSON shape, served by default: a few towns of
+# Roman Mauretania at approximate coordinates (ids other than Zucchabar's are
+# made up)
+DEFAULT_DATASET = Path(
+    pkg_resources.resource_filename("data", "mock-gazetteer.json")
+)
+
+# where each gazetteer's web backend expects to find place JSON
+PLACE_PATHS = {
+    "edh": "/edh/geographie/{id}/json",
+    "idai": "/doc/{id}.json",
+    "pleiades": "/places/{id}/json",
+    "vici": "/vici/{id}/json",
+}
+
+# recorded headers that no longer describe the (decoded) content we serve
+SKIP_HEADERS = {
+    "connection",
+    "content-encoding",
+    "content-length",
+    "keep-alive",
+    "transfer-encoding",
+}
+
+
+def _resource_key(uri: str):
+    """Reduce a URI to the path and query that identify it on any host."""
+    parts = urlsplit(uri)
+    path = parts.path
+    if not path.startswith("/"):
+        path = f"/{path}"
+    if parts.query:
+        return f"{path}?{parts.query}"
+    return path
+
+
+def _place_id(gazetteer_name: str, data: dict):
+    """Get the id under which a gazetteer serves a place in its own JSON shape."""
+    if gazetteer_name == "edh":
+        return data["items"]["id"]
+    elif gazetteer_name == "idai":
+        return data["gazId"]
+    return str(data["id"])
+
+
+def _place_geometries(gazetteer_name: str, data: dict):
+    """Get the shapely geometries of a place in a gazetteer's own JSON shape."""
+    if gazetteer_name == "edh":
+        geometries = list()
+        for k, v in data["items"].items():
+            if k.startswith("coordinates") and v:
+                lat, lon = [float(c) for c in v.split(",")]
+                geometries.append(Point(lon, lat))
+        return geometries
+    elif gazetteer_name == "idai":
+        try:
+            return [Point(data["prefLocation"]["coordinates"])]
+        except KeyError:
+            return []
+    elif gazetteer_name == "pleiades":
+        return [shape(l["geometry"]) for l in data.get("locations", [])]
+    try:
+        return [shape(data["geometry"])]
+    except KeyError:
+        return []
+
+
+def _place_fields(gazetteer_name: str, data: dict):
+    """Get the searchable text of a place by the query parameter that searches it."""
+    if gazetteer_name == "edh":
+        item = data["items"]
+        fields = {
+            "fo_antik": item.get("findspot_ancient"),
+            "fo_modern": item.get("findspot_modern"),
+            "fundstelle": item.get("findspot"),
+            "region": item.get("region"),
+            "country": item.get("country"),
+            "kommentar": item.get("kommentar"),
+        }
+    elif gazetteer_name == "idai":
+        titles = [n.get("title") for n in [data["prefName"]] + data.get("names", [])]
+        fields = {"q": " ".join([t for t in titles if t])}
+    elif gazetteer_name == "pleiades":
+        names = [
+            f"{n.get('attested', '')} {n.get('romanized', '')}"
+            for n in data.get("names", [])
+        ]
+        fields = {
+            "Title": data.get("title"),
+            "Description": data.get("description"),
+            "getFeatureType": " ".join(data.get("placeTypes", [])),
+            "Subject:list": " ".join(data.get("subject", [])),
+        }
+        fields["SearchableText"] = " ".join(
+            [data.get("title") or "", data.get("description") or ""] + names
+        )
+    else:
+        properties = data.get("properties", dict())
+        fields = {
+            "terms": " ".join(
+                [properties.get(k) or "" for k in ["title", "summary", "text"]]
+            )
+        }
+    return {k: (v or "").casefold() for k, v in fields.items()}
+
+
+def _matches(text: str, values: list, match_all: bool):
+    """Check text for the words of one query parameter's values."""
+    for value in values:
+        words = [w.casefold() for w in value.split() if w not in {"AND", "OR"}]
+        if " OR " in value:
+            found = any([w in text for w in words])
+        else:
+            found = all([w in text for w in words])
+        if found and not match_all:
+            return True
+        if not found and match_all:
+            return False
+    return match_all
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve one request from the resources registered on the server."""
+
+    server_version = "ApographeMock/0.0.1"
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _respond(self, body: bool):
+        server = self.server
+        if not server.enter():
+            server.count(429)
+            self._send(429, b"Too Many Requests", {"Retry-After": "1"}, body)
+            return
+        try:
+            server.delay()
+            key = _resource_key(self.path)
+            if key == "/robots.txt":
+                status, content, headers = server.robots()
+            elif server.fail():
+                status, content, headers = 503, b"Service Unavailable", dict()
+                headers["Retry-After"] = "1"
+            else:
+                try:
+                    status, content, headers = server.resources[key]
+                except KeyError:
+                    status, content, headers = server.search(key)
+                if status == 200 and self._not_modified(headers):
+                    status, content = 304, b""
+            server.count(status)
+            self._send(status, content, headers, body)
+        finally:
+            server.leave()
+
+    def _not_modified(self, headers: dict):
+        """Check conditional request headers against the resource's validators."""
+        for conditional, validator in [
+            ("If-None-Match", "ETag"),
+            ("If-Modified-Since", "Last-Modified"),
+        ]:
+            value = self.headers.get(conditional)
+            if value:
+                try:
+                    return value == headers[validator]
+                except KeyError:
+                    pass
+        return False
+
+    def _send(self, status: int, content: bytes, headers: dict, body: bool):
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+
+class MockGazetteerServer(ThreadingHTTPServer):
+    """
+    Serve gazetteer resources over local HTTP for load and integration testing.
+    Resources are seeded from a ReplayArchive (keyed by path and query, so the
+    URL shapes built by the web backends resolve unchanged) and from place JSON
+    added with add_place(). Search requests with no recorded response are answered
+    by filtering the places added (by text and, where the gazetteer supports it,
+    bounding box). Point a gazetteer at the server with the keyword arguments from
+    gazetteer_kwargs(), e.g. Pleiades(**server.gazetteer_kwargs()).
+
+    dataset: JSON file of places to add, a list per gazetteer name (the default
+        ships with apographe; None for none)
+    latency: seconds added to every response
+    jitter: up to this many additional seconds, chosen at random
+    error_rate: fraction of requests answered with 503 Service Unavailable
+    crawl_delay: Crawl-delay value advertised in /robots.txt (None for none)
+    max_concurrent: requests handled at once before answering 429 (0 for no limit)
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        archive=None,
+        dataset=DEFAULT_DATASET,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        crawl_delay: float = None,
+        max_concurrent: int = 0,
+        seed: int = 0,
+    ):
+        ThreadingHTTPServer.__init__(self, (host, port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.crawl_delay = crawl_delay
+        self.max_concurrent = max_concurrent
+        self.resources = dict()
+        self.places = {k: dict() for k in PLACE_PATHS.keys()}
+        self.stats = {"requests": 0, "status": dict(), "peak_concurrent": 0}
+        self._random = Random(seed)
+        self._lock = Lock()
+        self._concurrent = 0
+        self._thread = None
+        if dataset is not None:
+            self.seed_dataset(dataset)
+        if archive is not None:
+            self.seed_archive(archive)
+
+    @property
+    def netloc(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+
+    def gazetteer_kwargs(self):
+        """Keyword arguments that point a gazetteer interface at this server."""
+        return {
+            "place_netloc": self.netloc,
+            "place_scheme": "http",
+            "search_netloc": self.netloc,
+            "search_scheme": "http",
+        }
+
+    def add_place(self, gazetteer_name: str, id: str, data: dict):
+        """Serve data as the place JSON for id in the named gazetteer."""
+        try:
+            template = PLACE_PATHS[gazetteer_name]
+        except KeyError:
+            raise ValueError(
+                f"Unsupported gazetteer name '{gazetteer_name}'. "
+                f"Expected one of: {sorted(PLACE_PATHS.keys())}."
+            )
+        content = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.add_response(template.format(id=id), content)
+        self.places[gazetteer_name][id] = data
+
+    def add_response(
+        self,
+        uri: str,
+        content: bytes,
+        status: int = 200,
+        content_type: str = "application/json; charset=utf-8",
+        headers: dict = None,
+    ):
+        """Serve content for the path and query of uri."""
+        these_headers = {"Content-Type": content_type}
+        if headers:
+            these_headers.update(headers)
+        self.resources[_resource_key(uri)] = (status, content, these_headers)
+
+    def seed_dataset(self, dataset):
+        """Add every place in a JSON file of place lists by gazetteer name."""
+        with open(dataset, "r", encoding="utf-8") as fp:
+            data = json.load(fp)
+        del fp
+        count = 0
+        for gazetteer_name, places in data.items():
+            for place in places:
+                self.add_place(gazetteer_name, _place_id(gazetteer_name, place), place)
+                count += 1
+        logger.info(f"seeded {count} places from {dataset}")
+
+    def search(self, key: str):
+        """Answer a search request by filtering the places added; 404 if none."""
+        parts = urlsplit(key)
+        params = parse_qs(parts.query)
+        path = parts.path
+        if path == "/search_rss":
+            return self._search_pleiades(params)
+        elif path == "/search.json":
+            return self._search_idai(params)
+        elif path == "/search.php":
+            return self._search_vici(params, bbox=False)
+        elif path == "/geojson.php":
+            return self._search_vici(params, bbox=True)
+        elif path == "/data/api/geographie/suche":
+            return self._search_edh(params)
+        return (404, b"Not Found", dict())
+
+    def _filter(self, gazetteer_name: str, params: dict, bounds=None, all_of=()):
+        """
+        Get the places in a gazetteer that match every text parameter in params (all
+        of the values of those in all_of, any of the others) and intersect bounds.
+        """
+        hits = list()
+        area = None
+        if bounds is not None:
+            area = box(*bounds)
+        for id in sorted(self.places[gazetteer_name]):
+            data = self.places[gazetteer_name][id]
+            fields = _place_fields(gazetteer_name, data)
+            if area is not None and not any(
+                [g.intersects(area) for g in _place_geometries(gazetteer_name, data)]
+            ):
+                continue
+            if all(
+                [
+                    _matches(fields[k], values, k in all_of)
+                    for k, values in params.items()
+                    if k in fields
+                ]
+            ):
+                hits.append(data)
+        return hits
+
+    def _search_pleiades(self, params: dict):
+        bounds = None
+        try:
+            lower_left = params["lowerLeft"][0]
+            upper_right = params["upperRight"][0]
+        except KeyError:
+            pass
+        else:
+            bounds = [float(c) for c in f"{lower_left},{upper_right}".split(",")]
+        all_of = list()
+        for operator, k in [
+            ("get_usage:ignore_empty", "getFeatureType"),
+            ("Subject_usage:ignore_empty", "Subject:list"),
+        ]:
+            if params.get(operator) == ["operator:and"]:
+                all_of.append(k)
+        items = [
+            "<item><title>{}</title><link>{}</link><description>{}</description>"
+            "</item>".format(
+                escape(data["title"]),
+                escape(data["uri"]),
+                escape(data.get("description", "")),
+            )
+            for data in self._filter("pleiades", params, bounds, all_of)
+        ]
+        content = f"<rss><channel>{''.join(items)}</channel></rss>".encode("utf-8")
+        return (200, content, {"Content-Type": "application/rss+xml"})
+
+    def _search_idai(self, params: dict):
+        result = [
+            dict({"types": []}, **data) for data in self._filter("idai", params)
+        ]
+        return self._json({"total": len(result), "result": result})
+
+    def _search_vici(self, params: dict, bbox: bool):
+        bounds = None
+        if bbox:
+            try:
+                south, west, north, east = params["bounds"][0].split(",")
+            except KeyError:
+                pass
+            else:
+                bounds = [float(c) for c in [west, south, east, north]]
+            params = dict()  # the bounding box search ignores text
+        features = self._filter("vici", params, bounds)
+        return self._json({"type": "FeatureCollection", "features": features})
+
+    def _search_edh(self, params: dict):
+        items = [data["items"] for data in self._filter("edh", params)]
+        return self._json({"total": len(items), "items": items})
+
+    def _json(self, data):
+        content = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        return (200, content, {"Content-Type": "application/json; charset=utf-8"})
+
+    def seed_archive(self, archive):
+        """Serve every response recorded in a ReplayArchive."""
+        if not isinstance(archive, ReplayArchive):
+            archive = ReplayArchive(archive)
+        for uri in archive.uris:
+            r = archive.response(uri)
+            headers = {
+                k: v for k, v in r.headers.items() if k.lower() not in SKIP_HEADERS
+            }
+            self.resources[_resource_key(uri)] = (r.status_code, r.content, headers)
+        logger.info(f"seeded {len(self.resources)} resources from {archive.path}")
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving requests and release the socket."""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # hooks used by the request handler
+
+    def count(self, status: int):
+        with self._lock:
+            self.stats["requests"] += 1
+            try:
+                self.stats["status"][status] += 1
+            except KeyError:
+                self.stats["status"][status] = 1
+
+    def delay(self):
+        delay = self.latency
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(0.0, self.jitter)
+        if delay:
+            sleep(delay)
+
+    def enter(self):
+        with self._lock:
+            if self.max_concurrent and self._concurrent >= self.max_concurrent:
+                return False
+            self._concurrent += 1
+            self.stats["peak_concurrent"] = max(
+                self.stats["peak_concurrent"], self._concurrent
+            )
+            return True
+
+    def fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def leave(self):
+        with self._lock:
+            self._concurrent -= 1
+
+    def robots(self):
+        lines = ["User-agent: *", "Disallow:"]
+        if self.crawl_delay is not None:
+            lines.append(f"Crawl-delay: {self.crawl_delay}")
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+        return (200, content, {"Content-Type": "text/plain; charset=utf-8"})
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -8,16 +8,240 @@
 """
 Define Place class
 """
-from apographe.linked_places_format import Feature
+from apographe.blobs import BlobStore, decode_payload, encode_payload
+from apographe.linked_places_format import (
+    DescriptionCollection,
+    Feature,
+    NameCollection,
+)
 from apographe.serialization import Serialization
+from copy import deepcopy
 import logging
 from pprint import pformat
+from uuid import uuid4
+import zlib
+
+# ways of holding on to the upstream payload a place was made from:
+# keep: as parsed; drop: not at all; compress: zlib-compressed JSON in memory;
+# blob: in a BlobStore on disk, reloaded whenever raw is read
+RAW_RETENTION = ("keep", "drop", "compress", "blob")
 
 
 class Place(Feature, Serialization):
     def __init__(self, raw=None, **kwargs):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.debug(pformat(kwargs, indent=4))
-        Serialization.__init__(self, omit=["raw", "logger"])
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(pformat(kwargs, indent=4))
+        Serialization.__init__(
+            self,
+            omit=[
+                "_derived",
+                "_raw",
+                "_raw_retention",
+                "_raw_shared",
+                "_raw_store",
+                "logger",
+            ],
+        )
+        self._raw_retention = "keep"
+        self._raw_shared = False  # kept raw payload is another place's (see copy)
+        self._raw_store = None
         self.raw = raw
         Feature.__init__(self, **kwargs)
+
+    @property
+    def raw(self):
+        """The upstream payload, reconstituted according to the retention policy."""
+        if self._raw is None or self._raw_retention == "keep":
+            if self._raw_shared:
+                self._raw = deepcopy(self._raw)
+                self._raw_shared = False
+            return self._raw
+        elif self._raw_retention == "compress":
+            return decode_payload(zlib.decompress(self._raw))
+        elif self._raw_retention == "blob":
+            return decode_payload(self._raw_store.get(self._raw))
+        raise RuntimeError(f"Unexpected raw retention '{self._raw_retention}'.")
+
+    @raw.setter
+    def raw(self, value):
+        self._raw_shared = False
+        if value is None or self._raw_retention in ["keep", "drop"]:
+            if self._raw_retention == "drop":
+                value = None
+            self._raw = value
+        elif self._raw_retention == "compress":
+            self._raw = zlib.compress(encode_payload(value))
+        elif self._raw_retention == "blob":
+            self._raw = self._raw_store.put(encode_payload(value))
+
+    @property
+    def raw_retention(self):
+        return self._raw_retention
+
+    def retain_raw(self, retention: str, store=None):
+        """
+        Change how the raw payload is held. store (a BlobStore or directory path)
+        is required for "blob" retention. Switching to "drop" discards the payload.
+        """
+        if retention not in RAW_RETENTION:
+            raise ValueError(
+                f"Unsupported raw retention '{retention}'. "
+                f"Expected one of: {RAW_RETENTION}."
+            )
+        if retention == "blob":
+            if store is None:
+                raise ValueError('Raw retention "blob" requires a blob store.')
+            if not isinstance(store, BlobStore):
+                store = BlobStore(store)
+        if retention == self._raw_retention and store is self._raw_store:
+            return
+        raw = None
+        if retention != "drop":
+            raw = self.raw
+        self._raw_retention = retention
+        self._raw_store = store
+        self.raw = raw
+
+    def copy(self):
+        """
+        Return an independent copy of the place.
+        The blob store, geometry, derived geometry, and language tag objects are
+        treated as read-only and shared with the copy rather than duplicated. So
+        is the raw payload (however it is retained) until the copy first reads
+        it: a payload kept as parsed is then copied, so changes to it never
+        reach the original.
+        """
+        memo = dict()
+        shared = [self._raw, self._raw_store, self.geometry, self._derived]
+        for item in self.names.names + self.descriptions.descriptions:
+            shared.extend(
+                [
+                    item._language_tag,
+                    item._language_subtag,
+                    item._script_subtag,
+                    item._region_subtag,
+                ]
+            )
+        for obj in shared:
+            memo[id(obj)] = obj
+        place = deepcopy(self, memo)
+        place._id_internal = uuid4().hex
+        place._raw_shared = self._raw_retention == "keep" and self._raw is not None
+        return place
+
+
+class LazyPlace(Place):
+    """
+    A Place built from a Linked Places Format feature dictionary that defers
+    constructing its names, descriptions, and geometry until they are first used.
+    Identifiers and properties (title, ccodes, types) are built immediately; the URI is
+    parsed and validated when first used.
+    """
+
+    _deferred = ("uri", "names", "descriptions", "geometry", "geometries")
+
+    def __init__(self, raw=None, **kwargs):
+        pending = dict()
+        for k in self._deferred:
+            try:
+                pending[k] = kwargs.pop(k)
+            except KeyError:
+                pass
+        Place.__init__(self, raw=raw, **kwargs)
+        self._omit.add("_pending")
+        self._pending = pending
+
+    @property
+    def hydrated(self):
+        """Report whether all deferred fields have been constructed."""
+        return not self._pending
+
+    def hydrate(self):
+        """Construct any deferred fields now."""
+        self.uri
+        self.names
+        self.descriptions
+        self.geometry
+        return self
+
+    def asdict(self):
+        self.hydrate()
+        return Place.asdict(self)
+
+    @property
+    def uri(self):
+        try:
+            uri = self._pending["uri"]
+        except (AttributeError, KeyError):
+            pass
+        else:
+            Feature.uri.fset(self, uri)
+            self._pending.pop("uri", None)
+        return Feature.uri.fget(self)
+
+    @uri.setter
+    def uri(self, value):
+        self._discard_pending("uri")
+        Feature.uri.fset(self, value)
+
+    @property
+    def names(self):
+        try:
+            names = self._pending["names"]
+        except (AttributeError, KeyError):
+            pass
+        else:
+            # build before un-deferring so concurrent readers never see a gap
+            self._names = NameCollection(names=names)
+            self._pending.pop("names", None)
+        return self._names
+
+    @names.setter
+    def names(self, value):
+        self._discard_pending("names")
+        self._names = value
+
+    @property
+    def descriptions(self):
+        try:
+            descriptions = self._pending["descriptions"]
+        except (AttributeError, KeyError):
+            pass
+        else:
+            self._descriptions = DescriptionCollection(descriptions=descriptions)
+            self._pending.pop("descriptions", None)
+        return self._descriptions
+
+    @descriptions.setter
+    def descriptions(self, value):
+        self._discard_pending("descriptions")
+        self._descriptions = value
+
+    @property
+    def geometry(self):
+        try:
+            pending = self._pending
+        except AttributeError:
+            pending = dict()
+        geometry_kwargs = {
+            k: pending[k] for k in ["geometry", "geometries"] if k in pending
+        }
+        if geometry_kwargs:
+            Feature.geometry.fset(self, self._make_geometry(**geometry_kwargs))
+            for k in geometry_kwargs.keys():
+                pending.pop(k, None)
+        return self._geometry
+
+    @geometry.setter
+    def geometry(self, value):
+        self._discard_pending("geometry", "geometries")
+        Feature.geometry.fset(self, value)
+
+    def _discard_pending(self, *keys):
+        try:
+            pending = self._pending
+        except AttributeError:
+            return
+        for k in keys:
+            pending.pop(k, None)
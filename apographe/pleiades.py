@@ -78,8 +78,10 @@ class PleiadesQuery(Query):
 class Pleiades(BackendWeb, Gazetteer):
     """Interface for the Pleiades gazetteer of ancient places."""
 
-    def __init__(self):
-        Gazetteer.__init__(self, name="Pleiades")
+    def __init__(self, **overrides):
+        Gazetteer.__init__(
+            self, name="Pleiades", uri_prefixes=["pleiades.stoa.org/places/"]
+        )
         # NB: Pleiades sets the following response headers:
         # cache-control: max-age=0, s-maxage=86400, must-revalidate
         # expires: (a date-time apparently 24 hours in future)
@@ -101,6 +103,9 @@ class Pleiades(BackendWeb, Gazetteer):
             "search_scheme": "https",
             "search_path": "/search_rss",
         }
+        # e.g., place_netloc and place_scheme to point at a local test server, or
+        # stale_while_revalidate to serve repeat place requests (see BackendWeb)
+        kwargs.update(overrides)
         BackendWeb.__init__(self, **kwargs)
 
     def get(self, id: str):
@@ -117,7 +122,10 @@ class Pleiades(BackendWeb, Gazetteer):
         return getattr(self, f"_pleiades_{backend}_search")(query)
 
     def _pleiades_web_get(self, id: str):
-        data = BackendWeb.get(self, id).json()
+        r = BackendWeb.get(self, id)
+        return self._web_place(id, r, self._pleiades_place)
+
+    def _pleiades_place(self, id: str, data: dict):
         kwargs = self._kwargs_from_json(data)
         place = Place(id=id, raw=data, **kwargs)
         return place
@@ -134,6 +142,12 @@ class Pleiades(BackendWeb, Gazetteer):
         except KeyError:
             kwargs["names"] = []
 
+        # feature types
+        try:
+            kwargs["types"] = data["placeTypes"]
+        except KeyError:
+            pass
+
         # descriptions
         kwargs["descriptions"] = []
         try:
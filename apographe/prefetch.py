@@ -0,0 +1,198 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Warm the web and parsed-place caches for a list of place IDs in the background
+"""
+
+from apographe.scheduler import scheduler
+from apographe.storage import write_file
+import json
+import logging
+from pathlib import Path
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+# how many completed IDs to accumulate before rewriting the state file
+STATE_FLUSH_INTERVAL = 25
+
+
+class Prefetcher:
+    """
+    Fetch (and discard) each place in a list of IDs from a gazetteer so that the
+    HTTP cache, the stored-response cache, and the parsed-place cache are warm
+    for later accession and align runs. Requests go through the gazetteer's
+    usual backend, so the shared per-host scheduler keeps the crawl polite; the
+    number of worker threads defaults to the concurrency the scheduler allows
+    for the gazetteer's place host. Completed and failed IDs are recorded in a
+    JSON state file (if one is given) so that an interrupted prefetch can be
+    resumed by starting another Prefetcher with the same state_path.
+    """
+
+    def __init__(self, gazetteer, ids: list, state_path=None, workers: int = None):
+        self.gazetteer = gazetteer
+        self.ids = list(dict.fromkeys(ids))  # unique, in order
+        self.state_path = None
+        if state_path is not None:
+            self.state_path = Path(state_path).expanduser().resolve()
+        self.workers = workers
+        self.done = set()
+        self.failed = dict()
+        self.resumed = 0
+        self._lock = Lock()
+        self._state_lock = Lock()  # one state file write at a time
+        self._stop = Event()
+        self._thread = None
+        self._started = None
+        self._finished = None
+        self._unsaved = 0
+        self._read_state()
+
+    def start(self):
+        """Begin prefetching on a background thread."""
+        if self.running:
+            raise RuntimeError("Prefetch is already running.")
+        self._stop.clear()
+        self._finished = None
+        self._started = monotonic()
+        self._thread = Thread(target=self._run, name="apographe-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Ask the workers to finish their current requests and stop."""
+        self._stop.set()
+
+    def wait(self, timeout: float = None):
+        """Block until prefetching finishes; return True if it has."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def progress(self):
+        """Report counts, elapsed time, and rate of the prefetch."""
+        with self._lock:
+            done = len(self.done)
+            failed = len(self.failed)
+        fetched = done - self.resumed
+        elapsed = 0.0
+        if self._started is not None:
+            elapsed = (self._finished or monotonic()) - self._started
+        rate = 0.0
+        if elapsed:
+            rate = fetched / elapsed
+        return {
+            "gazetteer": self.gazetteer.name,
+            "total": len(self.ids),
+            "done": done,
+            "failed": failed,
+            "resumed": self.resumed,
+            "remaining": len(self.ids) - done - failed,
+            "elapsed": elapsed,
+            "rate": rate,
+            "running": self.running,
+        }
+
+    def _run(self):
+        pending = Queue()
+        for id in self.ids:
+            if id not in self.done:
+                pending.put(id)
+        workers = self.workers or self._default_workers()
+        logger.info(
+            f"prefetching {pending.qsize()} of {len(self.ids)} places from "
+            f"{self.gazetteer.name} with {workers} workers"
+        )
+        threads = [
+            Thread(target=self._work, args=(pending,), daemon=True)
+            for i in range(workers)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self._finished = monotonic()
+        self._write_state()
+        logger.info(f"prefetch finished: {self.progress()}")
+
+    def _work(self, pending: Queue):
+        while not self._stop.is_set():
+            try:
+                id = pending.get_nowait()
+            except Empty:
+                return
+            try:
+                self.gazetteer.get(id)
+            except Exception as err:
+                logger.warning(f"Could not prefetch {self.gazetteer.name} {id}: {err}")
+                with self._lock:
+                    self.failed[id] = str(err)
+            else:
+                with self._lock:
+                    self.done.add(id)
+                    self.failed.pop(id, None)
+            try:
+                self._checkpoint()
+            except Exception as err:
+                # keep fetching; the state is written again at the next checkpoint
+                logger.warning(f"Could not save prefetch state: {err}")
+
+    def _checkpoint(self):
+        with self._lock:
+            self._unsaved += 1
+            if self._unsaved < STATE_FLUSH_INTERVAL:
+                return
+        self._write_state()
+        logger.info(f"prefetch progress: {self.progress()}")
+
+    def _default_workers(self):
+        try:
+            netloc = self.gazetteer.backend_configuration("web")["place_netloc"]
+        except (AttributeError, KeyError):
+            return 1
+        return scheduler.metrics(netloc)["concurrency"]
+
+    def _read_state(self):
+        if self.state_path is None or not self.state_path.exists():
+            return
+        with open(self.state_path, "r", encoding="utf-8") as fp:
+            state = json.load(fp)
+        del fp
+        if state["gazetteer"] != self.gazetteer.name:
+            raise ValueError(
+                f"Prefetch state file {self.state_path} belongs to gazetteer "
+                f"'{state['gazetteer']}', not '{self.gazetteer.name}'."
+            )
+        wanted = set(self.ids)
+        self.done = {id for id in state["done"] if id in wanted}
+        self.resumed = len(self.done)
+        # failed IDs are retried on resume
+
+    def _write_state(self):
+        if self.state_path is None:
+            return
+        with self._state_lock:
+            # taken under the state lock, so the last write is the latest state
+            with self._lock:
+                state = {
+                    "gazetteer": self.gazetteer.name,
+                    "done": sorted(self.done),
+                    "failed": dict(sorted(self.failed.items())),
+                }
+                self._unsaved = 0
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            write_file(
+                self.state_path,
+                json.dumps(state, ensure_ascii=False, indent=4).encode("utf-8"),
+            )
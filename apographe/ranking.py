@@ -0,0 +1,292 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Rank alignment candidates by one score combining distance, names, feature types,
+and descriptions
+"""
+
+from apographe.alignment import name_slugs, qgrams
+from apographe.geo import EARTH_RADIUS
+from apographe.linked_places_format import derive_all
+import logging
+import numpy as np
+import shapely
+
+logger = logging.getLogger(__name__)
+
+# weight of each component of a candidate's score
+WEIGHTS = {"distance": 0.4, "names": 0.4, "types": 0.1, "descriptions": 0.1}
+# distance, in meters, at which the distance component falls to 1/e
+DISTANCE_SCALE = 5000.0
+# shortest description words compared (shorter ones are mostly function words)
+MIN_WORD_LENGTH = 4
+
+
+def geodesic_distances(lons, lats, other_lons, other_lats):
+    """
+    Great-circle (haversine) distances, in meters, between each pair of WGS84
+    coordinates (in degrees); NaN where either coordinate is.
+    """
+    lon, lat, other_lon, other_lat = (
+        np.radians(np.asarray(a, dtype=float))
+        for a in (lons, lats, other_lons, other_lats)
+    )
+    h = (
+        np.sin((other_lat - lat) / 2) ** 2
+        + np.cos(lat) * np.cos(other_lat) * np.sin((other_lon - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+class _Sets:
+    """
+    One set of values per item, as integer IDs from a shared vocabulary (a
+    dictionary of IDs by value, extended as needed): the members of set i are
+    ids[offsets[i] : offsets[i + 1]].
+    """
+
+    __slots__ = ("offsets", "ids", "lengths")
+
+    def __init__(self, sets: list, vocabulary: dict):
+        self.lengths = np.fromiter(
+            (len(values) for values in sets), dtype=np.int64, count=len(sets)
+        )
+        self.offsets = np.zeros(len(sets) + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=self.offsets[1:])
+        self.ids = np.fromiter(
+            (
+                vocabulary.setdefault(v, len(vocabulary))
+                for values in sets
+                for v in values
+            ),
+            dtype=np.int64,
+            count=int(self.offsets[-1]),
+        )
+
+    def expand(self, rows):
+        """
+        List each member of set rows[k], for each k: return the arrays of the
+        k and of the member IDs, in order of k.
+        """
+        lengths = self.lengths[rows]
+        firsts = np.cumsum(lengths) - lengths
+        pairs = np.repeat(np.arange(len(rows)), lengths)
+        members = np.arange(int(lengths.sum())) + np.repeat(
+            self.offsets[rows] - firsts, lengths
+        )
+        return (pairs, self.ids[members])
+
+    def intersections(self, rows, other, columns, size: int):
+        """
+        The size of the intersection of set rows[k] with set columns[k] of other
+        (with the same vocabulary, of size values), for each k.
+        """
+        keys = np.repeat(np.arange(len(other.lengths)), other.lengths) * size
+        keys += other.ids
+        keys.sort()
+        if not len(keys):
+            return np.zeros(len(rows))
+        pairs, ids = self.expand(rows)
+        probes = columns[pairs] * size + ids
+        found = np.minimum(np.searchsorted(keys, probes), len(keys) - 1)
+        return np.bincount(pairs, weights=keys[found] == probes, minlength=len(rows))
+
+
+def _points(places: list):
+    """The (lons, lats) of the representative points of places; NaN if none."""
+    points = np.array(
+        [p.derived.representative_point if p.derived else None for p in places],
+        dtype=object,
+    )
+    return (shapely.get_x(points), shapely.get_y(points))
+
+
+def _name_similarities(slugs: list, other_slugs: list, rows, columns):
+    """
+    The best Dice coefficient of the q-grams of any name slug of slugs[rows[k]]
+    and any of other_slugs[columns[k]], for each k; NaN where either has none.
+    """
+    vocabulary = dict()
+    these = _Sets(slugs, vocabulary)
+    those = _Sets(other_slugs, vocabulary)
+    grams = dict()
+    slug_grams = _Sets([qgrams(slug) for slug in vocabulary], grams)
+    # every pair of slugs of every pair of places, each distinct one scored once
+    pairs, these_ids = these.expand(rows)
+    subpairs, those_ids = those.expand(columns[pairs])
+    pairs = pairs[subpairs]
+    slug_pairs, inverse = np.unique(
+        these_ids[subpairs] * len(vocabulary) + those_ids, return_inverse=True
+    )
+    these_ids, those_ids = np.divmod(slug_pairs, len(vocabulary))
+    common = slug_grams.intersections(these_ids, slug_grams, those_ids, len(grams))
+    dice = 2 * common / (slug_grams.lengths[these_ids] + slug_grams.lengths[those_ids])
+    dice = dice[inverse.reshape(-1)]
+    best = np.full(len(rows), np.nan)
+    if len(pairs):
+        present, starts = np.unique(pairs, return_index=True)
+        best[present] = np.maximum.reduceat(dice, starts)
+    return best
+
+
+def _jaccards(sets: list, other_sets: list, rows, columns):
+    """
+    The Jaccard index of sets[rows[k]] and other_sets[columns[k]], for each k;
+    NaN where either is empty.
+    """
+    vocabulary = dict()
+    these = _Sets(sets, vocabulary)
+    those = _Sets(other_sets, vocabulary)
+    common = these.intersections(rows, those, columns, len(vocabulary))
+    sizes = these.lengths[rows]
+    other_sizes = those.lengths[columns]
+    union = np.maximum(sizes + other_sizes - common, 1)
+    return np.where((sizes > 0) & (other_sizes > 0), common / union, np.nan)
+
+
+def _words(place):
+    """The (longer) words of a place's descriptions."""
+    return {w for w in place.descriptions.words if len(w) >= MIN_WORD_LENGTH}
+
+
+def score_pairs(
+    places: list,
+    others: list,
+    rows,
+    columns,
+    weights: dict = WEIGHTS,
+    scale: float = DISTANCE_SCALE,
+):
+    """
+    Score pairs of places, pair k being places[rows[k]] and others[columns[k]],
+    from 0 to 1. The components are:
+
+        distance: exp(-d / scale) of the geodesic distance d between the
+            places' representative points
+        names: the best similarity of their name slugs (see
+            alignment.similarity)
+        types: the Jaccard index of their feature types
+        descriptions: the Jaccard index of the (longer) words of their
+            descriptions
+
+    A pair's score is the weighted mean of the components available for it
+    (where both places have a geometry, names, types, or descriptions), with
+    weights by component name. Each place's slugs, types, and words are gathered
+    once and encoded as integer IDs, so that every component is computed for
+    all pairs at once with array operations (q-gram overlaps once per distinct
+    pair of slugs). Returns the array of scores and a dictionary of arrays of
+    each component (NaN where unavailable).
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    columns = np.asarray(columns, dtype=np.int64)
+    derive_all(list(places) + list(others))
+    lons, lats = _points(places)
+    other_lons, other_lats = _points(others)
+    distances = geodesic_distances(
+        lons[rows], lats[rows], other_lons[columns], other_lats[columns]
+    )
+    components = {
+        "distance": np.exp(-distances / scale),
+        "names": _name_similarities(
+            [name_slugs(p) for p in places],
+            [name_slugs(p) for p in others],
+            rows,
+            columns,
+        ),
+        "types": _jaccards(
+            [p.properties.types for p in places],
+            [p.properties.types for p in others],
+            rows,
+            columns,
+        ),
+        "descriptions": _jaccards(
+            [_words(p) for p in places], [_words(p) for p in others], rows, columns
+        ),
+    }
+    return (combine(components, weights), components)
+
+
+def combine(components: dict, weights: dict = WEIGHTS):
+    """
+    The weighted mean of each pair's components (arrays by component name),
+    ignoring those that are NaN; 0.0 where none is available.
+    """
+    total = None
+    weight = None
+    for name, w in weights.items():
+        component = components[name]
+        available = ~np.isnan(component)
+        if total is None:
+            total = np.zeros(component.shape)
+            weight = np.zeros(component.shape)
+        total += np.where(available, component, 0.0) * w
+        weight += available * w
+    return np.divide(total, weight, out=np.zeros(total.shape), where=weight > 0)
+
+
+def top_k(groups, scores, k: int = None, threshold: float = 0.0):
+    """
+    Select the pairs scoring at least threshold, and no more than k of them
+    (all if k is None) in each group, given each pair's group and score.
+    Returns their indices ordered by group, then by descending score; pairs
+    that tie keep their order.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    scores = np.asarray(scores, dtype=float)
+    order = np.lexsort((-scores, groups))
+    order = order[scores[order] >= threshold]
+    if k is not None and len(order):
+        ordered = groups[order]
+        starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+        lengths = np.diff(np.r_[starts, len(ordered)])
+        positions = np.arange(len(ordered)) - np.repeat(starts, lengths)
+        order = order[positions < k]
+    return order
+
+
+def rank_hits(
+    hits: dict,
+    places: dict,
+    candidates: dict,
+    k: int = None,
+    threshold: float = 0.0,
+    weights: dict = WEIGHTS,
+    scale: float = DISTANCE_SCALE,
+):
+    """
+    Rank the hits of an alignment (lists of hit dictionaries, each with the
+    "id" of a candidate, by key of the internal place aligned). places are the
+    internal places by key, and candidates the gazetteer's places by id. Each
+    hit is scored by score_pairs and given a "rank_score"; only the top k hits
+    of each place (all if k is None) that score at least threshold are kept,
+    in order of descending score.
+    """
+    keys = list(hits.keys())
+    flat = [(i, hit) for i, key in enumerate(keys) for hit in hits[key]]
+    positions = dict()
+    for i, hit in flat:
+        positions.setdefault(hit["id"], len(positions))
+    rows = [i for i, hit in flat]
+    columns = [positions[hit["id"]] for i, hit in flat]
+    scores, components = score_pairs(
+        [places[key] for key in keys],
+        [candidates[pid] for pid in positions],
+        rows,
+        columns,
+        weights,
+        scale,
+    )
+    ranked = {key: list() for key in keys}
+    for n in top_k(rows, scores, k, threshold).tolist():
+        i, hit = flat[n]
+        ranked[keys[i]].append(dict(hit, rank_score=float(scores[n])))
+    logger.debug(
+        f"ranked {len(flat)} hits of {len(keys)} places, "
+        f"kept {sum([len(h) for h in ranked.values()])}"
+    )
+    return ranked
@@ -0,0 +1,147 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Record web responses to a local fixture archive and replay them offline
+"""
+
+import base64
+from hashlib import sha1
+import json
+import logging
+from pathlib import Path
+from random import Random
+from requests import Response
+from requests.exceptions import HTTPError
+from requests.structures import CaseInsensitiveDict
+from threading import Lock
+from time import sleep
+
+logger = logging.getLogger(__name__)
+
+
+class MissingRecording(RuntimeError):
+    """Raised when a ReplayArchive has no recorded response for a URI."""
+
+
+class ReplayArchive:
+    """A directory of recorded HTTP responses, one JSON file per URI."""
+
+    def __init__(self, path):
+        self.path = Path(path).expanduser().resolve()
+        self._lock = Lock()
+
+    def filepath(self, uri: str):
+        """Determine where the response for uri is stored in the archive."""
+        return self.path / f"{sha1(uri.encode('utf-8')).hexdigest()}.json"
+
+    def record(self, uri: str, response):
+        """Store a response for uri in the archive."""
+        d = {
+            "uri": uri,
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+        }
+        try:
+            d["content"] = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            d["content_base64"] = base64.b64encode(response.content).decode("ascii")
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            with open(self.filepath(uri), "w", encoding="utf-8") as fp:
+                json.dump(d, fp, ensure_ascii=False, indent=4, sort_keys=True)
+            del fp
+
+    def response(self, uri: str):
+        """Reconstruct the recorded response for uri (KeyError if there is none)."""
+        try:
+            with open(self.filepath(uri), "r", encoding="utf-8") as fp:
+                d = json.load(fp)
+            del fp
+        except FileNotFoundError:
+            raise KeyError(uri)
+        r = Response()
+        r.url = d["uri"]
+        r.status_code = d["status_code"]
+        r.headers = CaseInsensitiveDict(d["headers"])
+        r.encoding = d["encoding"]
+        try:
+            r._content = d["content"].encode("utf-8")
+        except KeyError:
+            r._content = base64.b64decode(d["content_base64"])
+        return r
+
+    @property
+    def uris(self):
+        """List the URIs recorded in the archive."""
+        uris = list()
+        for filepath in sorted(self.path.glob("*.json")):
+            with open(filepath, "r", encoding="utf-8") as fp:
+                uris.append(json.load(fp)["uri"])
+            del fp
+        return uris
+
+    def __contains__(self, uri):
+        return self.filepath(uri).exists()
+
+
+class ReplayInterface:
+    """
+    Stand-in for a webiquette interface that serves responses from a ReplayArchive.
+    If an interface is supplied and record is True, responses are fetched through
+    it and recorded in the archive before being returned. Replayed responses are
+    delayed by latency seconds, plus up to jitter seconds chosen at random from a
+    seeded generator so that benchmark runs are reproducible.
+    """
+
+    def __init__(
+        self,
+        archive: ReplayArchive,
+        interface=None,
+        record: bool = False,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+    ):
+        if record and interface is None:
+            raise ValueError("Recording requires an interface to record from.")
+        self.archive = archive
+        self.interface = interface
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self._random = Random(seed)
+        self._lock = Lock()
+
+    def get(self, uri: str):
+        if self.record:
+            return self._record(uri)
+        try:
+            r = self.archive.response(uri)
+        except KeyError:
+            raise MissingRecording(
+                f"No recorded response for {uri} in replay archive {self.archive.path}."
+            )
+        delay = self.latency
+        if self.jitter:
+            with self._lock:
+                delay += self._random.uniform(0.0, self.jitter)
+        if delay:
+            sleep(delay)
+        r.raise_for_status()
+        return r
+
+    def _record(self, uri: str):
+        try:
+            r = self.interface.get(uri)
+        except HTTPError as err:
+            self.archive.record(uri, err.response)
+            raise
+        self.archive.record(uri, r)
+        logger.debug(f"recorded {uri}")
+        return r
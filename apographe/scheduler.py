@@ -0,0 +1,243 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Per-host politeness scheduling shared by all web backends
+
+Webiquette still applies robots.txt to each of its interfaces; the scheduler
+spaces requests to a host by its crawl-delay across all threads and backends, so
+requests are already that far apart when they reach an interface.
+"""
+
+from contextlib import contextmanager
+import logging
+import requests
+from threading import Condition, Lock
+from time import monotonic
+from urllib.robotparser import RobotFileParser
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 2
+
+
+def robots_crawl_delay(robots_uri: str, user_agent: str):
+    """Get the crawl-delay in seconds for user_agent from a robots.txt file, or None."""
+    try:
+        r = requests.get(robots_uri, headers={"User-Agent": user_agent}, timeout=30)
+        r.raise_for_status()
+    except requests.exceptions.RequestException as err:
+        logger.warning(f"Could not read {robots_uri}: {err}")
+        return None
+    parser = RobotFileParser(robots_uri)
+    parser.modified()  # otherwise the parser reports no crawl-delay
+    parser.parse(r.text.splitlines())
+    delay = parser.crawl_delay(user_agent)
+    if delay is None:
+        return None
+    return float(delay)
+
+
+class _Host:
+    """Token bucket, concurrency limit, and metrics for one host."""
+
+    def __init__(self):
+        self.cond = Condition()
+        self.concurrency = DEFAULT_CONCURRENCY
+        self.rate = None  # tokens per second; None for no rate limit
+        self.burst = 1
+        self.tokens = 1.0
+        self.refilled = monotonic()
+        self.delay = None  # crawl-delay in seconds
+        self.robots_uri = None
+        self.robots_checked = False
+        self.user_agent = None
+        self.robots_lock = Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.requests = 0
+        self.refunds = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def refill(self, now: float):
+        if self.rate is None:
+            self.tokens = float(self.burst)
+        else:
+            self.tokens = min(
+                float(self.burst), self.tokens + (now - self.refilled) * self.rate
+            )
+        self.refilled = now
+
+    def crawl_delay(self, delay: float):
+        """Allow one request at a time, at most one per delay seconds."""
+        self.delay = delay
+        self.concurrency = 1
+        self.rate = 1.0 / delay
+        self.burst = 1
+        self.tokens = min(self.tokens, 1.0)
+
+    def ready(self):
+        return self.in_flight < self.concurrency and self.tokens >= 1.0
+
+    def timeout(self):
+        if self.in_flight >= self.concurrency or self.rate is None:
+            return None
+        return (1.0 - self.tokens) / self.rate
+
+
+class HostScheduler:
+    """
+    Coordinate requests to each host across all threads and gazetteer instances.
+    Each host gets a token bucket (refilled at 1/crawl-delay tokens per second when
+    robots.txt sets a crawl-delay, or at a configured rate) and a limit on the number
+    of requests in flight at once (1 for a host with a crawl-delay). Requests
+    answered from a local cache can hand their token back with refund().
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._hosts = dict()
+
+    def configure(
+        self,
+        host: str,
+        concurrency: int = None,
+        rate: float = None,
+        burst: int = None,
+        crawl_delay: float = None,
+        robots_uri: str = None,
+        user_agent: str = None,
+    ):
+        """
+        Set politeness rules for a host. A crawl_delay overrides concurrency and
+        rate; a robots_uri is read for a crawl-delay the first time a request to the
+        host is scheduled.
+        """
+        state = self._host(host)
+        with state.cond:
+            if concurrency is not None:
+                if concurrency < 1:
+                    raise ValueError(
+                        f"Expected concurrency of at least 1 but got {concurrency}."
+                    )
+                state.concurrency = concurrency
+            if burst is not None:
+                state.burst = burst
+            if rate is not None:
+                state.rate = rate
+            if crawl_delay:
+                state.delay = crawl_delay
+            if state.delay:
+                state.crawl_delay(state.delay)
+            if robots_uri is not None and not state.robots_checked:
+                state.robots_uri = robots_uri
+                state.user_agent = user_agent
+            state.tokens = min(state.tokens, float(state.burst))
+            state.cond.notify_all()
+
+    def acquire(self, host: str):
+        """Block until a request to host is allowed; return the seconds waited."""
+        state = self._host(host)
+        self._read_robots(host, state)
+        start = monotonic()
+        with state.cond:
+            state.waiting += 1
+            state.peak_waiting = max(state.peak_waiting, state.waiting)
+            try:
+                while True:
+                    state.refill(monotonic())
+                    if state.ready():
+                        break
+                    state.cond.wait(state.timeout())
+            finally:
+                state.waiting -= 1
+            state.tokens -= 1.0
+            state.in_flight += 1
+            waited = monotonic() - start
+            state.requests += 1
+            state.total_wait += waited
+            state.max_wait = max(state.max_wait, waited)
+        return waited
+
+    def release(self, host: str):
+        """Mark a request to host as finished."""
+        state = self._host(host)
+        with state.cond:
+            state.in_flight -= 1
+            state.cond.notify_all()
+
+    def refund(self, host: str):
+        """Return the token of a request that never reached host (e.g., a cache hit)."""
+        state = self._host(host)
+        with state.cond:
+            state.tokens = min(float(state.burst), state.tokens + 1.0)
+            state.refunds += 1
+            state.cond.notify_all()
+
+    @contextmanager
+    def slot(self, host: str):
+        """Context manager wrapping acquire() and release()."""
+        self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def metrics(self, host: str = None):
+        """Report queue depth, wait times, and request counts (per host, or all)."""
+        if host is None:
+            with self._lock:
+                hosts = list(self._hosts.keys())
+            return {h: self.metrics(h) for h in sorted(hosts)}
+        state = self._host(host)
+        with state.cond:
+            mean_wait = 0.0
+            if state.requests:
+                mean_wait = state.total_wait / state.requests
+            return {
+                "concurrency": state.concurrency,
+                "rate": state.rate,
+                "crawl_delay": state.delay,
+                "queue_depth": state.waiting,
+                "peak_queue_depth": state.peak_waiting,
+                "in_flight": state.in_flight,
+                "requests": state.requests,
+                "refunds": state.refunds,
+                "total_wait": state.total_wait,
+                "mean_wait": mean_wait,
+                "max_wait": state.max_wait,
+            }
+
+    def _host(self, host: str):
+        with self._lock:
+            try:
+                return self._hosts[host]
+            except KeyError:
+                self._hosts[host] = _Host()
+                return self._hosts[host]
+
+    def _read_robots(self, host: str, state: _Host):
+        if state.robots_uri is None:
+            return
+        with state.robots_lock:
+            robots_uri = state.robots_uri
+            if robots_uri is None:
+                return  # read by another thread while this one waited
+            crawl_delay = robots_crawl_delay(robots_uri, state.user_agent)
+            logger.debug(f"{host} crawl-delay: {crawl_delay}")
+            with state.cond:
+                state.robots_uri = None
+                state.robots_checked = True
+                if crawl_delay:
+                    state.crawl_delay(crawl_delay)
+                state.cond.notify_all()
+
+
+# shared by all web backends in this process
+scheduler = HostScheduler()
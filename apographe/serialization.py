@@ -17,19 +17,67 @@ from pprint import pformat
 from shapely.geometry import mapping, GeometryCollection, Point, LineString, Polygon
 
 
+# slot names by class, across the MRO
+_slot_names = dict()
+
+
+def slot_names(cls: type):
+    """List the names of all slots declared by cls and its bases, in MRO order."""
+    try:
+        return _slot_names[cls]
+    except KeyError:
+        pass
+    names = list()
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get("__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        names.extend([n for n in slots if n not in {"__dict__", "__weakref__"}])
+    _slot_names[cls] = tuple(names)
+    return _slot_names[cls]
+
+
 class Serialization:
+    """
+    Mixin for dictionary/JSON serialization of an object's attributes.
+    Classes with many small instances can declare __slots__ and set the class
+    attributes _omit, _promote, and _refactor instead of calling __init__.
+    """
+
+    __slots__ = ()
+    _omit = frozenset({"_omit", "_promote", "_refactor", "_extra"})
+    _promote = ""
+    _refactor = False
+
     def __init__(self, omit: list = [], promote: str = "", refactor: type = False):
-        self._omit = {"_omit", "_promote", "_refactor"}
-        if isinstance(omit, (list, set, tuple)):
-            self._omit.update(omit)
-        elif isinstance(omit, str):
-            self._omit.add(omit)
-        self._promote = promote
-        self._refactor = refactor
+        # store only what differs from the class-level defaults
+        if omit:
+            self._omit = set(type(self)._omit)
+            if isinstance(omit, (list, set, tuple)):
+                self._omit.update(omit)
+            elif isinstance(omit, str):
+                self._omit.add(omit)
+        if promote:
+            self._promote = promote
+        if refactor:
+            self._refactor = refactor
+
+    def _variables(self):
+        """Get (name, value) for each attribute set on the instance."""
+        try:
+            items = list(vars(self).items())
+        except TypeError:
+            items = list()
+        for name in slot_names(type(self)):
+            try:
+                items.append((name, getattr(self, name)))
+            except AttributeError:
+                pass  # slot not set
+        return items
 
     def asdict(self):
         d = dict()
-        for varname, varval in vars(self).items():
+        for varname, varval in self._variables():
             if varname in self._omit:
                 continue
             if varname.startswith("_"):
@@ -47,6 +95,11 @@ class Serialization:
             cooked = self._asdict_process(val)
             if cooked:
                 d[attrname] = cooked
+        # values kept for keys with no attribute of their own (see LanguageAware)
+        for attrname, val in getattr(self, "_extra", dict()).items():
+            cooked = self._asdict_process(val)
+            if cooked and attrname not in d:
+                d[attrname] = cooked
         if self._promote and len(d) == 1:
             d = d[list(d.keys())[0]]
         elif self._promote:
@@ -61,7 +114,11 @@ class Serialization:
 
     def _asdict_process(self, value):
 
-        if isinstance(value, (list, set, tuple)):
+        if isinstance(value, (set, frozenset)):
+            # in a stable order, so that unchanged places serialize the same in
+            # any process (set order varies with string hashing)
+            return [self._asdict_process(v) for v in sorted(value, key=str)]
+        elif isinstance(value, (list, tuple)):
             return [self._asdict_process(v) for v in value]
         elif isinstance(value, dict):
             return {k: self._asdict_process(v) for k, v in value.items()}
@@ -0,0 +1,339 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Save and restore the internal gazetteer as a binary, columnar snapshot
+"""
+
+from apographe.geo import DerivedGeometry, point_cells
+from apographe.languages_and_scripts import parse_language_tag
+from apographe.linked_places_format import derive_all, Description, Name
+from apographe.place import LazyPlace
+from apographe.storage import write_file
+from hashlib import md5
+from io import BytesIO
+import json
+import logging
+import numpy as np
+from pathlib import Path
+import shapely
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "apographe-snapshot-1"
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# columns of strings: one value per place, per name, or per description
+STRING_COLUMNS = (
+    "key",
+    "id",
+    "uri",
+    "title",
+    "ccodes",
+    "name_key",
+    "toponym",
+    "romanizations",
+    "name_language",
+    "description_key",
+    "description_value",
+    "description_source",
+    "description_language",
+    "description_words",
+)
+# columns of strings added since the first snapshots, which load without them:
+# name and description IDs, and the keys they keep with no attribute of their
+# own (see LanguageAware.extra) as JSON
+OPTIONAL_COLUMNS = ("name_id", "name_extra", "description_id", "description_extra")
+# shapes of each place's DerivedGeometry, saved as WKB columns
+DERIVED_SHAPES = ("hull", "centroid", "representative_point", "footprint")
+# separates the romanizations of a name within one string column value
+ROMANIZATION_SEPARATOR = "\x1f"
+# separates the feature types of a place within one string column value
+TYPE_SEPARATOR = " "
+
+
+def _pack_strings(values: list):
+    """Pack strings into a UTF-8 byte array and their character offsets."""
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    data = np.frombuffer("".join(values).encode("utf-8"), dtype=np.uint8)
+    return (data, offsets)
+
+
+def _unpack_strings(data, offsets):
+    text = data.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    return [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _pack_bytes(values: list):
+    """Pack byte strings into a byte array and their offsets."""
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=offsets[1:])
+    data = np.frombuffer(b"".join(values), dtype=np.uint8)
+    return (data, offsets)
+
+
+def _unpack_bytes(data, offsets):
+    content = data.tobytes()
+    bounds = offsets.tolist()
+    return [content[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _pack_geometries(geometries: list):
+    """Pack geometries (or None) as WKB, with offsets."""
+    wkb = shapely.to_wkb(np.array(geometries, dtype=object)).tolist()
+    return _pack_bytes([b"" if w is None else w for w in wkb])
+
+
+def _unpack_geometries(wkb: list):
+    return shapely.from_wkb(np.array([w or None for w in wkb], dtype=object)).tolist()
+
+
+def _unpack_derived(arrays, wkb: list):
+    """
+    Restore the DerivedGeometry saved for each place, or None where there is none
+    or it was not derived from the geometry saved with the place.
+    """
+    keys = _unpack_strings(arrays["derived_key_data"], arrays["derived_key_offsets"])
+    shapes = {
+        k: _unpack_geometries(
+            _unpack_bytes(arrays[f"{k}_data"], arrays[f"{k}_offsets"])
+        )
+        for k in DERIVED_SHAPES
+    }
+    bounds = [tuple(b) for b in arrays["bounds"].tolist()]
+    if "derived_cell_data" in arrays.files:
+        cells = _unpack_strings(
+            arrays["derived_cell_data"], arrays["derived_cell_offsets"]
+        )
+    else:  # saved before cell keys were derived
+        empty = shapely.Point()
+        cells = point_cells(
+            [p if p is not None else empty for p in shapes["representative_point"]]
+        )
+    derived = list()
+    for i, key in enumerate(keys):
+        if not key or key != md5(wkb[i]).hexdigest():
+            derived.append(None)
+            continue
+        derived.append(
+            DerivedGeometry(
+                key,
+                shapes["hull"][i],
+                shapes["centroid"][i],
+                bounds[i],
+                shapes["representative_point"][i],
+                shapes["footprint"][i],
+                cells[i],
+            )
+        )
+    return derived
+
+
+def _tag(item):
+    if item._language_tag is None:
+        return ""
+    return item._language_tag.format
+
+
+def _set_tag(item, value: str):
+    if value:
+        (
+            item._language_tag,
+            item._language_subtag,
+            item._region_subtag,
+            item._script_subtag,
+        ) = parse_language_tag(value)
+    else:
+        item._language_tag = None
+        item._language_subtag = None
+        item._region_subtag = None
+        item._script_subtag = None
+
+
+def _extra(item):
+    """The keys item keeps with no attribute of its own, as JSON ("" if none)."""
+    extra = item.extra
+    if not extra:
+        return ""
+    return json.dumps(extra, ensure_ascii=False, sort_keys=True, default=sorted)
+
+
+def _set_extra(item, value: str):
+    if value:
+        item._extra = json.loads(value)
+
+
+def dump_snapshot(places: dict, filepath):
+    """
+    Save places, a dictionary of places by key, to a snapshot file. Places,
+    names, and descriptions are stored as columns of already-normalized strings
+    (packed UTF-8 with offsets) and geometries as WKB, so that load_snapshot()
+    can rebuild them without re-parsing JSON, re-normalizing text, or rebuilding
+    geometries from GeoJSON. Each place's derived geometry (see
+    Feature.derived) is computed if need be and saved too. Raw upstream
+    payloads are not saved.
+    """
+    columns = {k: list() for k in STRING_COLUMNS + OPTIONAL_COLUMNS}
+    name_offsets = [0]
+    description_offsets = [0]
+    geometries = list()
+    for key, place in places.items():
+        columns["key"].append(key)
+        columns["id"].append(place.id or "")
+        columns["uri"].append(place.uri or "")
+        columns["title"].append(place.properties.title)
+        columns["ccodes"].append(" ".join(sorted(place.properties.ccodes)))
+        for name_key, name in place.names._names.items():
+            columns["name_key"].append(name_key)
+            columns["toponym"].append(name.toponym or "")
+            columns["romanizations"].append(
+                ROMANIZATION_SEPARATOR.join(sorted(name._romanizations))
+            )
+            columns["name_language"].append(_tag(name))
+            columns["name_id"].append(getattr(name, "id", None) or "")
+            columns["name_extra"].append(_extra(name))
+        name_offsets.append(len(columns["name_key"]))
+        index = dict()
+        for word, description_keys in place.descriptions._index.items():
+            for description_key in description_keys:
+                try:
+                    index[description_key].append(word)
+                except KeyError:
+                    index[description_key] = [word]
+        for description_key, description in place.descriptions._descriptions.items():
+            columns["description_key"].append(description_key)
+            columns["description_value"].append(description.value)
+            columns["description_source"].append(description.source)
+            columns["description_language"].append(_tag(description))
+            columns["description_id"].append(getattr(description, "id", None) or "")
+            columns["description_extra"].append(_extra(description))
+            columns["description_words"].append(
+                " ".join(sorted(index.get(description_key, [])))
+            )
+        description_offsets.append(len(columns["description_key"]))
+        geometry = place.geometry
+        if isinstance(geometry, list):
+            geometry = None  # no geometry
+        geometries.append(geometry)
+    arrays = {
+        "format": np.array([SNAPSHOT_FORMAT]),
+        "name_offsets": np.array(name_offsets, dtype=np.int64),
+        "description_offsets": np.array(description_offsets, dtype=np.int64),
+    }
+    for k, values in columns.items():
+        arrays[f"{k}_data"], arrays[f"{k}_offsets"] = _pack_strings(values)
+    arrays["geometry_data"], arrays["geometry_offsets"] = _pack_geometries(geometries)
+    derive_all(list(places.values()))
+    derived = [place._derived for place in places.values()]
+    arrays["derived_key_data"], arrays["derived_key_offsets"] = _pack_strings(
+        [d.key if d else "" for d in derived]
+    )
+    arrays["derived_cell_data"], arrays["derived_cell_offsets"] = _pack_strings(
+        [d.cell if d else "" for d in derived]
+    )
+    arrays["types_data"], arrays["types_offsets"] = _pack_strings(
+        [TYPE_SEPARATOR.join(place.properties.types) for place in places.values()]
+    )
+    for k in DERIVED_SHAPES:
+        arrays[f"{k}_data"], arrays[f"{k}_offsets"] = _pack_geometries(
+            [getattr(d, k) if d else None for d in derived]
+        )
+    arrays["bounds"] = np.array(
+        [d.bounds if d else (np.nan,) * 4 for d in derived], dtype=float
+    ).reshape(-1, 4)
+    buffer = BytesIO()
+    np.savez(buffer, **arrays)
+    write_file(filepath, buffer.getvalue())
+    logger.debug(f"saved snapshot of {len(places)} places to {str(filepath)}")
+
+
+def load_snapshot(filepath):
+    """
+    Restore a dictionary of places by key from a snapshot file. Places are
+    restored complete, with their derived geometry, except for their URIs, which
+    are parsed when first used (see LazyPlace).
+    """
+    with np.load(Path(filepath), allow_pickle=False) as arrays:
+        if arrays["format"].tolist() != [SNAPSHOT_FORMAT]:
+            raise ValueError(f"{filepath} is not an apographe snapshot.")
+        columns = {
+            k: _unpack_strings(arrays[f"{k}_data"], arrays[f"{k}_offsets"])
+            for k in STRING_COLUMNS
+        }
+        for k in ["name", "description"]:
+            for column in [f"{k}_id", f"{k}_extra"]:
+                if f"{column}_data" in arrays.files:
+                    columns[column] = _unpack_strings(
+                        arrays[f"{column}_data"], arrays[f"{column}_offsets"]
+                    )
+                else:  # saved before names and descriptions kept these
+                    columns[column] = [""] * len(columns[f"{k}_key"])
+        wkb = _unpack_bytes(arrays["geometry_data"], arrays["geometry_offsets"])
+        geometries = _unpack_geometries(wkb)
+        name_offsets = arrays["name_offsets"].tolist()
+        description_offsets = arrays["description_offsets"].tolist()
+        derived = [None] * len(columns["key"])
+        if "derived_key_data" in arrays.files:
+            derived = _unpack_derived(arrays, wkb)
+        types = [""] * len(columns["key"])
+        if "types_data" in arrays.files:  # saved since places had types
+            types = _unpack_strings(arrays["types_data"], arrays["types_offsets"])
+    places = dict()
+    match_keys = dict()  # by name string, as many places share name strings
+    for i, key in enumerate(columns["key"]):
+        place = LazyPlace()
+        if columns["id"][i]:
+            place._id = columns["id"][i]
+        if columns["uri"][i]:
+            place._pending["uri"] = columns["uri"][i]  # parsed when first used
+        place.properties._title = columns["title"][i]
+        place.properties._ccodes = set(columns["ccodes"][i].split())
+        if types[i]:
+            place.properties._types = set(types[i].split(TYPE_SEPARATOR))
+        names = place.names
+        for j in range(name_offsets[i], name_offsets[i + 1]):
+            name = Name.__new__(Name)
+            name._name_key = None
+            name._toponym = columns["toponym"][j] or None
+            romanizations = columns["romanizations"][j]
+            if romanizations:
+                name._romanizations = set(romanizations.split(ROMANIZATION_SEPARATOR))
+            else:
+                name._romanizations = set()
+            _set_tag(name, columns["name_language"][j])
+            if columns["name_id"][j]:
+                name.id = columns["name_id"][j]
+            _set_extra(name, columns["name_extra"][j])
+            name_key = columns["name_key"][j]
+            names._names[name_key] = name
+            names._index_name(name_key, name, match_keys)
+        descriptions = place.descriptions
+        for j in range(description_offsets[i], description_offsets[i + 1]):
+            description = Description.__new__(Description)
+            description._description_key = None
+            description._value = columns["description_value"][j]
+            description._source = columns["description_source"][j]
+            _set_tag(description, columns["description_language"][j])
+            if columns["description_id"][j]:
+                description.id = columns["description_id"][j]
+            _set_extra(description, columns["description_extra"][j])
+            description_key = columns["description_key"][j]
+            descriptions._descriptions[description_key] = description
+            words = columns["description_words"][j]
+            for word in words.split(" ") if words else []:
+                try:
+                    descriptions._index[word].add(description_key)
+                except KeyError:
+                    descriptions._index[word] = {description_key}
+        if geometries[i] is not None:
+            place.geometry = geometries[i]
+            place._derived = derived[i]
+        places[key] = place
+    logger.debug(f"loaded snapshot of {len(places)} places from {str(filepath)}")
+    return places
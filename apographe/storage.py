@@ -0,0 +1,353 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Read and write places as Linked Places Format files on the local filesystem
+"""
+
+from apographe.linked_places_format import dumps, load, make_geometries
+from apographe.place import LazyPlace, Place
+from apographe.serialization import ApographeEncoder
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import md5
+from itertools import repeat
+import json
+import logging
+from os import cpu_count
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+from uuid import uuid4
+
+logger = logging.getLogger(__name__)
+
+# encoded files waiting to be written before encoding pauses for the writers
+WRITE_QUEUE_SIZE = 256
+# threads writing encoded files to disk
+WRITER_THREADS = 4
+# most files read together, so their geometries are built in one batch
+READ_BATCH = 256
+# most places sent to a worker process at once for encoding
+MAX_ENCODE_BATCH = 128
+
+# target number of places per file when saving shards
+SHARD_SIZE = 1000
+# file listing the shards saved in a directory
+MANIFEST_NAME = "manifest.json"
+MANIFEST_FORMAT = "apographe-shards-1"
+
+# per-process encoder, built on first use (see encode_place)
+_encoder = None
+
+
+def pool_size(processes: int = 0):
+    """Number of worker processes to use; 0 (or None) for one per available core."""
+    if not processes:
+        return cpu_count() or 1
+    if processes < 0:
+        raise ValueError(
+            f"Expected a non-negative number of processes but got {processes}."
+        )
+    return processes
+
+
+def make_places(features: list, lazy: bool = False):
+    """
+    Build a Place (or LazyPlace) from each of a list of LPF feature dictionaries.
+    Eager places have their geometries built together in one batch.
+    """
+    if lazy:
+        return [LazyPlace(**f) for f in features]
+    places = list()
+    for f, geometry in zip(features, make_geometries(features)):
+        kwargs = {k: v for k, v in f.items() if k not in ["geometry", "geometries"]}
+        if not isinstance(geometry, list):
+            kwargs["geometry"] = geometry
+        places.append(Place(**kwargs))
+    return places
+
+
+def read_places(filepath, lazy: bool = False):
+    """Build a Place (or LazyPlace) for each feature in an LPF file."""
+    return read_many_places([filepath], lazy)[0]
+
+
+def read_many_places(filepaths: list, lazy: bool = False):
+    """
+    Read places from each of filepaths, as read_places() would, building the
+    geometries of all of the files' places in one batch. Returns a list of lists
+    of places, one per file.
+    """
+    features = list()
+    for filepath in filepaths:
+        with open(filepath, "r", encoding="utf-8") as fp:
+            features.append(load(fp))
+        del fp
+    places = make_places([f for these in features for f in these], lazy)
+    result = list()
+    i = 0
+    for these in features:
+        result.append(places[i : i + len(these)])
+        i += len(these)
+    return result
+
+
+def iter_read_places(filepaths: list, lazy: bool = False, processes: int = 1):
+    """
+    Yield (filepath, places) for each of filepaths, in order. Files are read in
+    batches (see read_many_places), in this process or, with more than one
+    process, across a process pool.
+    """
+    processes = pool_size(processes)
+    if processes == 1 or len(filepaths) < 2:
+        size = READ_BATCH
+    else:
+        size = max(1, min(READ_BATCH, len(filepaths) // (processes * 4)))
+    batches = [filepaths[i : i + size] for i in range(0, len(filepaths), size)]
+    if processes == 1 or len(batches) < 2:
+        results = map(read_many_places, batches, repeat(lazy))
+        for batch, places in zip(batches, results):
+            yield from zip(batch, places)
+        return
+    logger.debug(
+        f"reading {len(filepaths)} files with {processes} processes (batches of {size})"
+    )
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(read_many_places, batches, repeat(lazy))
+        for batch, places in zip(batches, results):
+            yield from zip(batch, places)
+
+
+def encode_place(place):
+    """Serialize a place (or a list of places) as the UTF-8 content of an LPF file."""
+    global _encoder
+    if _encoder is None:
+        _encoder = ApographeEncoder(ensure_ascii=False, indent=4, sort_keys=True)
+    return dumps(place, encoder=_encoder).encode("utf-8")
+
+
+def encode_places(places: list):
+    """Serialize each of places with encode_place()."""
+    return [encode_place(place) for place in places]
+
+
+def encode_shard(places: list):
+    """
+    Serialize a list of places as the UTF-8 content of a shard file, leaving out
+    their internal IDs, which are made anew each time places are loaded (so that
+    reloaded places that have not changed encode to the same content).
+    """
+    features = list()
+    for place in places:
+        feature = place.asdict()
+        feature.pop("id_internal", None)
+        features.append(feature)
+    return encode_place(features)
+
+
+def encode_shards(buckets: list):
+    """Serialize each of buckets, a list of lists of places, with encode_shard()."""
+    return [encode_shard(places) for places in buckets]
+
+
+def write_file(filepath, content: bytes):
+    """Write content to filepath via a temporary file, so it never appears partial."""
+    filepath = Path(filepath)
+    tmp_path = filepath.with_name(f".{filepath.name}.{uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "wb") as fp:
+            fp.write(content)
+        del fp
+        tmp_path.replace(filepath)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def write_places(items: list, processes: int = 1, writers: int = WRITER_THREADS):
+    """
+    Save each of items, a list of (filepath, place) with distinct file paths, as a
+    single-place LPF file and return the number of files written. Places are
+    encoded in the calling thread, or in batches across a process pool if
+    processes is more than one, and the encoded files pass through a bounded
+    queue to a set of writer threads.
+    """
+    filepaths = [filepath for filepath, place in items]
+    seen = set()
+    duplicates = set()
+    for filepath in filepaths:
+        filepath = Path(filepath)
+        if filepath in seen:
+            duplicates.add(str(filepath))
+        seen.add(filepath)
+    if duplicates:
+        raise ValueError(
+            f"Expected a distinct file path for each place but got more than one "
+            f"place for: {', '.join(sorted(duplicates))}."
+        )
+    contents = _iter_encoded([place for filepath, place in items], pool_size(processes))
+    return _write_files(zip(filepaths, contents), writers)
+
+
+def shard_index(key: str, shards: int):
+    """Assign key to one of shards by a hash that is stable across runs and hosts."""
+    return int(md5(key.encode("utf-8")).hexdigest()[:8], 16) % shards
+
+
+def shard_filename(index: int):
+    return f"shard-{index:05d}.json"
+
+
+def read_manifest(dirpath):
+    """Return the shard manifest saved in dirpath, or None if there is none."""
+    try:
+        with open(Path(dirpath) / MANIFEST_NAME, "r", encoding="utf-8") as fp:
+            manifest = json.load(fp)
+        del fp
+    except FileNotFoundError:
+        return None
+    if manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError(
+            f"{Path(dirpath) / MANIFEST_NAME} is not an apographe shard manifest."
+        )
+    return manifest
+
+
+def write_shards(
+    dirpath,
+    places: dict,
+    shard_size: int = SHARD_SIZE,
+    processes: int = 1,
+    writers: int = WRITER_THREADS,
+):
+    """
+    Save places, a dictionary of places by key, as LPF shard files of about
+    shard_size places each, plus a manifest listing each shard's file, number of
+    places, MD5 digest, and place keys (in feature order). Each place is assigned
+    to a shard by a stable hash of its key and shards list their places in key
+    order without internal IDs (see encode_shard), so a shard whose places have
+    not changed, even if reloaded, encodes to the same content and is not
+    rewritten. The shard count of an existing manifest is kept unless the places
+    outgrow it. Return (shards written, total shards).
+    """
+    if shard_size < 1:
+        raise ValueError(f"Expected a positive shard size but got {shard_size}.")
+    dirpath = Path(dirpath)
+    previous = read_manifest(dirpath)
+    count = max(1, -(-len(places) // shard_size))
+    if previous is not None and len(previous["shards"]) >= count:
+        count = len(previous["shards"])
+    keys = [list() for i in range(count)]
+    for key in sorted(places):
+        keys[shard_index(key, count)].append(key)
+    buckets = [[places[key] for key in these_keys] for these_keys in keys]
+    filepaths = [dirpath / shard_filename(i) for i in range(count)]
+    digests = dict()
+    if previous is not None:
+        digests = {s["file"]: s["md5"] for s in previous["shards"]}
+    shards = list()
+    changed = list()
+    contents = _iter_encoded(
+        buckets, pool_size(processes), encode_shard, encode_shards
+    )
+    for filepath, these_keys, content in zip(filepaths, keys, contents):
+        digest = md5(content).hexdigest()
+        shards.append(
+            {
+                "file": filepath.name,
+                "places": len(these_keys),
+                "md5": digest,
+                "keys": these_keys,
+            }
+        )
+        if digests.get(filepath.name) != digest or not filepath.exists():
+            changed.append((filepath, content))
+    written = _write_files(changed, writers)
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "places": len(places),
+        "shard_size": shard_size,
+        "shards": shards,
+    }
+    write_file(
+        dirpath / MANIFEST_NAME,
+        json.dumps(manifest, ensure_ascii=False, indent=4).encode("utf-8"),
+    )
+    if previous is not None:
+        current = {s["file"] for s in shards}
+        for s in previous["shards"]:
+            if s["file"] not in current:
+                (dirpath / s["file"]).unlink(missing_ok=True)
+    logger.debug(f"wrote {written} of {count} shards to {str(dirpath)}")
+    return (written, count)
+
+
+def _write_files(items, writers: int = WRITER_THREADS):
+    """
+    Write each (filepath, content) of items with write_file() on a set of writer
+    threads fed through a bounded queue; return the number of files written.
+    """
+    pending = Queue(maxsize=WRITE_QUEUE_SIZE)
+    errors = list()
+
+    def work():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            if errors:
+                continue  # keep draining so the producer is never blocked
+            try:
+                write_file(*item)
+            except Exception as err:
+                errors.append(err)
+
+    threads = [
+        Thread(target=work, name=f"apographe-writer-{i}", daemon=True)
+        for i in range(max(1, writers))
+    ]
+    for t in threads:
+        t.start()
+    i = 0
+    try:
+        for item in items:
+            if errors:
+                break
+            pending.put(item)
+            i += 1
+    finally:
+        for t in threads:
+            pending.put(None)
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+    return i
+
+
+def _iter_encoded(
+    places: list,
+    processes: int,
+    encode=encode_place,
+    encode_batch=encode_places,
+):
+    """
+    Yield encode() of each of places, in order; encode_batch encodes a batch of
+    them in a pool process.
+    """
+    if processes == 1 or len(places) < 2:
+        for place in places:
+            yield encode(place)
+        return
+    size = max(1, min(MAX_ENCODE_BATCH, len(places) // (processes * 4)))
+    batches = [places[i : i + size] for i in range(0, len(places), size)]
+    logger.debug(
+        f"encoding {len(places)} places with {processes} processes (batches of {size})"
+    )
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for contents in executor.map(encode_batch, batches):
+            yield from contents
@@ -9,10 +9,89 @@ Utilities for working with text
 """
 
 import logging
+import regex
 from textnorm import normalize_space, normalize_unicode
+import unicodedata
 
 logger = logging.getLogger(__name__)
 
+# letters that Unicode decomposition does not reduce to a base letter and a mark
+FOLDED_LETTERS = str.maketrans(
+    {
+        "æ": "ae",
+        "Æ": "AE",
+        "đ": "d",
+        "Đ": "D",
+        "ð": "d",
+        "Ð": "D",
+        "ħ": "h",
+        "Ħ": "H",
+        "ı": "i",
+        "ł": "l",
+        "Ł": "L",
+        "ø": "o",
+        "Ø": "O",
+        "œ": "oe",
+        "Œ": "OE",
+        "þ": "th",
+        "Þ": "TH",
+    }
+)
+
+# spellings that transliteration conventions, Latin and Greek orthography, and
+# modern languages render differently, reduced to one spelling for phonetic keys
+PHONETIC_SPELLINGS = {
+    "ph": "f",
+    "ou": "u",
+    "ae": "e",
+    "ai": "e",
+    "oe": "e",
+    "oi": "e",
+    "ei": "i",
+    "c": "k",
+    "q": "k",
+    "h": "",
+    "j": "i",
+    "y": "i",
+    "v": "u",
+    "w": "u",
+    "x": "ks",
+}
+
+rx_not_letters = regex.compile(r"[^\p{Letter}]+")
+rx_latin_key = regex.compile(r"[a-z]+")
+# digraphs first, so they are replaced before their letters are
+rx_phonetic_spellings = regex.compile(
+    "|".join(sorted(PHONETIC_SPELLINGS, key=len, reverse=True))
+)
+rx_doubled = regex.compile(r"(.)\1+")
+
 
 def normtext(s: str):
     return normalize_space(normalize_unicode(s))
+
+
+def name_key(s: str):
+    """
+    Reduce a name string to the key compared when matching names: its letters
+    only, without diacritics, and case-folded (e.g. "Zouchábbari (2)" becomes
+    "zouchabbari"). Letters in other scripts are kept, so a name matches its
+    romanizations only through keys of those romanizations.
+    """
+    decomposed = unicodedata.normalize("NFKD", s.translate(FOLDED_LETTERS))
+    # combining marks are not letters, so this drops the diacritics too
+    return rx_not_letters.sub("", decomposed).casefold()
+
+
+def phonetic_key(key: str):
+    """
+    Reduce a match key (see name_key) to a phonetic key that also ignores
+    doubled letters, "h", and alternative spellings of the same sound (see
+    PHONETIC_SPELLINGS), so "zucchabar" and a romanization of Greek
+    "Ζουχάββαρ", "zoukhabbar", both become "zukabar". Keys in other scripts
+    than Latin have no phonetic key (""); romanize them first.
+    """
+    if not rx_latin_key.fullmatch(key):
+        return ""
+    key = rx_phonetic_spellings.sub(lambda m: PHONETIC_SPELLINGS[m.group()], key)
+    return rx_doubled.sub(r"\1", key)
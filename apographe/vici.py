@@ -49,8 +49,8 @@ class ViciQuery(Query):
 class Vici(BackendWeb, Gazetteer):
     """Interface for the vici.org archaeological atlas of antiquity."""
 
-    def __init__(self):
-        Gazetteer.__init__(self, name="Vici")
+    def __init__(self, **overrides):
+        Gazetteer.__init__(self, name="Vici", uri_prefixes=["vici.org/vici/"])
         # NB: vici.org sets the following response headers:
         # Expires: Thu, 19 Nov 1981 08:52:00 GMT
         # Cache-Control: no-store, no-cache, must-revalidate
@@ -67,6 +67,9 @@ class Vici(BackendWeb, Gazetteer):
             "expire_after": timedelta(hours=6),
             "respect_robots_txt": False,
         }
+        # e.g., place_netloc and place_scheme to point at a local test server, or
+        # stale_while_revalidate to serve repeat place requests (see BackendWeb)
+        kwargs.update(overrides)
         BackendWeb.__init__(self, **kwargs)
 
     def get(self, id: str):
@@ -83,7 +86,10 @@ class Vici(BackendWeb, Gazetteer):
         return getattr(self, f"_vici_{backend}_search")(query)
 
     def _vici_web_get(self, id: str):
-        data = BackendWeb.get(self, id).json()
+        r = BackendWeb.get(self, id)
+        return self._web_place(id, r, self._vici_place)
+
+    def _vici_place(self, id: str, data: dict):
         kwargs = self._kwargs_from_json(data)
         place = Place(id=id, raw=data, **kwargs)
         return place
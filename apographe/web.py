@@ -10,19 +10,106 @@ Mixin to provide a web-based backend for a gazetteer
 """
 
 from apographe.backend import Backend
+from apographe.blobs import BlobStore
+from apographe.cache import place_cache, response_store, response_validator
+from apographe.flight import SingleFlight
+from apographe.place import RAW_RETENTION
+from apographe.replay import ReplayArchive, ReplayInterface
+from apographe.scheduler import scheduler
 from apographe.text import normtext
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 import logging
-from requests.exceptions import HTTPError
-from urllib.parse import urlencode, urlunparse
+from os import environ
+from requests.exceptions import HTTPError, RequestException
+from threading import Lock
+from urllib.parse import urlencode, urlsplit, urlunparse
 import validators
 from webiquette.webi import Webi, DEFAULT_HEADERS
 
 DEFAULT_SCHEME = "https"
 DEFAULT_USER_AGENT = "Apographe/0.0.1 (+https://github.com/isawnyu/apographe)"
 
+# Set APOGRAPHE_REPLAY_ARCHIVE to a directory to serve all web backends from
+# recorded fixtures (e.g., for tests in air-gapped CI); set APOGRAPHE_REPLAY_MODE
+# to "record" to populate the archive from the live sites instead.
+REPLAY_ARCHIVE = environ.get("APOGRAPHE_REPLAY_ARCHIVE", "")
+REPLAY_MODE = environ.get("APOGRAPHE_REPLAY_MODE", "replay")
+
 logger = logging.getLogger("apographe.web")
 
+# concurrent requests for the same URI (or place) share one in-flight call
+_flights = SingleFlight()
+
+# background revalidation of stale place responses
+_revalidation = ThreadPoolExecutor(
+    max_workers=4, thread_name_prefix="apographe-revalidate"
+)
+
+# webiquette interfaces shared by all backends with the same netloc and settings
+_interfaces = dict()
+_interfaces_lock = Lock()
+
+
+def _interface(netloc: str, headers: dict, **kwargs):
+    """Get the shared webiquette interface for netloc, creating it if necessary."""
+    key = (
+        netloc,
+        tuple(sorted(headers.items())),
+        tuple(sorted(kwargs.items())),
+    )
+    with _interfaces_lock:
+        try:
+            return _interfaces[key]
+        except KeyError:
+            _interfaces[key] = Webi(netloc=netloc, headers=headers, **kwargs)
+            return _interfaces[key]
+
+
+def _cached_response(interface, uri: str):
+    """
+    Get the unexpired response to uri from the requests-cache session of a
+    webiquette interface without contacting the host, or None if there is none.
+    """
+    try:
+        session = interface.session
+        r = session.get(uri, headers=interface.headers, only_if_cached=True)
+    except (AttributeError, TypeError, RequestException):
+        return None
+    if r.status_code == 504 or not getattr(r, "from_cache", False):
+        return None  # requests-cache answers 504 when nothing usable is cached
+    return r
+
+
+def valid_netloc(netloc: str):
+    """
+    Returns True if netloc is a domain, optionally with a port, or a
+    local host (e.g. "localhost:8000" or "127.0.0.1:8000") for testing.
+    """
+    if not isinstance(netloc, str):
+        return False
+    host = netloc
+    if ":" in netloc and not netloc.endswith("]"):
+        host, port = netloc.rsplit(":", 1)
+        if not port.isdigit() or not 0 < int(port) < 65536:
+            return False
+    if validators.domain(host):
+        return True
+    if host == "localhost" or validators.ipv4(host):
+        return True
+    if host.startswith("[") and host.endswith("]") and validators.ipv6(host[1:-1]):
+        return True
+    return False
+
+
+def valid_uri(uri: str):
+    """Returns True if uri is an http(s) URI whose netloc passes valid_netloc()."""
+    try:
+        parts = urlsplit(uri)
+    except ValueError:
+        return False
+    return parts.scheme in {"http", "https"} and valid_netloc(parts.netloc)
+
 
 class BackendWeb(Backend):
     """Base mixin for providing web-aware backend functionality for gazetteers."""
@@ -81,6 +168,32 @@ class BackendWeb(Backend):
             place_headers["accept"] = kwargs["accept"]
         except KeyError:
             pass
+        # opt-in stale-while-revalidate policy for place fetches: serve a place
+        # response already fetched in this session immediately if it is no older
+        # than stale_while_revalidate seconds, and if it is older than
+        # revalidate_after seconds refresh it in the background (0, the default,
+        # disables the policy)
+        for k in ["stale_while_revalidate", "revalidate_after"]:
+            try:
+                web_config[k] = kwargs[k]
+            except KeyError:
+                web_config[k] = 0
+        # how parsed places hold on to their upstream payload (see Place.retain_raw)
+        try:
+            web_config["raw_retention"] = kwargs["raw_retention"]
+        except KeyError:
+            web_config["raw_retention"] = "keep"
+        if web_config["raw_retention"] not in RAW_RETENTION:
+            raise ValueError(
+                f"Web backend expected raw_retention in {RAW_RETENTION}. "
+                f"Got '{web_config['raw_retention']}'."
+            )
+        try:
+            web_config["raw_store"] = BlobStore(kwargs["raw_store"])
+        except KeyError:
+            if web_config["raw_retention"] == "blob":
+                raise ValueError('Web backend raw_retention "blob" requires raw_store.')
+            web_config["raw_store"] = None
         web_kwargs = dict()
         if kwargs:
             for k, v in kwargs.items():
@@ -88,35 +201,99 @@ class BackendWeb(Backend):
                     web_kwargs[k] = v
 
         # determine netlocs (domains)
-        if not validators.domain(place_netloc):
+        if not valid_netloc(place_netloc):
             raise ValueError(
                 f"Web backend expects a valid domain for place_netloc. Got '{place_netloc}."
             )
         web_config["place_netloc"] = place_netloc
-        if not validators.domain(search_netloc):
+        if not valid_netloc(search_netloc):
             raise ValueError(
                 f"Web backend expects a valid domain for search_netloc. Got '{search_netloc}."
             )
         web_config["search_netloc"] = search_netloc
 
-        web_config["place_interface"] = Webi(
-            netloc=place_netloc, headers=place_headers, **web_kwargs
+        web_config["place_interface"] = _interface(
+            place_netloc, place_headers, **web_kwargs
         )
-        web_config["search_interface"] = Webi(
-            netloc=search_netloc,
-            headers=place_headers,
+        web_config["search_interface"] = _interface(
+            search_netloc,
+            place_headers,
             **web_kwargs,  # may need to differentiate this for search
         )
 
+        # coordinate politeness per host across all backends and threads, spacing
+        # requests by the host's robots.txt crawl-delay
+        web_config["schedule"] = True
+        try:
+            respect_robots_txt = web_kwargs["respect_robots_txt"]
+        except KeyError:
+            respect_robots_txt = True
+        try:
+            concurrency = kwargs["concurrency"]
+        except KeyError:
+            concurrency = None
+        for netloc, scheme in [
+            (place_netloc, place_scheme),
+            (search_netloc, search_scheme),
+        ]:
+            robots_uri = None
+            if respect_robots_txt:
+                robots_uri = f"{scheme}://{netloc}/robots.txt"
+            scheduler.configure(
+                netloc, concurrency=concurrency, robots_uri=robots_uri, user_agent=ua
+            )
+
         web_config["get"] = self._web_get
         web_config["search"] = self._web_search
 
         Backend.__init__(self)
         self.configure_backend("web", web_config)
+        if REPLAY_ARCHIVE:
+            self.replay(REPLAY_ARCHIVE, record=REPLAY_MODE == "record")
+
+    def replay(
+        self,
+        archive,
+        record: bool = False,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Serve web transactions from a local fixture archive instead of the network.
+        With record=True, fetch over the network as usual and store each response
+        in the archive. latency and jitter (seconds) simulate network delay on replay.
+        """
+        if not isinstance(archive, ReplayArchive):
+            archive = ReplayArchive(archive)
+        config = self.backend_configuration("web")
+        for k in ["place_interface", "search_interface"]:
+            interface = config[k]
+            if isinstance(interface, ReplayInterface):
+                interface = interface.interface
+            config[k] = ReplayInterface(
+                archive,
+                interface=interface,
+                record=record,
+                latency=latency,
+                jitter=jitter,
+                seed=seed,
+            )
+        # replayed responses never reach the network
+        config["schedule"] = record
 
     def search(self, query_uri: str):
         return Backend.search(self, query_uri)
 
+    def cached_places(self):
+        """
+        Get the places of this gazetteer in the parsed-place cache as a
+        dictionary by place ID (the most recently used version of each). These
+        are the cached objects themselves, which must be treated as read-only.
+        """
+        name = self.__class__.__name__
+        return {key[1]: place for key, place in place_cache.items() if key[0] == name}
+
     def _prep_params(self, **kwargs):
         """Prepare params for web query"""
         ready_kwargs = dict()
@@ -148,8 +325,25 @@ class BackendWeb(Backend):
                 "",
             )
         )
+        max_stale = config["stale_while_revalidate"]
+        if max_stale:
+            try:
+                r, age = response_store.get(uri)
+            except KeyError:
+                pass
+            else:
+                if age <= max_stale:
+                    if age >= config["revalidate_after"] and response_store.claim(uri):
+                        _revalidation.submit(self._web_revalidate, uri, r)
+                    return r
         try:
-            return config["place_interface"].get(uri)
+            r = _flights.do(
+                ("get", uri),
+                self._web_fetch,
+                config["place_interface"],
+                config["place_netloc"],
+                uri,
+            )
         except HTTPError as err:
             status_code = err.response.status_code
             if status_code == 404:
@@ -163,15 +357,91 @@ class BackendWeb(Backend):
             logger.error(f"{err.errno}: {type(err.errno)}")
             logger.error(f"status_code: {err.response.status_code}")
             raise
+        if max_stale:
+            response_store.put(uri, r)
+        return r
+
+    def _web_revalidate(self, uri: str, stale):
+        """
+        Refresh the stored response for a place URI through the place interface.
+        Its requests-cache session revalidates an expired copy that carries an
+        ETag or Last-Modified validator with a conditional GET, and answers 304 Not
+        Modified with the cached copy.
+        """
+        config = self.backend_configuration("web")
+        try:
+            r = self._web_fetch(config["place_interface"], config["place_netloc"], uri)
+            r.raise_for_status()
+            if response_validator(r) == response_validator(stale):
+                response_store.touch(uri)
+            else:
+                response_store.put(uri, r)
+            logger.debug(f"revalidated {uri}")
+        except (RequestException, RuntimeError) as err:
+            logger.warning(f"Could not revalidate {uri}: {err}")
+        finally:
+            response_store.release(uri)
 
     def _web_search(self, query: str):
         """Issue the search"""
         config = self.backend_configuration("web")
-        try:
-            if not validators.url(query):
-                raise ValueError(f"Expected a valid search URI but got '{query}'.")
-        except TypeError:
+        if not isinstance(query, str):
             raise TypeError(
                 f"Expected a query argument of type {str} but got {type(query)}."
             )
-        return config["search_interface"].get(query)
+        if not valid_uri(query):
+            raise ValueError(f"Expected a valid search URI but got '{query}'.")
+        return _flights.do(
+            ("search", query),
+            self._web_fetch,
+            config["search_interface"],
+            config["search_netloc"],
+            query,
+        )
+
+    def _web_fetch(self, interface, netloc: str, uri: str):
+        """
+        GET uri through interface, observing the shared per-host schedule unless
+        the interface's cache can answer without contacting the host.
+        """
+        config = self.backend_configuration("web")
+        if not config["schedule"]:
+            return interface.get(uri)
+        r = _cached_response(interface, uri)
+        if r is not None:
+            return r
+        with scheduler.slot(netloc):
+            r = interface.get(uri)
+        if getattr(r, "from_cache", False) and not getattr(r, "revalidated", False):
+            # requests-cache answered without contacting the host
+            scheduler.refund(netloc)
+        return r
+
+    def _web_place(self, id: str, response, make_place):
+        """
+        Get a copy of the place parsed from a response, using the shared
+        parsed-place cache and coalescing concurrent parses of the same place.
+        """
+        config = self.backend_configuration("web")
+        key = (
+            self.__class__.__name__,
+            id,
+            response_validator(response),
+            config["raw_retention"],
+        )
+        try:
+            place = place_cache.get(key)
+        except KeyError:
+            place = _flights.do(
+                ("place",) + key, self._web_place_parse, key, response, make_place
+            )
+        return place.copy()
+
+    def _web_place_parse(self, key: tuple, response, make_place):
+        """Parse a place response and add the result to the parsed-place cache."""
+        config = self.backend_configuration("web")
+        id = key[1]
+        place = make_place(id, response.json())
+        place.retain_raw(config["raw_retention"], config["raw_store"])
+        place_cache.put(key, place, size=len(response.content))
+        return place
@@ -0,0 +1,490 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+"""
+Measure memory use and speed of apographe internals on recorded place data
+"""
+
+from airtight.cli import configure_commandline
+from apographe.alignment import name_slugs, NameIndex, qgrams
+from apographe.cells import CellIndex
+from apographe.geo import bubble, bubble_bounds, bubbles
+from apographe.linked_places_format import (
+    dump,
+    dumps,
+    Feature,
+    load,
+    derive_all,
+    make_geometries,
+)
+from apographe.manager import Manager
+from apographe.mockserver import PLACE_PATHS
+from apographe.place import RAW_RETENTION
+from apographe.ranking import rank_hits
+from apographe.replay import ReplayArchive
+from apographe.storage import pool_size
+import gc
+import json
+import logging
+import numpy as np
+from pathlib import Path
+import regex
+import shapely
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_LEVEL = logging.WARNING
+OPTIONAL_ARGUMENTS = [
+    [
+        "-l",
+        "--loglevel",
+        "NOTSET",
+        "desired logging level ("
+        + "case-insensitive string: DEBUG, INFO, WARNING, or ERROR",
+        False,
+    ],
+    ["-n", "--number", "1000", "number of places to build", False],
+    ["-v", "--verbose", False, "verbose output (logging level == INFO)", False],
+    [
+        "-w",
+        "--veryverbose",
+        False,
+        "very verbose output (logging level == DEBUG)",
+        False,
+    ],
+]
+POSITIONAL_ARGUMENTS = [
+    # each row is a list with 3 elements: name, type, help
+    [
+        "benchmark",
+        str,
+        "name of benchmark to run "
+        "(align, bubbles, cells, geometries, load, names, places, raw, save, "
+        "snapshot)",
+    ],
+    ["gazetteer", str, "name of gazetteer whose place data is used"],
+    [
+        "source",
+        str,
+        "replay archive directory of recorded place responses, or a place JSON file",
+    ],
+]
+
+
+def read_payloads(gazetteer_name: str, source: str):
+    """Get (id, JSON text) for each place payload in a replay archive or JSON file."""
+    path = Path(source).expanduser().resolve()
+    if path.is_file():
+        with open(path, "r", encoding="utf-8") as fp:
+            text = fp.read()
+        del fp
+        return [(path.stem, text)]
+    template = PLACE_PATHS[gazetteer_name]
+    rx = regex.compile(regex.escape(template).replace(r"\{id\}", "([^/?#]+)") + "$")
+    archive = ReplayArchive(path)
+    payloads = list()
+    for uri in archive.uris:
+        m = rx.search(uri)
+        if m is None:
+            continue
+        r = archive.response(uri)
+        if r.status_code == 200:
+            payloads.append((m.group(1), r.text))
+    if not payloads:
+        raise ValueError(f"No {gazetteer_name} place responses found in {path}.")
+    return payloads
+
+
+def build_places(gazetteer, make_place, payloads: list, number: int):
+    """Parse number places, cycling through payloads, as the web backend would."""
+    places = list()
+    for i in range(number):
+        id, text = payloads[i % len(payloads)]
+        places.append(make_place(id, json.loads(text)))
+    return places
+
+
+def spread_places(gazetteer, make_place, payloads: list, number: int, seed: int = 0):
+    """
+    Build places as build_places() does, keyed by number, and spread their
+    geometries over a region, so that copies of the same payloads are not all in
+    one place.
+    """
+    places = dict()
+    offsets = np.random.default_rng(seed).uniform(-5.0, 5.0, (number, 2))
+    for i, place in enumerate(build_places(gazetteer, make_place, payloads, number)):
+        if not isinstance(place.geometry, list):
+            place.geometry = shapely.transform(place.geometry, lambda c: c + offsets[i])
+        place.retain_raw("drop")
+        places[str(i)] = place
+    return places
+
+
+def measure(func, *args, **kwargs):
+    """Call func and report (result, bytes still allocated by it, peak bytes)."""
+    gc.collect()
+    tracemalloc.start()
+    result = func(*args, **kwargs)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (result, current, peak)
+
+
+def benchmark_raw(gazetteer, make_place, payloads: list, number: int):
+    """Memory per place under each raw payload retention policy."""
+    rows = list()
+    with TemporaryDirectory() as blob_dir:
+
+        def build(retention):
+            places = build_places(gazetteer, make_place, payloads, number)
+            for place in places:
+                place.retain_raw(retention, blob_dir if retention == "blob" else None)
+            return places
+
+        for retention in RAW_RETENTION:
+            places, current, peak = measure(build, retention)
+            rows.append((retention, current // number, peak // number))
+            del places
+    print(f"{'retention':<10} {'bytes/place':>12} {'peak bytes/place':>17}")
+    for retention, current, peak in rows:
+        print(f"{retention:<10} {current:>12} {peak:>17}")
+
+
+def benchmark_names(gazetteer, make_place, payloads: list, number: int):
+    """
+    Time to find similar names for up to 1000 names among number names, with the
+    q-gram index and by comparing all pairs. Names are the payloads' name slugs
+    and made-up names from random syllables, plus variants of them with a few
+    random edits (about four names per original).
+    """
+    slugs = set()
+    for place in build_places(gazetteer, make_place, payloads, len(payloads)):
+        slugs.update(name_slugs(place))
+    rng = np.random.default_rng(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"] + ["a", "o"]
+    while len(slugs) < number // 4:
+        slugs.add(
+            "".join([syllables[i] for i in rng.integers(len(syllables), size=4)])
+        )
+    slugs = sorted(slugs)
+    names = list(slugs)
+    while len(names) < number:
+        name = list(slugs[rng.integers(len(slugs))])
+        for j in range(rng.integers(1, 4)):
+            i = rng.integers(len(name) + 1)
+            edit = rng.integers(3)
+            if edit == 0 and i < len(name):
+                del name[i]
+            elif edit == 1 and i < len(name):
+                name[i] = letters[rng.integers(len(letters))]
+            else:
+                name.insert(i, letters[rng.integers(len(letters))])
+        names.append("".join(name))
+    names = names[:number]
+    rng.shuffle(names)
+    queries = names[: min(1000, number)]
+    index = NameIndex()
+    for i, name in enumerate(names):
+        index.add(i, [name])
+    start = perf_counter()
+    index.similar(queries[0])  # builds the q-gram index
+    print(f"{'build':<16} {perf_counter() - start:.3f} s ({len(index)} slugs)")
+    for threshold in [0.6, 0.75, 0.9]:
+        start = perf_counter()
+        found = sum([len(index.similar(q, threshold)) for q in queries])
+        indexed = perf_counter() - start
+        start = perf_counter()
+        pairs = 0
+        for q in queries:  # with each slug's q-grams already computed, as indexed
+            grams = qgrams(q)
+            for other_grams in index._slug_grams.values():
+                shared = len(grams & other_grams)
+                if 2 * shared / (len(grams) + len(other_grams)) >= threshold:
+                    pairs += 1
+        all_pairs = perf_counter() - start
+        print(
+            f"threshold {threshold:<6} {len(queries)} queries  index {indexed:.3f} s  "
+            f"all pairs {all_pairs:.3f} s  ({found} / {pairs} similar)"
+        )
+
+
+def benchmark_places(gazetteer, make_place, payloads: list, number: int):
+    """Construction time and memory per place and per name (raw payloads dropped)."""
+
+    def build():
+        places = build_places(gazetteer, make_place, payloads, number)
+        for place in places:
+            place.retain_raw("drop")
+        return places
+
+    start = perf_counter()
+    build()
+    seconds = perf_counter() - start
+    places, current, peak = measure(build)
+    names = sum([len(place.names) for place in places])
+    descriptions = sum([len(place.descriptions) for place in places])
+    print(f"places: {number}  names: {names}  descriptions: {descriptions}")
+    print(f"construction: {seconds:.2f} s ({1000000 * seconds / number:.1f} µs/place)")
+    print(f"memory: {current} bytes ({current // number} bytes/place)")
+    if names:
+        print(f"        {current // names} bytes/name (including place overhead)")
+
+
+def benchmark_geometries(gazetteer, make_place, payloads: list, number: int):
+    """Time to build place geometries from LPF features one at a time and in a batch."""
+    places = build_places(gazetteer, make_place, payloads, number)
+    features = json.loads(dumps(places))["features"]
+    for feature in features[:10]:  # warm up both paths
+        Feature._make_geometry(**feature)
+    make_geometries(features[:10])
+    gc.collect()
+    start = perf_counter()
+    for feature in features:
+        Feature._make_geometry(**feature)
+    print(f"{'each':<16} {perf_counter() - start:.3f} s")
+    gc.collect()
+    start = perf_counter()
+    make_geometries(features)
+    print(f"{'batch':<16} {perf_counter() - start:.3f} s")
+
+
+def benchmark_load(gazetteer, make_place, payloads: list, number: int):
+    """
+    Time to load an LPF gazetteer saved one place per file, eagerly, lazily, and
+    across a process pool, against bare JSON parsing.
+    """
+    places = build_places(gazetteer, make_place, payloads, number)
+    with TemporaryDirectory() as where:
+        for i, place in enumerate(places):
+            place.id = f"{place.id}-{i}"
+            with open(Path(where) / f"{place.id}.json", "w", encoding="utf-8") as fp:
+                dump(place, fp, ensure_ascii=False)
+            del fp
+        del places
+        start = perf_counter()
+        for filepath in Path(where).glob("*.json"):
+            with open(filepath, "r", encoding="utf-8") as fp:
+                load(fp)
+            del fp
+        print(f"{'json':<16} {perf_counter() - start:.2f} s")
+        processes = pool_size(0)
+        for label, kwargs in [
+            ("eager", {}),
+            ("lazy", {"lazy": True}),
+            (f"eager x{processes}", {"processes": processes}),
+        ]:
+            gc.collect()
+            start = perf_counter()
+            Manager().load(where, **kwargs)
+            print(f"{label:<16} {perf_counter() - start:.2f} s")
+
+
+def benchmark_save(gazetteer, make_place, payloads: list, number: int):
+    """
+    Time to save an internal gazetteer one place per file, serially and in parallel.
+    """
+    m = Manager()
+    for i, place in enumerate(build_places(gazetteer, make_place, payloads, number)):
+        place.id = f"{place.id}-{i}"
+        place.retain_raw("drop")
+        m.apographe[place.id] = place
+    processes = pool_size(0)
+    for label, kwargs in [("serial", {}), (f"x{processes}", {"processes": processes})]:
+        with TemporaryDirectory() as where:
+            gc.collect()
+            start = perf_counter()
+            m.save("each", str(Path(where) / "each"), **kwargs)
+            print(f"{label:<16} {perf_counter() - start:.2f} s")
+
+
+def benchmark_snapshot(gazetteer, make_place, payloads: list, number: int):
+    """Time to save and load an internal gazetteer as LPF shards and as a snapshot."""
+    m = Manager()
+    for i, place in enumerate(build_places(gazetteer, make_place, payloads, number)):
+        place.id = f"{place.id}-{i}"
+        place.retain_raw("drop")
+        m.apographe[place.id] = place
+    with TemporaryDirectory() as where:
+        for label, mode, path in [
+            ("lpf shards", "shards", Path(where) / "shards"),
+            ("snapshot", "snapshot", Path(where) / "all.snapshot"),
+        ]:
+            gc.collect()
+            start = perf_counter()
+            m.save(mode, str(path))
+            saved = perf_counter() - start
+            gc.collect()
+            start = perf_counter()
+            Manager().load(str(path))
+            loaded = perf_counter() - start
+            print(f"{label:<16} save {saved:.2f} s  load {loaded:.2f} s")
+
+
+def benchmark_bubbles(gazetteer, make_place, payloads: list, number: int):
+    """
+    Time to compute align's search bubbles one place at a time and in one batch,
+    and their bounds alone.
+    """
+    places = build_places(gazetteer, make_place, payloads, number)
+    hulls = [p.geometry.convex_hull for p in places if not isinstance(p.geometry, list)]
+    for label, kwargs in [
+        ("proximity", {"buffer_distance": 1000}),
+        ("default", {"radius_multiplier": 2, "radius_minimum": 5000}),
+    ]:
+        start = perf_counter()
+        for hull in hulls:
+            bubble(hull, **kwargs)
+        each = perf_counter() - start
+        start = perf_counter()
+        bubbles(hulls, **kwargs)
+        batch = perf_counter() - start
+        start = perf_counter()
+        bubble_bounds(hulls, **kwargs)
+        bounds = perf_counter() - start
+        print(
+            f"{label:<10} {len(hulls)} shapes  each {each:.3f} s  batch {batch:.3f} s  "
+            f"bounds only {bounds:.3f} s"
+        )
+
+
+def benchmark_cells(gazetteer, make_place, payloads: list, number: int):
+    """
+    Time to index places by cell keys and to join places against the index, as
+    align's cell candidate mode does.
+    """
+    places = spread_places(gazetteer, make_place, payloads, number)
+    start = perf_counter()
+    derive_all(list(places.values()))
+    derived = perf_counter() - start
+    for resolution in [4, 5, 6]:
+        gc.collect()
+        start = perf_counter()
+        index = CellIndex(resolution)
+        index.add_places(places)
+        indexed = perf_counter() - start
+        start = perf_counter()
+        joined = index.join(places, rings=1)
+        seconds = perf_counter() - start
+        pairs = sum([len(keys) for keys in joined.values()])
+        print(
+            f"resolution {resolution}  derive {derived:.3f} s  index {indexed:.3f} s  "
+            f"join {seconds:.3f} s ({len(index)} cells, {pairs} pairs)"
+        )
+
+
+def benchmark_align(gazetteer, make_place, payloads: list, number: int):
+    """
+    Time to align number places with a local dataset of number places saved as
+    a snapshot: reading and indexing the dataset, then matching, serially and
+    across a process pool, and serially by phonetic name keys.
+    """
+    m = Manager()
+    m.apographe = spread_places(gazetteer, make_place, payloads, number, seed=1)
+    external = Manager()
+    external.apographe = spread_places(gazetteer, make_place, payloads, number)
+    with TemporaryDirectory() as where:
+        path = str(Path(where) / "external.snapshot")
+        external.save("snapshot", path)
+        del external
+        gc.collect()
+        start = perf_counter()
+        dataset = m.get_dataset(path)
+        print(f"{'read':<16} {perf_counter() - start:.2f} s")
+        start = perf_counter()
+        dataset.cell_index()
+        dataset.name_index
+        print(f"{'index':<16} {perf_counter() - start:.2f} s")
+        start = perf_counter()
+        dataset.phonetic_index
+        print(f"{'phonetic index':<16} {perf_counter() - start:.2f} s")
+        processes = pool_size(0)
+        for label, kwargs in [
+            ("serial", {}),
+            (f"x{processes}", {"processes": 0}),
+            ("phonetic", {"names": "phonetic"}),
+        ]:
+            gc.collect()
+            start = perf_counter()
+            hits = m.align(dataset=path, **kwargs)
+            pairs = sum([len(h) for h in hits.values()])
+            print(f"{label:<16} {perf_counter() - start:.2f} s ({pairs} matches)")
+
+
+def benchmark_rank(gazetteer, make_place, payloads: list, number: int):
+    """
+    Time to rank the candidates of number places among number others, found by
+    a cell join, keeping the top 3 of each place (see ranking.rank_hits).
+    """
+    places = spread_places(gazetteer, make_place, payloads, number, seed=1)
+    external = spread_places(gazetteer, make_place, payloads, number)
+    derive_all(list(places.values()) + list(external.values()))
+    for resolution in [5, 4]:
+        index = CellIndex(resolution)
+        index.add_places(external)
+        hits = {
+            k: [{"id": pid} for pid in sorted(keys)]
+            for k, keys in index.join(places, rings=1).items()
+        }
+        pairs = sum([len(h) for h in hits.values()])
+        gc.collect()
+        start = perf_counter()
+        ranked = rank_hits(hits, places, external, k=3)
+        seconds = perf_counter() - start
+        kept = sum([len(h) for h in ranked.values()])
+        print(
+            f"resolution {resolution}  rank {seconds:.3f} s ({pairs} pairs, "
+            f"{seconds / max(pairs, 1) * 1e6:.1f} µs/pair, {kept} kept)"
+        )
+
+
+BENCHMARKS = {
+    "align": benchmark_align,
+    "bubbles": benchmark_bubbles,
+    "cells": benchmark_cells,
+    "geometries": benchmark_geometries,
+    "load": benchmark_load,
+    "names": benchmark_names,
+    "places": benchmark_places,
+    "rank": benchmark_rank,
+    "raw": benchmark_raw,
+    "save": benchmark_save,
+    "snapshot": benchmark_snapshot,
+}
+
+
+def main(**kwargs):
+    """
+    main function
+    """
+    try:
+        benchmark = BENCHMARKS[kwargs["benchmark"]]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported benchmark '{kwargs['benchmark']}'. "
+            f"Expected one of: {sorted(BENCHMARKS.keys())}."
+        )
+    gazetteer_name = kwargs["gazetteer"].lower()
+    gazetteer, gazetteer_query_class = Manager().get_gazetteer(gazetteer_name)
+    make_place = getattr(gazetteer, f"_{gazetteer_name}_place")
+    payloads = read_payloads(gazetteer_name, kwargs["source"])
+    print(
+        f"{kwargs['benchmark']}: {kwargs['number']} {gazetteer_name} places "
+        f"from {len(payloads)} payloads"
+    )
+    benchmark(gazetteer, make_place, payloads, int(kwargs["number"]))
+
+
+if __name__ == "__main__":
+    main(
+        **configure_commandline(
+            OPTIONAL_ARGUMENTS, POSITIONAL_ARGUMENTS, DEFAULT_LOG_LEVEL
+        )
+    )
@@ -0,0 +1,98 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+"""
+Run a local stand-in for the gazetteer websites, seeded from a dataset of places
+and, optionally, a replay archive
+"""
+
+from airtight.cli import configure_commandline
+from apographe.mockserver import DEFAULT_DATASET, MockGazetteerServer
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_LEVEL = logging.WARNING
+OPTIONAL_ARGUMENTS = [
+    ["-a", "--archive", "NOTSET", "path to replay archive of responses", False],
+    ["-c", "--crawldelay", "NOTSET", "crawl-delay to advertise in robots.txt", False],
+    ["-d", "--dataset", "DEFAULT", "JSON file of places to serve (or NONE)", False],
+    ["-e", "--errorrate", "0.0", "fraction of requests to fail with 503", False],
+    ["-j", "--jitter", "0.0", "maximum random additional latency in seconds", False],
+    [
+        "-l",
+        "--loglevel",
+        "NOTSET",
+        "desired logging level ("
+        + "case-insensitive string: DEBUG, INFO, WARNING, or ERROR",
+        False,
+    ],
+    ["-m", "--maxconcurrent", "0", "concurrent requests before answering 429", False],
+    ["-n", "--host", "127.0.0.1", "host address to serve on", False],
+    ["-p", "--port", "8000", "port to serve on", False],
+    ["-t", "--latency", "0.0", "latency in seconds added to each response", False],
+    ["-v", "--verbose", False, "verbose output (logging level == INFO)", False],
+    [
+        "-w",
+        "--veryverbose",
+        False,
+        "very verbose output (logging level == DEBUG)",
+        False,
+    ],
+]
+POSITIONAL_ARGUMENTS = [
+    # each row is a list with 3 elements: name, type, help
+]
+
+
+def main(**kwargs):
+    """
+    main function
+    """
+    archive = kwargs["archive"]
+    if archive == "NOTSET":
+        archive = None
+    dataset = kwargs["dataset"]
+    if dataset == "DEFAULT":
+        dataset = DEFAULT_DATASET
+    elif dataset == "NONE":
+        dataset = None
+    crawl_delay = kwargs["crawldelay"]
+    if crawl_delay == "NOTSET":
+        crawl_delay = None
+    else:
+        crawl_delay = float(crawl_delay)
+    server = MockGazetteerServer(
+        archive=archive,
+        dataset=dataset,
+        host=kwargs["host"],
+        port=int(kwargs["port"]),
+        latency=float(kwargs["latency"]),
+        jitter=float(kwargs["jitter"]),
+        error_rate=float(kwargs["errorrate"]),
+        crawl_delay=crawl_delay,
+        max_concurrent=int(kwargs["maxconcurrent"]),
+    )
+    print(f"Serving {len(server.resources)} resources at http://{server.netloc}")
+    print(
+        "Point gazetteers at it with: "
+        + ", ".join([f"{k}={v}" for k, v in server.gazetteer_kwargs().items()])
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(server.stats)
+
+
+if __name__ == "__main__":
+    main(
+        **configure_commandline(
+            OPTIONAL_ARGUMENTS, POSITIONAL_ARGUMENTS, DEFAULT_LOG_LEVEL
+        )
+    )
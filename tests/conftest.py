@@ -0,0 +1,80 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Shared pytest configuration
+
+The web tests of the gazetteer interfaces (EDH, iDAI, Pleiades, Vici) are served
+from the recorded responses in tests/fixtures/replay when it holds any, unless
+pytest is run with --live (use the live sites) or --record (use the live sites
+and record their responses in the archive). A test that needs a response missing
+from the archive is skipped.
+"""
+
+from apographe.place import Place
+from apographe.replay import MissingRecording
+from apographe.web import BackendWeb
+from pathlib import Path
+import pytest
+
+REPLAY_ARCHIVE = Path(__file__).parent / "fixtures" / "replay"
+REPLAY_MODULES = {"test_edh", "test_idai", "test_pleiades", "test_vici"}
+
+
+def make_point(title, lon, lat, names=(), types=(), description=""):
+    """Make a place at a point with the given names, feature types, and description."""
+    descriptions = list()
+    if description:
+        descriptions = [{"value": description}]
+    return Place(
+        title=title,
+        names=[{"toponym": n} for n in names],
+        types=list(types),
+        descriptions=descriptions,
+        geometry={"type": "Point", "coordinates": [lon, lat]},
+    )
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("apographe")
+    group.addoption(
+        "--live",
+        action="store_true",
+        help="run the gazetteer web tests against the live sites",
+    )
+    group.addoption(
+        "--record",
+        action="store_true",
+        help="run the gazetteer web tests against the live sites and record "
+        f"their responses in {REPLAY_ARCHIVE}",
+    )
+
+
+@pytest.fixture(autouse=True, scope="module")
+def replay_web(request):
+    """Serve the web backends of a gazetteer test module from the archive."""
+    module = request.module
+    if (
+        module.__name__.split(".")[-1] not in REPLAY_MODULES
+        or request.config.getoption("live")
+    ):
+        return
+    record = request.config.getoption("record")
+    if not record and not any(REPLAY_ARCHIVE.glob("*.json")):
+        return  # nothing recorded yet: use the live sites
+    for value in list(vars(module).values()):
+        if isinstance(value, BackendWeb):
+            value.replay(REPLAY_ARCHIVE, record=record)
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    """Skip a replayed test whose responses have not all been recorded."""
+    try:
+        return (yield)
+    except MissingRecording as err:
+        pytest.skip(str(err))
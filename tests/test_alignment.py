@@ -0,0 +1,161 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.alignment module
+"""
+
+from apographe import alignment
+from apographe.alignment import (
+    align_places,
+    LocalGazetteer,
+    name_slugs,
+    NameIndex,
+    phonetic_slugs,
+    similarity,
+)
+from apographe.manager import Manager
+from apographe.place import Place
+from conftest import make_point
+import pytest
+
+
+def make_external():
+    return {
+        "1": make_point("Zucchabar", 2.2, 36.3, ["Zucchabar", "Zuccabar"]),
+        "2": make_point("Tipasa", 2.21, 36.3, ["Tipasa"]),
+        "3": make_point("Zucchabar", 12.5, 41.9, ["Zucchabar"]),
+        "4": make_point("Roma", 12.49, 41.89, ["Roma", "Rome"]),
+        "5": Place(title="Nowhere"),
+    }
+
+
+def make_internal():
+    return {
+        "zucchabar": make_point("Zuccabar (Miliana)", 2.201, 36.301, ["Zuccabar"]),
+        "rome": make_point("Rome", 12.5, 41.9, ["Rome"]),
+        "nowhere": Place(title="Zucchabar"),
+    }
+
+
+class TestNames:
+    def test_name_slugs(self):
+        place = make_point("Zuccabar (Miliana)", 2.2, 36.3, ["Ζουχάββαρι", "1"])
+        assert name_slugs(place) == {"zuccabarmiliana", "ζουχαββαρι"}
+        place = make_point("Zouchábbari", 2.2, 36.3, ["Zouchabbari"])
+        assert name_slugs(place) == {"zouchabbari"}
+
+    def test_phonetic_slugs(self):
+        place = make_point("Zucchabar", 2.2, 36.3, ["Zouchabbari"])
+        assert phonetic_slugs(place) == {"zukabar", "zukabari"}
+        place = Place(
+            title="Ζουχάββαρ",
+            names=[{"toponym": "Ζουχάββαρι", "language_tag": "grc"}],
+        )
+        assert {"zukabar", "zukabari"} <= phonetic_slugs(place)
+
+    def test_name_index(self):
+        index = NameIndex()
+        index.add_places(make_external())
+        assert index.lookup(["zucchabar"]) == {"1", "3"}
+        assert index.lookup(["zuccabar", "rome"]) == {"1", "4"}
+        assert index.lookup(["nowhere", "elsewhere"]) == {"5"}
+        assert index.lookup(["zucchabar", "roma"], among={"3", "4", "5"}) == {"3", "4"}
+        assert "tipasa" in index
+
+    def test_similar(self):
+        index = NameIndex()
+        index.add_places(make_external())
+        index.add("6", ["zuccabari", "zucchabarum", "abar", "z"])
+        slugs = list(index._slugs)
+        for slug in ["zuccabari", "zucchabar", "rome", "tipas", "z", "bar"]:
+            for threshold in [0.2, 0.5, 0.75, 0.9, 1.0]:
+                expected = dict()
+                for other in slugs:
+                    score = similarity(slug, other)
+                    if score >= threshold:
+                        expected[other] = score
+                assert index.similar(slug, threshold) == expected
+        assert index.match(["zuccabari"], 1.0) == {"6": 1.0}
+        score = similarity("zuccabari", "zuccabar")
+        assert index.match(["zuccabari"], 0.8) == {"6": 1.0, "1": score}
+        assert index.match(["zuccabari"], 0.8, among={"1"}) == {"1": score}
+        among = {"1", "3", "6"}  # scored directly, not through the q-gram index
+        expected = index.match(["zuccabari", "roma"], 0.4)
+        assert index.match(["zuccabari", "roma"], 0.4, among=among) == {
+            k: v for k, v in expected.items() if k in among
+        }
+        with pytest.raises(ValueError):
+            index.similar("zuccabari", 0.0)
+
+
+class TestAlignPlaces:
+    def test_align_places(self):
+        gazetteer = LocalGazetteer(make_external())
+        matches = align_places(make_internal(), gazetteer)
+        assert matches == {
+            "zucchabar": [("1", 1.0)],
+            "rome": [("4", 1.0)],
+            "nowhere": [],
+        }
+        matches = align_places(make_internal(), gazetteer, names="none", rings=0)
+        assert matches["zucchabar"] == [("1", None), ("2", None)]
+        assert matches["rome"] == [("3", None), ("4", None)]
+        assert gazetteer.cell_index(5) is gazetteer.cell_index(5)
+        with pytest.raises(NotImplementedError):
+            align_places(make_internal(), gazetteer, names="sounds-like")
+
+    def test_similar(self):
+        gazetteer = LocalGazetteer(make_external())
+        internal = {
+            "z": make_point("Zuccabari", 2.2, 36.3, ["Zuccabari"]),
+            "r": make_point("Rome", 12.5, 41.9),
+        }
+        matches = align_places(internal, gazetteer, names="similar")
+        assert matches["z"] == [("1", similarity("zuccabari", "zuccabar"))]
+        assert matches["r"] == [("4", 1.0)]
+        matches = align_places(internal, gazetteer, names="similar", threshold=0.95)
+        assert matches["z"] == []
+
+    def test_phonetic(self):
+        gazetteer = LocalGazetteer(make_external())
+        internal = {
+            "z": make_point("Ζουχάββαρ", 2.2, 36.3, ["Ζουχάββαρ"]),
+            "r": make_point("Rhoma", 12.5, 41.9),
+        }
+        matches = align_places(internal, gazetteer, names="phonetic")
+        assert matches == {"z": [("1", 1.0)], "r": [("4", 1.0)]}
+        assert align_places(internal, gazetteer)["z"] == []
+        assert gazetteer.phonetic_index is gazetteer.phonetic_index
+
+    def test_processes(self, monkeypatch):
+        monkeypatch.setattr(alignment, "ALIGN_BATCH", 1)
+        gazetteer = LocalGazetteer(make_external())
+        for names in ["none", "phonetic", "similar"]:
+            expected = align_places(make_internal(), gazetteer, names=names)
+            assert expected == align_places(
+                make_internal(), gazetteer, names=names, processes=2
+            )
+
+
+class TestManagerDataset:
+    def test_align_dataset(self, tmp_path):
+        other = Manager()
+        other.apographe = make_external()
+        other.save("snapshot", str(tmp_path / "external.snapshot"))
+        m = Manager()
+        m.apographe = make_internal()
+        hits = m.align(dataset=str(tmp_path / "external.snapshot"))
+        assert [h["id"] for h in hits["zucchabar"]] == ["1"]
+        assert hits["zucchabar"][0]["title"] == "Zucchabar"
+        assert hits["nowhere"] == []
+        assert len(m.datasets) == 1
+        path = str(tmp_path / "external.snapshot")
+        hits = m.align("rome", dataset=path, names="none")
+        assert list(hits.keys()) == ["rome"]
+        assert [h["id"] for h in hits["rome"]] == ["3", "4"]
+        assert len(m.datasets) == 1
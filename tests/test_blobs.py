@@ -0,0 +1,27 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.blobs module
+"""
+
+from apographe.blobs import BlobStore, decode_payload, encode_payload
+import pytest
+
+
+class TestBlobStore:
+    def test_put_get(self, tmp_path):
+        store = BlobStore(tmp_path)
+        data = {"title": "Zucchabar", "names": ["Ζουχάββαρι"]}
+        key = store.put(encode_payload(data))
+        assert key in store
+        assert decode_payload(store.get(key)) == data
+        # content-addressed: the same payload is stored once under the same key
+        assert store.put(encode_payload(dict(reversed(data.items())))) == key
+        assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 1
+        with pytest.raises(KeyError):
+            store.get("0" * 64)
@@ -0,0 +1,84 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.cache module
+"""
+
+from apographe.cache import PlaceCache, ResponseStore, response_validator
+import pytest
+from requests import Response
+
+
+class TestPlaceCache:
+    def test_lru_count(self):
+        c = PlaceCache(max_places=2)
+        c.put(("Pleiades", "1", "x"), "one")
+        c.put(("Pleiades", "2", "x"), "two")
+        assert c.get(("Pleiades", "1", "x")) == "one"
+        c.put(("Pleiades", "3", "x"), "three")
+        assert len(c) == 2
+        assert ("Pleiades", "1", "x") in c
+        with pytest.raises(KeyError):
+            c.get(("Pleiades", "2", "x"))
+        assert c.hits == 1
+        assert c.misses == 1
+        assert c.evictions == 1
+
+    def test_lru_bytes(self):
+        c = PlaceCache(max_places=100, max_bytes=1000)
+        c.put("a", "a", size=400)
+        c.put("b", "b", size=400)
+        c.put("c", "c", size=400)
+        assert len(c) == 2
+        assert "a" not in c
+        assert c.size == 800
+        c.put("huge", "huge", size=2000)  # never cached
+        assert "huge" not in c
+        c.put("b", "b", size=100)
+        assert c.size == 500
+
+    def test_items(self):
+        c = PlaceCache(max_places=2)
+        c.put("a", "one")
+        c.put("b", "two")
+        assert c.items() == [("a", "one"), ("b", "two")]
+        c.put("c", "three")  # items() did not make "a" recently used
+        assert c.items() == [("b", "two"), ("c", "three")]
+        assert c.hits == 0
+
+
+class TestResponseValidator:
+    def test_validator(self):
+        r = Response()
+        r._content = b'{"title": "Zucchabar"}'
+        assert response_validator(r).startswith("md5:")
+        r.headers["Last-Modified"] = "Sat, 02 Apr 2022 12:00:00 GMT"
+        assert response_validator(r).startswith("Last-Modified:")
+        r.headers["ETag"] = '"abc"'
+        assert response_validator(r) == 'ETag:"abc"'
+
+
+class TestResponseStore:
+    def test_store(self):
+        s = ResponseStore(max_entries=2)
+        uri = "https://pleiades.stoa.org/places/295374/json"
+        with pytest.raises(KeyError):
+            s.get(uri)
+        s.put(uri, "zucchabar")
+        r, age = s.get(uri)
+        assert r == "zucchabar"
+        assert 0 <= age < 1
+        assert s.claim(uri)
+        assert not s.claim(uri)
+        s.release(uri)
+        assert s.claim(uri)
+        s.touch(uri)
+        s.put("a", "a")
+        s.put("b", "b")
+        assert uri not in s
+        assert len(s) == 2
@@ -0,0 +1,172 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.cells module
+"""
+
+from apographe.cells import (
+    cell_bounds,
+    CellIndex,
+    covering_cells,
+    encode,
+    expand,
+    neighbors,
+)
+from apographe.gazetteer import Gazetteer
+from apographe.manager import Manager
+from apographe.place import Place
+from conftest import make_point
+import logging
+import pytest
+
+
+def make_place(title, geometry):
+    return Place(title=title, names=[{"toponym": title}], geometry=geometry)
+
+
+class TestEncode:
+    def test_encode(self):
+        assert encode([-5.6], [42.6], 5) == ["ezs42"]
+        assert encode([-5.6, 2.2], [42.6, 36.3], 9)[0].startswith("ezs42")
+        assert encode([180.0], [90.0], 3) == ["zzz"]
+        assert encode([-180.0], [-90.0], 3) == ["000"]
+        with pytest.raises(ValueError):
+            encode([0.0], [0.0], 13)
+
+    def test_cell_bounds(self):
+        west, south, east, north = cell_bounds("ezs42")
+        assert west <= -5.6 <= east
+        assert south <= 42.6 <= north
+        for cell in encode([2.2, -179.99, 12.5], [36.3, 0.0, -41.9], 6):
+            west, south, east, north = cell_bounds(cell)
+            assert encode([(west + east) / 2], [(south + north) / 2], 6) == [cell]
+
+
+class TestNeighbors:
+    def test_neighbors(self):
+        cells = neighbors("ezs42")
+        assert len(cells) == 8
+        assert "ezs42" not in cells
+        assert {"ezs43", "ezs48", "ezs40"} <= cells
+        assert expand(["ezs42"], 0) == {"ezs42"}
+        assert len(expand(["ezs42"], 2)) == 25
+
+    def test_antimeridian_and_poles(self):
+        (east,) = encode([179.99], [0.0], 4)
+        (west,) = encode([-179.99], [0.0], 4)
+        assert west in neighbors(east)
+        (pole,) = encode([0.0], [89.99], 4)
+        assert len(neighbors(pole)) == 5
+
+    def test_mixed_precision(self):
+        cells = expand(["ezs42", "ezs"], 1)
+        assert len([c for c in cells if len(c) == 3]) == 9
+        assert len([c for c in cells if len(c) == 5]) == 9
+
+
+class TestCoveringCells:
+    def test_covering_cells(self):
+        (point, box, nothing) = covering_cells(
+            [(2.2, 36.3, 2.2, 36.3), (2.0, 36.0, 2.5, 36.5), [float("nan")] * 4], 5
+        )
+        assert point == encode([2.2], [36.3], 5)
+        assert point[0] in box
+        assert len(box) == len(set(box)) > 9
+        assert nothing == list()
+
+    def test_antimeridian(self):
+        (cells,) = covering_cells([(179.9, -0.1, -179.9, 0.1)], 4)
+        assert set(encode([179.95, -179.95], [0.0, 0.0], 4)) <= set(cells)
+        assert not set(encode([0.0], [0.0], 4)) & set(cells)
+
+    def test_coarsened(self):
+        (cells,) = covering_cells([(-10.0, 30.0, 40.0, 50.0)], 5, max_cells=64)
+        assert 0 < len(cells) <= 64
+        assert len(cells[0]) < 5
+
+
+class TestCellIndex:
+    def test_join(self):
+        index = CellIndex(resolution=5)
+        index.add_places(
+            {
+                "zucchabar": make_point("Zucchabar", 2.2, 36.3),
+                "neighbor": make_point("Neighbor", 2.26, 36.3),
+                "region": make_place(
+                    "Region",
+                    {
+                        "type": "Polygon",
+                        "coordinates": [
+                            [[-10.0, 30.0], [40.0, 30.0], [40.0, 50.0], [-10.0, 30.0]]
+                        ],
+                    },
+                ),
+                "rome": make_point("Rome", 12.5, 41.9),
+                "nowhere": Place(title="Nowhere"),
+            }
+        )
+        here = {"here": make_point("Here", 2.2, 36.3)}
+        assert index.join(here, rings=0)["here"] == {"zucchabar", "region"}
+        assert index.join(here, rings=1)["here"] == {"zucchabar", "neighbor", "region"}
+        broad = {
+            "broad": make_place(
+                "Broad",
+                {
+                    "type": "Polygon",
+                    "coordinates": [
+                        [[0.0, 35.0], [15.0, 35.0], [15.0, 45.0], [0.0, 35.0]]
+                    ],
+                },
+            )
+        }
+        index = CellIndex(resolution=5, max_cells=16)
+        index.add_places({"rome": make_point("Rome", 12.5, 41.9)})
+        assert index.join(broad, rings=0)["broad"] == {"rome"}
+
+
+class FakeGazetteer(Gazetteer):
+    def __init__(self):
+        Gazetteer.__init__(self, "fake")
+
+    def cached_places(self):
+        return {
+            "1": make_point("Zucchabar", 2.2, 36.3),
+            "2": make_point("Zuccabaris", 2.21, 36.3),
+            "3": make_point("Zucchabar", 12.5, 41.9),
+        }
+
+
+class TestManagerCells:
+    def test_align_cells(self):
+        m = Manager()
+        m._gazetteers["fake"] = (FakeGazetteer(), None)
+        place = make_point("Zucchabar", 2.2, 36.3)
+        place.id = "zucchabar"
+        m.apographe["zucchabar"] = place
+        hits = m.align("fake", candidates="cells", names="none")
+        assert sorted(h["id"] for h in hits["zucchabar"]) == ["1", "2"]
+        hits = m.align("fake", "zucchabar", candidates="cells", resolution="7")
+        assert [h["id"] for h in hits["zucchabar"]] == ["1"]
+        assert hits["zucchabar"][0]["title"] == "Zucchabar"
+        hits = m.align("fake", candidates="cells", names="similar", threshold="0.6")
+        assert [h["id"] for h in hits["zucchabar"]] == ["1", "2"]
+        assert hits["zucchabar"][0]["score"] == 1.0
+        assert 0.6 <= hits["zucchabar"][1]["score"] < 1.0
+        hits = m.align("fake", candidates="cells", names="phonetic")
+        assert [h["id"] for h in hits["zucchabar"]] == ["1"]
+        with pytest.raises(NotImplementedError):
+            m.align("fake", candidates="everywhere")
+
+    def test_align_cells_logged(self, caplog):
+        m = Manager()
+        m._gazetteers["fake"] = (FakeGazetteer(), None)
+        m.apographe["zucchabar"] = make_point("Zucchabar", 2.2, 36.3)
+        caplog.set_level(logging.INFO)
+        m.align("fake", candidates="cells", names="none")
+        # the join only sees the cached places, and says so
+        assert "only the 3 fake places in the parsed-place cache" in caplog.text
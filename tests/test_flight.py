@@ -0,0 +1,70 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.flight module
+"""
+
+from apographe.flight import SingleFlight
+import pytest
+from threading import Event, Thread
+from time import monotonic, sleep
+
+
+class TestSingleFlight:
+    def test_coalesce(self):
+        flights = SingleFlight()
+        release = Event()
+        calls = list()
+
+        def slow(uri):
+            calls.append(uri)
+            release.wait(5)
+            return {"uri": uri}
+
+        results = list()
+        threads = [
+            Thread(
+                target=lambda: results.append(
+                    flights.do("foo", slow, "https://pleiades.stoa.org/places/295374")
+                )
+            )
+            for i in range(8)
+        ]
+        for t in threads:
+            t.start()
+        start = monotonic()
+        while flights.waiting("foo") < 7:
+            assert monotonic() - start < 5
+            sleep(0.01)
+        assert flights.in_flight("foo") == 1
+        release.set()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert len(results) == 8
+        for r in results:
+            assert r is results[0]
+        assert flights.in_flight() == 0
+        assert flights.waiting("foo") == 0
+
+    def test_sequential(self):
+        flights = SingleFlight()
+        calls = list()
+        flights.do("foo", calls.append, 1)
+        flights.do("foo", calls.append, 2)
+        assert calls == [1, 2]
+
+    def test_error(self):
+        flights = SingleFlight()
+
+        def fail():
+            raise RuntimeError("HTTP Error: 404 (Not Found)")
+
+        with pytest.raises(RuntimeError):
+            flights.do("foo", fail)
+        assert flights.in_flight("foo") == 0
@@ -13,4 +13,19 @@ from apographe.gazetteer import Gazetteer
 
 
 class TestGazetteer:
-    pass
+    def test_id_from_uri(self):
+        g = Gazetteer(name="Pleiades", uri_prefixes=["pleiades.stoa.org/places/"])
+        assert g.id_from_uri("https://pleiades.stoa.org/places/295374") == "295374"
+        assert g.id_from_uri("http://pleiades.stoa.org/places/295374/") == "295374"
+        assert (
+            g.id_from_uri("https://pleiades.stoa.org/places/295374#description")
+            == "295374"
+        )
+        assert g.id_from_uri("https://pleiades.stoa.org/places/") is None
+        assert g.id_from_uri("https://vici.org/vici/3956") is None
+
+    def test_uri_prefixes_default(self):
+        g = Gazetteer(name="Pleiades")
+        g.uri_prefixes.append("pleiades.stoa.org/places/")
+        assert Gazetteer(name="Vici").uri_prefixes == []
+        assert g.id_from_uri("https://pleiades.stoa.org/places/295374") == "295374"
@@ -0,0 +1,184 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.geo module
+"""
+
+from apographe.cells import encode
+from apographe.geo import (
+    bubble,
+    bubble_bounds,
+    bubbles,
+    derive_geometries,
+    geometries_from_geojson,
+    geometry_key,
+    split_bounds,
+)
+from math import asin, atan2, cos, degrees, pi, radians, sin
+import numpy as np
+from shapely.geometry import LineString, Point, Polygon, shape
+from shapely.ops import unary_union
+
+
+def scalar_bubble(
+    origin_shape, buffer_distance=0, radius_multiplier=1, radius_minimum=1
+):
+    """The original, one-terminus-at-a-time bubble() for reference."""
+    origin = origin_shape.centroid
+    origin_lon = radians(origin.x)
+    origin_lat = radians(origin.y)
+    distance = max(
+        origin_shape.length / 2 * radius_multiplier + buffer_distance, radius_minimum
+    )
+    angular_distance = distance / 6378137.0
+    termini = list()
+    bearing = 0.0
+    while bearing < 2.0 * pi:
+        dest_lat = asin(
+            sin(origin_lat) * cos(angular_distance)
+            + cos(origin_lat) * sin(angular_distance) * cos(bearing)
+        )
+        dest_lon = origin_lon + atan2(
+            sin(bearing) * sin(angular_distance) * cos(origin_lat),
+            cos(angular_distance) - sin(origin_lat) * sin(dest_lat),
+        )
+        termini.append(Point(degrees(dest_lon), degrees(dest_lat)))
+        bearing += pi / 19.0
+    if isinstance(origin_shape, Point):
+        return unary_union(termini).convex_hull
+    d_dd = max([t.hausdorff_distance(origin_shape) for t in termini])
+    return origin_shape.convex_hull.buffer(d_dd)
+
+
+SHAPES = [
+    Point(2.2, 36.3),
+    Point(-179.9, 89.0),
+    LineString([(12.0, 41.0), (12.5, 41.9)]),
+    Polygon([(23.0, 37.0), (23.5, 37.0), (23.5, 38.2), (23.0, 37.0)]),
+]
+
+
+class TestBubble:
+    def test_bubble(self):
+        for shape in SHAPES:
+            for kwargs in [
+                {"buffer_distance": 1000},
+                {"radius_multiplier": 2, "radius_minimum": 5000},
+            ]:
+                expected = scalar_bubble(shape, **kwargs)
+                assert bubble(shape, **kwargs).equals_exact(expected, 1e-9)
+
+    def test_bubbles(self):
+        results = bubbles(SHAPES, radius_multiplier=2, radius_minimum=5000)
+        assert results.shape == (len(SHAPES),)
+        for shape, result in zip(SHAPES, results):
+            expected = scalar_bubble(shape, radius_multiplier=2, radius_minimum=5000)
+            assert result.equals_exact(expected, 1e-9)
+        # per-shape arguments
+        distances = np.array([100.0, 200.0, 300.0, 400.0])
+        results = bubbles(SHAPES, buffer_distance=distances)
+        for shape, distance, result in zip(SHAPES, distances, results):
+            assert result.equals_exact(
+                scalar_bubble(shape, buffer_distance=distance), 1e-9
+            )
+        assert len(bubbles([])) == 0
+
+
+class TestBubbleBounds:
+    def test_bubble_bounds(self):
+        kwargs = {"radius_multiplier": 2, "radius_minimum": 5000}
+        all_bounds = bubble_bounds(SHAPES[:1] + SHAPES[2:], **kwargs)
+        for shape, bounds in zip(SHAPES[:1] + SHAPES[2:], all_bounds):
+            expected = np.array(scalar_bubble(shape, **kwargs).bounds)
+            # the same box, give or take the polygonal approximation of curves
+            assert (bounds[:2] <= expected[:2] + 1e-9).all()
+            assert (bounds[2:] >= expected[2:] - 1e-9).all()
+            assert np.allclose(bounds, expected, atol=0.002)
+        assert bubble_bounds([]).shape == (0, 4)
+
+    def test_antimeridian(self):
+        shapes = [
+            Point(179.99, -17.0),
+            Point(-179.99, -17.0),
+            LineString([(179.9, 65.0), (179.95, 65.1)]),
+        ]
+        for bounds in bubble_bounds(shapes, radius_minimum=5000):
+            west, south, east, north = bounds
+            assert west > east
+            assert -180.0 <= east < -179.0 and 179.0 < west <= 180.0
+            assert south < north
+            boxes = split_bounds(bounds)
+            assert len(boxes) == 2
+            assert boxes[0][2] == 180.0 and boxes[1][0] == -180.0
+        bounds = bubble_bounds([Point(10.0, 40.0)])[0]
+        assert split_bounds(bounds) == [tuple(bounds.tolist())]
+
+    def test_poles(self):
+        shapes = [
+            Point(30.0, 89.99),
+            Point(-120.0, -89.99),
+            LineString([(0.0, 89.9), (1.0, 89.99)]),
+        ]
+        for bounds in bubble_bounds(shapes, radius_minimum=5000):
+            west, south, east, north = bounds
+            assert (west, east) == (-180.0, 180.0)
+            assert -90.0 <= south < north <= 90.0
+            assert north == 90.0 or south == -90.0
+
+
+class TestGeometriesFromGeojson:
+    def test_geometries_from_geojson(self):
+        ring = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]
+        hole = [[0.2, 0.1], [0.8, 0.1], [0.8, 0.7], [0.2, 0.1]]
+        items = [
+            {"type": "Point", "coordinates": [2.2, 36.3]},
+            {"type": "Point", "coordinates": [1.0, 2.0]},
+            {"type": "LineString", "coordinates": [[0.0, 0.0], [1.0, 1.0]]},
+            {"type": "Polygon", "coordinates": [ring, hole]},
+            {"type": "Polygon", "coordinates": [ring]},
+            {"type": "MultiPoint", "coordinates": [[1.0, 2.0], [3.0, 4.0]]},
+            {"type": "MultiLineString", "coordinates": [[[0.0, 0.0], [1.0, 1.0]]]},
+            {"type": "MultiPolygon", "coordinates": [[ring, hole], [ring]]},
+            {
+                "type": "GeometryCollection",
+                "geometries": [
+                    {"type": "Point", "coordinates": [1.0, 2.0]},
+                    {"type": "Polygon", "coordinates": [ring]},
+                ],
+            },
+        ]
+        for geometry, item in zip(geometries_from_geojson(items), items):
+            assert geometry.equals_exact(shape(item), 0.0)
+        assert len(geometries_from_geojson([])) == 0
+
+    def test_irregular(self):
+        # mixed dimensions and empty parts are built one at a time
+        items = [
+            {"type": "Point", "coordinates": [1.0, 2.0]},
+            {"type": "Point", "coordinates": [1.0, 2.0, 3.0]},
+            {"type": "MultiPoint", "coordinates": []},
+            {"type": "GeometryCollection", "geometries": []},
+        ]
+        geometries = geometries_from_geojson(items)
+        assert geometries[1].has_z
+        for geometry, item in zip(geometries, items):
+            assert geometry.equals_exact(shape(item), 0.0)
+
+
+class TestDerivedGeometry:
+    def test_derive_geometries(self):
+        for shape, derived in zip(SHAPES, derive_geometries(SHAPES, tolerance=0.1)):
+            assert derived.key == geometry_key(shape)
+            assert derived.hull.equals(shape.convex_hull)
+            assert derived.centroid.equals(shape.centroid)
+            assert derived.bounds == shape.bounds
+            assert shape.intersects(derived.representative_point)
+            assert derived.footprint.equals(shape.simplify(0.1))
+            point = derived.representative_point
+            assert derived.cell == encode([point.x], [point.y])[0]
+        assert geometry_key(Point(1.0, 2.0)) != geometry_key(Point(2.0, 1.0))
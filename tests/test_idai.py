@@ -26,6 +26,17 @@ class TestIDAI:
         global gaz
         gaz.backend = "web"
 
+    def test_kwargs_without_types(self):
+        data = {
+            "@id": "https://gazetteer.dainst.org/place/1",
+            "prefName": {"title": "Nowhere"},
+            "names": [],
+            "prefLocation": {"coordinates": [2.2, 36.3]},
+        }
+        kwargs = gaz._kwargs_from_json(data)
+        assert "types" not in kwargs
+        assert kwargs["descriptions"][0]["value"] == ""
+
 
 class TestIDAIWeb:
     """
@@ -9,7 +9,13 @@
 Test the apographe.languages_and_scripts module
 """
 
-from apographe.languages_and_scripts import is_latn, romanize
+from apographe.languages_and_scripts import (
+    is_latn,
+    name_keys,
+    parse_language_tag,
+    romanize,
+)
+import pytest
 
 
 class TestIsLatin:
@@ -34,6 +40,20 @@ class TestIsLatin:
         assert is_latn("Zucchabar")
 
 
+class TestParseLanguageTag:
+    def test_cached(self):
+        tag, language, region, script = parse_language_tag("en-Arab-US")
+        assert tag.format == "en-Arab-US"
+        assert (language.format, region.format, script.format) == ("en", "US", "Arab")
+        assert parse_language_tag("en-Arab-US") is parse_language_tag("en-Arab-US")
+        tag, language, region, script = parse_language_tag("la")
+        assert region is None
+        assert script.format == "Latn"  # default script for the language
+        assert parse_language_tag("la-IT")[1] is language  # interned subtag
+        with pytest.raises(ValueError):
+            parse_language_tag("xx-notatag-123456789")
+
+
 class TestRomanize:
     def test_arab(self):
         s = "بكين"
@@ -80,3 +100,18 @@ class TestRomanize:
         s = "Pékin"
         romanizations = romanize(s)
         assert romanizations == {s, "Pekin", "Pékin"}
+
+
+class TestNameKeys:
+    def test_latn(self):
+        assert name_keys("Zucchabar (2)") == ({"zucchabar"}, {"zukabar"})
+
+    def test_grek(self):
+        keys, phonetic = name_keys("Ζουχάββαρ", "grc")
+        assert "ζουχαββαρ" in keys
+        assert "zoukhabbar" in keys
+        assert "zukabar" in phonetic
+        assert name_keys("Ζουχάββαρ", "grc") is name_keys("Ζουχάββαρ", "grc")
+
+    def test_no_letters(self):
+        assert name_keys("1, 2") == (frozenset(), frozenset())
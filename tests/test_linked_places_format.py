@@ -8,7 +8,16 @@
 """
 Test the apographe.linked_places_format module
 """
-from apographe.linked_places_format import Feature, Name, NameCollection, Properties
+from apographe.linked_places_format import (
+    Description,
+    DescriptionCollection,
+    derive_all,
+    Feature,
+    make_geometries,
+    Name,
+    NameCollection,
+    Properties,
+)
 import logging
 import pytest
 import re
@@ -46,6 +55,23 @@ class TestProperties:
         p.title = "    \t"
         assert p.title == ""
 
+    def test_types(self):
+        p = Properties(types=["settlement", "Fort", ""])
+        assert p.types == ["fort", "settlement"]
+        p.add_type("Populated Place")
+        p.remove_type("Fort")
+        assert p.types == ["populated-place", "settlement"]
+        assert sorted(p.asdict()["types"]) == ["populated-place", "settlement"]
+        p = Properties(properties={"title": "Zucchabar", "types": ["settlement"]})
+        assert p.types == ["settlement"]
+
+    def test_title_key(self):
+        p = Properties(title="Zucchabar (Miliana)")
+        assert p.title_key == "zucchabarmiliana"
+        p.title = "Ζουχάββαρι"
+        assert p.title_key == "ζουχαββαρι"
+        assert p.asdict() == {"title": "Ζουχάββαρι"}
+
 
 class TestFeature:
     def test_defaults(self):
@@ -95,6 +121,44 @@ class TestFeature:
         assert len(f.names) == 0
 
 
+    def test_make_geometries(self):
+        features = [
+            {"geometry": {"type": "Point", "coordinates": [2.2, 36.3]}},
+            {
+                "geometries": [
+                    {"type": "Point", "coordinates": [1.0, 2.0]},
+                    {"type": "LineString", "coordinates": [[1.0, 2.0], [3.0, 4.0]]},
+                ]
+            },
+            {"geometries": []},
+            {},
+        ]
+        geometries = make_geometries(features)
+        for feature, geometry in zip(features, geometries):
+            expected = Feature._make_geometry(**feature)
+            if isinstance(expected, list):
+                assert geometry == list()
+            else:
+                assert geometry.equals_exact(expected, 0.0)
+        # prebuilt geometries are used as they are
+        f = Feature(geometry=geometries[1])
+        assert f.geometry is geometries[1]
+
+
+    def test_derive_all(self):
+        features = [
+            Feature(geometry={"type": "Point", "coordinates": [float(i), 1.0]})
+            for i in range(3)
+        ] + [Feature()]
+        kept = features[0].derived
+        derive_all(features)
+        assert features[0].derived is kept
+        for f in features[:3]:
+            assert f.derived.hull.equals(f.geometry.convex_hull)
+            assert f.derived.representative_point.equals(f.geometry)
+        assert features[3].derived is None
+
+
 class TestName:
     def test_lang(self):
         n = Name()
@@ -117,6 +181,46 @@ class TestName:
             n.script_subtag is None
         )  # sadly, this is what the IANA registry says: no default script for "grc"
 
+    def test_compact(self):
+        n = Name(toponym="Ζουχάββαρι", language_tag="grc", id="zucchabar#name")
+        m = Name(toponym="Zucchabar", language_tag="grc", lang_code="grc")
+        assert not hasattr(n, "__dict__")
+        assert n._language_tag is m._language_tag  # interned
+        assert n.asdict() == {
+            "language_tag": "grc",
+            "toponym": "Ζουχάββαρι",
+            "id": "zucchabar#name",
+        }
+        assert "id" not in m.asdict()
+        d = Description(value="A town.", language_tag="en", id="zucchabar#d")
+        assert not hasattr(d, "__dict__")
+        assert d.asdict() == {
+            "language_tag": "en",
+            "value": "A town.",
+            "id": "zucchabar#d",
+        }
+        p = Properties(title="Zucchabar")
+        assert not hasattr(p, "__dict__")
+        assert p.asdict() == {"title": "Zucchabar"}
+
+    def test_extra(self):
+        # shaped like an EDH name
+        edh = {
+            "attested": "Zucchabar",
+            "language_code": "la",
+            "romanizations": ["Zucchabar"],
+        }
+        n = Name(**edh)
+        assert not hasattr(n, "__dict__")
+        assert n.extra == {"attested": "Zucchabar", "language_code": "la"}
+        d = n.asdict()
+        assert d == edh
+        assert Name(**d).asdict() == edh
+        d = Description(value="A town.", source="EDH", citation="p. 12").asdict()
+        assert d["citation"] == "p. 12"
+        assert Description(**d).asdict() == d
+        assert Name(toponym="Zucchabar").extra == {}
+
     def test_romanizations(self):
         n = Name(romanizations=("foo", "phō"))
         assert set(n.romanizations) == {"foo", "phō"}
@@ -154,3 +258,43 @@ class TestNameCollection:
         names = nc.get_names("bar")
         assert len(names) == 1
         assert names[0].toponym == "bar"
+
+    def test_match_keys(self):
+        nc = NameCollection(
+            names=[
+                {"toponym": "Ζουχάββαρι", "romanizations": ["Zouchábbari"]},
+                {"toponym": "Miliana (modern)"},
+                {"toponym": "1"},
+            ]
+        )
+        assert set(nc.match_keys) == {"ζουχαββαρι", "zouchabbari", "milianamodern"}
+        assert nc.get_names("ZOUCHABBARI")[0].toponym == "Ζουχάββαρι"
+        assert nc.get_names("Miliana, modern")[0].toponym == "Miliana (modern)"
+        assert "_keys" not in nc.asdict()
+        nc.remove_name(nc.get_names("Miliana (modern)")[0])
+        assert set(nc.match_keys) == {"ζουχαββαρι", "zouchabbari"}
+        del nc.names
+        assert len(nc.match_keys) == 0
+
+    def test_phonetic_keys(self):
+        nc = NameCollection(
+            names=[
+                {"toponym": "Ζουχάββαρι", "romanizations": ["Zouchábbari"]},
+                {"toponym": "Ζουχάββαρ", "language_tag": "grc"},
+                {"toponym": "Zucchabar"},
+            ]
+        )
+        assert set(nc.phonetic_keys) == {"zukabari", "zukabar"}
+        assert [n.toponym for n in nc.unromanized] == ["Ζουχάββαρ"]
+        nc.remove_name(nc.unromanized[0])
+        assert nc.unromanized == []
+
+
+class TestDescriptionCollection:
+    def test_words(self):
+        dc = DescriptionCollection(
+            descriptions=["A Roman colony.", "An ancient place -- a colony"]
+        )
+        assert dc.words == {"a", "roman", "colony", "an", "ancient", "place"}
+        dc.remove_description(dc.get_descriptions("Roman")[0])
+        assert dc.words == {"a", "colony", "an", "ancient", "place"}
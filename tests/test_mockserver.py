@@ -0,0 +1,161 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.mockserver module
+"""
+
+from apographe.edh import EDH, EDHQuery
+from apographe.manager import Manager
+from apographe.mockserver import MockGazetteerServer
+from apographe.place import Place
+from apographe.pleiades import Pleiades, PleiadesQuery
+from apographe.replay import ReplayArchive
+import pytest
+import requests
+
+
+class TestMockGazetteerServer:
+    def test_place(self):
+        with MockGazetteerServer(crawl_delay=2) as server:
+            server.add_place("pleiades", "295374", {"title": "Zucchabar"})
+            server.add_place("idai", "2282601", {"prefName": {"title": "Miliana"}})
+            base = f"http://{server.netloc}"
+            r = requests.get(f"{base}/places/295374/json")
+            assert r.status_code == 200
+            assert r.json() == {"title": "Zucchabar"}
+            r = requests.get(f"{base}/doc/2282601.json")
+            assert r.json()["prefName"]["title"] == "Miliana"
+            r = requests.get(f"{base}/places/0/json")
+            assert r.status_code == 404
+            r = requests.get(f"{base}/robots.txt")
+            assert "Crawl-delay: 2" in r.text
+            server.add_response(
+                "/vici/3956/json", b"{}", headers={"ETag": '"v1"'}
+            )
+            r = requests.get(
+                f"{base}/vici/3956/json", headers={"If-None-Match": '"v1"'}
+            )
+            assert r.status_code == 304
+            assert server.stats["requests"] == 5
+            assert server.stats["status"] == {200: 3, 304: 1, 404: 1}
+            kwargs = server.gazetteer_kwargs()
+            assert kwargs["place_netloc"] == server.netloc
+            assert kwargs["place_scheme"] == "http"
+        with pytest.raises(ValueError):
+            server.add_place("narnia", "1", {})
+
+    def test_archive(self, tmp_path):
+        archive = ReplayArchive(tmp_path)
+        r = requests.Response()
+        r.status_code = 200
+        r.encoding = "utf-8"
+        r.headers["Content-Type"] = "application/rss+xml"
+        r.headers["Content-Encoding"] = "gzip"
+        r._content = b"<rss></rss>"
+        uri = "https://pleiades.stoa.org/search_rss?SearchableText=Zucchabar"
+        archive.record(uri, r)
+        with MockGazetteerServer(archive=archive) as server:
+            r = requests.get(
+                f"http://{server.netloc}/search_rss?SearchableText=Zucchabar"
+            )
+            assert r.status_code == 200
+            assert r.text == "<rss></rss>"
+            assert r.headers["Content-Type"] == "application/rss+xml"
+            assert "Content-Encoding" not in r.headers
+
+    def test_pleiades(self):
+        with MockGazetteerServer() as server:
+            server.add_place(
+                "pleiades",
+                "295374",
+                {
+                    "title": "Zucchabar",
+                    "uri": "https://pleiades.stoa.org/places/295374",
+                    "placeTypes": ["settlement"],
+                    "names": [
+                        {"attested": "", "romanized": "Zucchabar", "language": ""}
+                    ],
+                    "locations": [
+                        {"geometry": {"type": "Point", "coordinates": [2.2, 36.3]}}
+                    ],
+                },
+            )
+            p = Pleiades(**server.gazetteer_kwargs())
+            p.backend = "web"
+            place = p.get("295374")
+            assert place.properties.title == "Zucchabar"
+            assert place.properties.types == ["settlement"]
+            assert place.names.name_strings == ["Zucchabar"]
+            q = PleiadesQuery()
+            q.set_parameter("title", "Zucchabar")
+            query = p._prep_params(**q.parameters_for_web)
+            server.add_response(
+                f"/search_rss?{query}",
+                (
+                    "<rss><channel><item><title>Zucchabar</title>"
+                    "<link>https://pleiades.stoa.org/places/295374</link>"
+                    "<description>An ancient place</description></item>"
+                    "</channel></rss>"
+                ).encode("utf-8"),
+                content_type="application/rss+xml",
+            )
+            results = p.search(q)
+            assert results["query"].startswith(f"http://{server.netloc}/")
+            assert [hit["id"] for hit in results["hits"]] == ["295374"]
+
+    def test_errors(self):
+        with MockGazetteerServer(error_rate=1.0) as server:
+            server.add_place("vici", "3956", {})
+            r = requests.get(f"http://{server.netloc}/vici/3956/json")
+            assert r.status_code == 503
+
+    def test_dataset(self):
+        with MockGazetteerServer() as server:
+            base = f"http://{server.netloc}"
+            r = requests.get(f"{base}/places/295374/json")
+            assert r.json()["title"] == "Zucchabar"
+            # text and bounding box searches filter the seeded places
+            r = requests.get(f"{base}/search_rss?SearchableText=Zucchabar")
+            assert r.text.count("<item>") == 1
+            r = requests.get(
+                f"{base}/search_rss?lowerLeft=2.0,36.0&upperRight=2.5,36.5"
+            )
+            assert "<title>Zucchabar</title>" in r.text
+            assert "Icosium" not in r.text
+            r = requests.get(f"{base}/geojson.php?bounds=36.0,2.0,36.5,2.5")
+            assert [f["id"] for f in r.json()["features"]] == [99001]
+            r = requests.get(f"{base}/search.php?terms=colony")
+            assert len(r.json()["features"]) == 3
+            r = requests.get(f"{base}/search.json?q=Cherchell")
+            assert [p["gazId"] for p in r.json()["result"]] == ["9900002"]
+            r = requests.get(f"{base}/search.json?q=Narnia")
+            assert r.json()["result"] == []
+            e = EDH(**server.gazetteer_kwargs())
+            e.backend = "web"
+            q = EDHQuery()
+            q.set_parameter("title", "Tipasa")
+            assert [hit["id"] for hit in e.search(q)["hits"]] == ["G990003"]
+            assert e.get("G990003").properties.title == "Tipasa - Tipaza"
+        with MockGazetteerServer(dataset=None) as server:
+            r = requests.get(f"http://{server.netloc}/search.json?q=Cherchell")
+            assert r.json()["result"] == []
+
+    def test_align(self):
+        with MockGazetteerServer() as server:
+            kwargs = server.gazetteer_kwargs()
+            m = Manager({"pleiades": kwargs, "vici": kwargs})
+            m.apographe["zucchabar"] = Place(
+                id="zucchabar",
+                title="Zucchabar",
+                names=[{"toponym": "Zucchabar", "language_tag": "la"}],
+                geometry={"type": "Point", "coordinates": [2.2, 36.3]},
+            )
+            hits = m.align("pleiades", "zucchabar")["zucchabar"]
+            assert [hit["id"] for hit in hits] == ["295374"]
+            hits = m.align("vici", "zucchabar")["zucchabar"]
+            assert [hit["id"] for hit in hits] == ["99001"]
@@ -10,10 +10,12 @@ Test the apographe.place module
 """
 
 from apographe.linked_places_format import dumps as lpfdumps
-from apographe.place import Place
+from apographe.linked_places_format import NameCollection
+from apographe.place import LazyPlace, Place
 from apographe.serialization import ApographeEncoder
 import json
 import logging
+import pytest
 from pprint import pformat
 from shapely.geometry import Point
 from shapely.geometry import shape as shapely_shape
@@ -116,3 +118,99 @@ class TestPlace:
         shape = shapely_shape(f["geometry"])
         assert isinstance(shape, Point)
         assert [shape.x, shape.y] == [2.2237580000000001, 36.304938999999997]
+
+    def test_copy(self):
+        p = Place(
+            raw={"title": "Zucchabar"},
+            id="zucchabar",
+            title="Zucchabar",
+            names=[{"toponym": "Ζουχάββαρι", "language_tag": "grc"}],
+            geometry={"type": "Point", "coordinates": [2.223758, 36.304939]},
+        )
+        q = p.copy()
+        assert q._raw is p._raw  # shared until the copy reads it
+        assert q.raw == p.raw and q.raw is not p.raw
+        q.raw["title"] = "Miliana"
+        assert p.raw == {"title": "Zucchabar"}
+        assert q.raw["title"] == "Miliana"
+        assert q.geometry is p.geometry
+        assert q.internal_id != p.internal_id
+        assert q.names.name_strings == p.names.name_strings
+        q.names.add_name("Miliana")
+        q.properties.title = "Miliana"
+        assert len(p.names) == 1
+        assert p.properties.title == "Zucchabar"
+
+    def test_retain_raw(self, tmp_path):
+        raw = {"title": "Zucchabar", "names": [{"attested": "Ζουχάββαρι"}]}
+        p = Place(raw=raw, id="zucchabar", title="Zucchabar")
+        assert p.raw_retention == "keep"
+        p.retain_raw("compress")
+        assert isinstance(p._raw, bytes)
+        assert p.raw == raw
+        p.retain_raw("blob", store=tmp_path)
+        assert p.raw == raw
+        assert p._raw in p._raw_store
+        q = p.copy()
+        assert q.raw == raw
+        p.retain_raw("drop")
+        assert p.raw is None
+        assert q.raw == raw
+        d = p.asdict()
+        assert "raw" not in d and "raw_retention" not in d
+        with pytest.raises(ValueError):
+            p.retain_raw("blob")
+        with pytest.raises(ValueError):
+            p.retain_raw("shred")
+
+    def test_lazy(self):
+        p = Place(
+            id="zucchabar",
+            uri="https://pleiades.stoa.org/places/295374",
+            title="Zucchabar",
+            names=[{"toponym": "Ζουχάββαρι", "language_tag": "grc"}],
+            descriptions=[{"value": "An ancient place.", "language_tag": "en"}],
+            geometry={"type": "Point", "coordinates": [2.223758, 36.304939]},
+        )
+        feature = json.loads(lpfdumps(p))["features"][0]
+        lazy = LazyPlace(**feature)
+        assert not lazy.hydrated
+        assert lazy.id == "zucchabar"
+        assert lazy.properties.title == "Zucchabar"
+        assert lazy.uri == p.uri
+        assert not lazy.hydrated
+        assert lazy.names.name_strings == ["Ζουχάββαρι"]
+        assert not lazy.hydrated
+        assert isinstance(lazy.geometry, Point)
+        eager = Place(**feature)
+        d = json.loads(lpfdumps(lazy))["features"][0]
+        assert lazy.hydrated
+        e = json.loads(lpfdumps(eager))["features"][0]
+        d.pop("id_internal")
+        e.pop("id_internal")
+        assert d == e
+        lazy = LazyPlace(**feature)
+        lazy.names = NameCollection(names=["Miliana"])
+        assert lazy.names.name_strings == ["Miliana"]
+        assert len(lazy.copy().descriptions) == 1
+
+    def test_derived(self):
+        geometry = {
+            "type": "Polygon",
+            "coordinates": [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]],
+        }
+        p = Place(title="Triangle", geometry=geometry)
+        derived = p.derived
+        assert p.derived is derived
+        assert derived.bounds == (0.0, 0.0, 1.0, 1.0)
+        assert "derived" not in json.loads(lpfdumps(p))["features"][0]
+        assert p.copy().derived is derived
+        p.geometry = Point(5.0, 5.0)
+        assert p.derived is not derived
+        assert p.derived.centroid.equals(Point(5.0, 5.0))
+        assert Place(title="Nowhere").derived is None
+        # deferred geometry is derived once built, and re-derived when replaced
+        lazy = LazyPlace(title="Triangle", geometry=geometry)
+        assert lazy.derived.key == derived.key
+        lazy.geometry = Point(5.0, 5.0)
+        assert lazy.derived.key != derived.key
@@ -42,6 +42,7 @@ class TestPleiadesWeb:
         assert place.raw["title"] == "Zucchabar"
         assert place.id == "295374"
         assert place.properties.title == "Zucchabar"
+        assert place.properties.types == ["settlement"]
         assert set(place.names.name_strings) == {
             "Zouchabbari",
             "Zouchábbari",
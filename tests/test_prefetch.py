@@ -0,0 +1,84 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.prefetch module
+"""
+
+from apographe import prefetch
+from apographe.prefetch import Prefetcher
+import json
+import pytest
+from threading import Lock
+
+
+class Counter:
+    """Minimal gazetteer that counts the places it is asked for."""
+
+    name = "Counter"
+
+    def __init__(self, missing=[]):
+        self.missing = missing
+        self.calls = list()
+        self._lock = Lock()
+
+    def get(self, id: str):
+        with self._lock:
+            self.calls.append(id)
+        if id in self.missing:
+            raise RuntimeError(f"HTTP Error: 404 (Not Found) for {id}")
+        return id
+
+
+class TestPrefetcher:
+    def test_prefetch(self):
+        gaz = Counter(missing=["3"])
+        p = Prefetcher(gaz, ["1", "2", "3", "2"], workers=2).start()
+        assert p.wait(timeout=10)
+        assert sorted(gaz.calls) == ["1", "2", "3"]
+        progress = p.progress()
+        assert progress["total"] == 3
+        assert progress["done"] == 2
+        assert progress["failed"] == 1
+        assert progress["remaining"] == 0
+        assert not progress["running"]
+
+    def test_resume(self, tmp_path):
+        state_path = tmp_path / "prefetch.json"
+        gaz = Counter(missing=["3"])
+        p = Prefetcher(gaz, ["1", "2", "3"], state_path=state_path, workers=1)
+        assert p.start().wait(timeout=10)
+        with open(state_path, "r", encoding="utf-8") as fp:
+            state = json.load(fp)
+        assert state["done"] == ["1", "2"]
+        assert list(state["failed"].keys()) == ["3"]
+        gaz = Counter()
+        p = Prefetcher(gaz, ["1", "2", "3", "4"], state_path=state_path, workers=1)
+        assert p.progress()["resumed"] == 2
+        assert p.start().wait(timeout=10)
+        assert gaz.calls == ["3", "4"]  # failed IDs are retried
+        assert p.progress()["done"] == 4
+
+    @pytest.mark.filterwarnings("error::pytest.PytestUnhandledThreadExceptionWarning")
+    def test_concurrent_checkpoints(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(prefetch, "STATE_FLUSH_INTERVAL", 1)
+        state_path = tmp_path / "prefetch.json"
+        ids = [str(i) for i in range(400)]
+        p = Prefetcher(Counter(), ids, state_path=state_path, workers=8)
+        assert p.start().wait(timeout=30)
+        assert p.progress()["done"] == 400
+        with open(state_path, "r", encoding="utf-8") as fp:
+            state = json.load(fp)
+        assert sorted(state["done"]) == sorted(ids)
+        assert [fp.name for fp in tmp_path.iterdir()] == ["prefetch.json"]
+
+    def test_wrong_gazetteer(self, tmp_path):
+        state_path = tmp_path / "prefetch.json"
+        with open(state_path, "w", encoding="utf-8") as fp:
+            json.dump({"gazetteer": "Pleiades", "done": [], "failed": {}}, fp)
+        with pytest.raises(ValueError):
+            Prefetcher(Counter(), ["1"], state_path=state_path)
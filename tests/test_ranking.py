@@ -0,0 +1,148 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.ranking module
+"""
+
+from apographe.alignment import similarity
+from apographe.manager import Manager
+from apographe.place import Place
+from apographe.ranking import (
+    combine,
+    geodesic_distances,
+    rank_hits,
+    score_pairs,
+    top_k,
+    WEIGHTS,
+)
+from conftest import make_point
+import numpy as np
+import pytest
+
+
+class TestDistances:
+    def test_geodesic_distances(self):
+        d = geodesic_distances(
+            [0.0, 2.2, 179.9], [0.0, 36.3, 0.0], [1.0, 2.2, -179.9], [0.0, 36.3, 0.0]
+        )
+        assert d[0] == pytest.approx(111319.5, rel=1e-3)
+        assert d[1] == 0.0
+        assert d[2] == pytest.approx(22263.9, rel=1e-3)
+        assert np.isnan(geodesic_distances([np.nan], [0.0], [0.0], [0.0])[0])
+
+
+class TestScores:
+    def test_score_pairs(self):
+        places = [
+            make_point(
+                "Zucchabar",
+                2.2,
+                36.3,
+                types=["settlement"],
+                description="a Roman colony",
+            ),
+            Place(title="Nowhere"),
+        ]
+        others = [
+            make_point(
+                "Zucchabar",
+                2.2,
+                36.3,
+                types=["settlement"],
+                description="Roman colony",
+            ),
+            make_point("Zuccabar", 2.25, 36.3, types=["fort"]),
+        ]
+        scores, components = score_pairs(places, others, [0, 0, 1], [0, 1, 1])
+        assert scores[0] == pytest.approx(1.0)
+        assert components["distance"][1] < 1.0
+        assert components["names"][1] == similarity("zucchabar", "zuccabar")
+        assert components["types"][1] == 0.0
+        assert np.isnan(components["descriptions"][1])
+        assert np.isnan(components["distance"][2])
+        assert scores[2] == components["names"][2]  # the only component available
+        assert 0.0 < scores[1] < scores[0]
+
+    def test_score_pairs_names(self):
+        places = [Place(title="Zucchabar", names=[{"toponym": "Miliana"}])]
+        others = [
+            Place(title="Zuccabaris", names=[{"toponym": "Malliana"}]),
+            Place(title="Roma"),
+            Place(),
+        ]
+        scores, components = score_pairs(places, others, [0, 0, 0], [0, 1, 2])
+        # the best of every pair of the places' name slugs
+        assert components["names"][0] == max(
+            similarity(s, t)
+            for s in ["zucchabar", "miliana"]
+            for t in ["zuccabaris", "malliana"]
+        )
+        assert components["names"][1] == max(
+            similarity(s, "roma") for s in ["zucchabar", "miliana"]
+        )
+        assert np.isnan(components["names"][2])
+
+    def test_combine(self):
+        components = {
+            "distance": np.array([1.0, np.nan]),
+            "names": np.array([0.5, np.nan]),
+            "types": np.array([np.nan, np.nan]),
+            "descriptions": np.array([np.nan, np.nan]),
+        }
+        assert combine(components, WEIGHTS).tolist() == pytest.approx([0.75, 0.0])
+
+    def test_top_k(self):
+        groups = [0, 0, 1, 0, 1, 2]
+        scores = [0.2, 0.9, 0.5, 0.9, 0.1, 0.3]
+        assert top_k(groups, scores).tolist() == [1, 3, 0, 2, 4, 5]
+        assert top_k(groups, scores, k=1).tolist() == [1, 2, 5]
+        assert top_k(groups, scores, k=2, threshold=0.3).tolist() == [1, 3, 2, 5]
+        assert top_k([], []).tolist() == []
+
+
+class TestRankHits:
+    def test_rank_hits(self):
+        places = {"z": make_point("Zucchabar", 2.2, 36.3, types=["settlement"])}
+        candidates = {
+            "1": make_point("Zuccabar", 2.3, 36.3, types=["settlement"]),
+            "2": make_point("Zucchabar", 2.2, 36.3, types=["settlement"]),
+            "3": make_point("Tipasa", 2.4, 36.3),
+        }
+        hits = {"z": [{"id": pid} for pid in ["1", "2", "3"]], "none": []}
+        places["none"] = Place(title="None")
+        ranked = rank_hits(hits, places, candidates)
+        assert [h["id"] for h in ranked["z"]] == ["2", "1", "3"]
+        assert ranked["z"][0]["rank_score"] == pytest.approx(1.0)
+        assert ranked["none"] == []
+        ranked = rank_hits(hits, places, candidates, k=1)
+        assert [h["id"] for h in ranked["z"]] == ["2"]
+        ranked = rank_hits(hits, places, candidates, threshold=0.5)
+        assert [h["id"] for h in ranked["z"]] == ["2", "1"]
+
+
+class TestManagerRank:
+    def test_align_dataset(self, tmp_path):
+        other = Manager()
+        other.apographe = {
+            "1": make_point("Zuccabar", 2.21, 36.3),
+            "2": make_point("Zucchabar", 2.2, 36.3),
+            "3": make_point("Tipasa", 2.22, 36.3),
+        }
+        path = str(tmp_path / "external.snapshot")
+        other.save("snapshot", path)
+        m = Manager()
+        m.apographe = {"zucchabar": make_point("Zucchabar", 2.2, 36.3)}
+        hits = m.align(dataset=path, names="none")
+        assert [h["id"] for h in hits["zucchabar"]] == ["1", "2", "3"]
+        hits = m.align(dataset=path, names="none", top="2")
+        assert [h["id"] for h in hits["zucchabar"]] == ["2", "1"]
+        assert hits["zucchabar"][0]["rank_score"] == pytest.approx(1.0)
+        hits = m.align(dataset=path, names="none", top="0", min_score="0.8")
+        assert [h["id"] for h in hits["zucchabar"]] == ["2", "1"]
+        hits = m.align(dataset=path, names="none", min_score="0.95")
+        assert [h["id"] for h in hits["zucchabar"]] == ["2"]
@@ -0,0 +1,74 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.replay module
+"""
+
+from apographe.replay import ReplayArchive, ReplayInterface
+import pytest
+from requests import Response
+from requests.exceptions import HTTPError
+from time import perf_counter
+
+URI = "https://pleiades.stoa.org/places/295374/json"
+MISSING = "https://pleiades.stoa.org/places/0/json"
+
+
+class Live:
+    """Pretend to be a webiquette interface talking to Pleiades."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, uri):
+        self.calls += 1
+        r = Response()
+        r.url = uri
+        r.encoding = "utf-8"
+        if uri == URI:
+            r.status_code = 200
+            r.headers["ETag"] = '"abc"'
+            r._content = '{"title": "Zucchabar", "names": ["Ζουχάββαρι"]}'.encode(
+                "utf-8"
+            )
+        else:
+            r.status_code = 404
+            r._content = b"Not Found"
+            r.raise_for_status()
+        return r
+
+
+class TestReplay:
+    def test_record_replay(self, tmp_path):
+        archive = ReplayArchive(tmp_path / "fixtures")
+        live = Live()
+        recorder = ReplayInterface(archive, interface=live, record=True)
+        r = recorder.get(URI)
+        assert r.json()["title"] == "Zucchabar"
+        with pytest.raises(HTTPError):
+            recorder.get(MISSING)
+        assert live.calls == 2
+        assert URI in archive
+        assert set(archive.uris) == {URI, MISSING}
+
+        player = ReplayInterface(archive, latency=0.05)
+        start = perf_counter()
+        r = player.get(URI)
+        assert perf_counter() - start >= 0.05
+        assert r.json() == {"title": "Zucchabar", "names": ["Ζουχάββαρι"]}
+        assert r.headers["etag"] == '"abc"'
+        with pytest.raises(HTTPError) as err:
+            player.get(MISSING)
+        assert err.value.response.status_code == 404
+        with pytest.raises(RuntimeError):
+            player.get("https://pleiades.stoa.org/places/1/json")
+        assert live.calls == 2
+
+    def test_record_requires_interface(self, tmp_path):
+        with pytest.raises(ValueError):
+            ReplayInterface(ReplayArchive(tmp_path), record=True)
@@ -0,0 +1,84 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.scheduler module
+"""
+
+from apographe.mockserver import MockGazetteerServer
+from apographe.scheduler import HostScheduler, robots_crawl_delay
+import pytest
+from threading import Thread
+from time import monotonic, sleep
+
+
+class TestHostScheduler:
+    def test_crawl_delay(self):
+        s = HostScheduler()
+        s.configure("pleiades.stoa.org", crawl_delay=0.1)
+        start = monotonic()
+        for i in range(4):
+            with s.slot("pleiades.stoa.org"):
+                pass
+        assert monotonic() - start >= 0.3
+        m = s.metrics("pleiades.stoa.org")
+        assert m["requests"] == 4
+        assert m["in_flight"] == 0
+        assert m["max_wait"] >= 0.09
+
+    def test_refund(self):
+        s = HostScheduler()
+        s.configure("vici.org", crawl_delay=10)
+        start = monotonic()
+        for i in range(3):
+            with s.slot("vici.org"):
+                pass
+            s.refund("vici.org")  # e.g., answered from cache
+        assert monotonic() - start < 1
+        assert s.metrics("vici.org")["refunds"] == 3
+
+    def test_concurrency(self):
+        s = HostScheduler()
+        s.configure("gazetteer.dainst.org", concurrency=2)
+        peak = list()
+        active = list()
+
+        def work():
+            with s.slot("gazetteer.dainst.org"):
+                active.append(1)
+                peak.append(len(active))
+                sleep(0.05)
+                active.pop()
+
+        threads = [Thread(target=work) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert max(peak) <= 2
+        m = s.metrics()["gazetteer.dainst.org"]
+        assert m["requests"] == 6
+        assert m["peak_queue_depth"] >= 2
+        with pytest.raises(ValueError):
+            s.configure("gazetteer.dainst.org", concurrency=0)
+
+    def test_robots(self):
+        with MockGazetteerServer(crawl_delay=2) as server:
+            robots_uri = f"http://{server.netloc}/robots.txt"
+            assert robots_crawl_delay(robots_uri, "ApographeTester/0.0.1") == 2.0
+            s = HostScheduler()
+            s.configure(server.netloc, robots_uri=robots_uri, user_agent="Tester")
+            with s.slot(server.netloc):
+                pass
+            m = s.metrics(server.netloc)
+            assert m["crawl_delay"] == 2.0
+            assert m["rate"] == pytest.approx(0.5)
+            assert m["concurrency"] == 1
+            # the crawl-delay outlasts later configuration of the host
+            s.configure(server.netloc, concurrency=4, robots_uri=robots_uri)
+            assert s.metrics(server.netloc)["concurrency"] == 1
+            assert server.stats["requests"] == 2
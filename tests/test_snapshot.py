@@ -0,0 +1,137 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.snapshot module
+"""
+
+from apographe.linked_places_format import dumps
+from apographe.manager import Manager
+from apographe.place import Place
+from apographe.snapshot import dump_snapshot, load_snapshot
+import json
+import numpy as np
+import pytest
+
+
+def comparable(place):
+    """LPF for place, less the internal ID every new place is given."""
+    feature = json.loads(dumps(place))["features"][0]
+    feature.pop("id_internal")
+    return feature
+
+
+def make_places():
+    places = dict()
+    places["zucchabar"] = Place(
+        id="295374",
+        uri="https://pleiades.stoa.org/places/295374",
+        title="Zucchabar",
+        ccodes=["DZ"],
+        types=["settlement", "fort"],
+        names=[
+            {
+                "toponym": "Zucchabar",
+                "romanizations": ["Zucchabar", "Zuccabar"],
+                "language_tag": "la",
+                "id": "https://pleiades.stoa.org/places/295374/zucchabar",
+            },
+            {"toponym": "Ζουχάββαρι", "language_tag": "grc", "attested": "yes"},
+            {"toponym": "Zucchabar"},
+        ],
+        descriptions=[
+            {
+                "value": "An ancient place, cited: BAtlas 30 D4 Zucchabar",
+                "language_tag": "en",
+                "id": "https://pleiades.stoa.org/places/295374#description",
+            },
+            {"value": "A Roman colony.", "source": "https://example.org/colony"},
+        ],
+        geometry={"type": "Point", "coordinates": [2.2, 36.3]},
+    )
+    places["nowhere"] = Place(title="Nowhere")
+    places["two"] = Place(
+        id="two",
+        title="Two geometries",
+        geometries=[
+            {"type": "Point", "coordinates": [1.0, 2.0]},
+            {"type": "LineString", "coordinates": [[1.0, 2.0], [3.0, 4.0]]},
+        ],
+    )
+    return places
+
+
+class TestSnapshot:
+    def test_round_trip(self, tmp_path):
+        places = make_places()
+        dump_snapshot(places, tmp_path / "all.snapshot")
+        restored = load_snapshot(tmp_path / "all.snapshot")
+        assert list(restored.keys()) == list(places.keys())
+        for k, place in places.items():
+            assert comparable(restored[k]) == comparable(place)
+        place = restored["zucchabar"]
+        assert place.uri == "https://pleiades.stoa.org/places/295374"
+        assert place.properties.country_names == ["Algeria"]
+        assert place.properties.types == ["fort", "settlement"]
+        assert sorted(place.names.get_names("Zuccabar")[0].romanizations) == [
+            "Zuccabar",
+            "Zucchabar",
+        ]
+        assert place.names.get_names("Ζουχάββαρι")[0].language_subtag == "grc"
+        assert place.names.get_names("Zuccabar")[0].script_subtag == "Latn"
+        assert set(place.names.match_keys) == set(
+            places["zucchabar"].names.match_keys
+        )
+        assert len(place.descriptions.get_descriptions("colony")) == 1
+        # name and description IDs, and keys with no attribute of their own
+        feature = comparable(place)
+        assert {n.get("id") for n in feature["names"]} == {
+            "https://pleiades.stoa.org/places/295374/zucchabar",
+            None,
+        }
+        assert {d.get("id") for d in feature["descriptions"]} == {
+            "https://pleiades.stoa.org/places/295374#description",
+            None,
+        }
+        assert place.names.get_names("Ζουχάββαρι")[0].extra == {"attested": "yes"}
+        assert restored["nowhere"].geometry == list()
+        assert restored["nowhere"].derived is None
+        derived = restored["zucchabar"]._derived  # restored, not recomputed
+        assert derived.key == places["zucchabar"].derived.key
+        assert derived.hull.equals(places["zucchabar"].derived.hull)
+        assert derived.bounds == places["zucchabar"].derived.bounds
+        assert derived.cell == places["zucchabar"].derived.cell
+        assert restored["two"].geometry.geom_type == "GeometryCollection"
+
+    def test_not_a_snapshot(self, tmp_path):
+        with open(tmp_path / "other.snapshot", "wb") as fp:
+            np.savez(fp, format=np.array(["something-else"]))
+        del fp
+        with pytest.raises(ValueError):
+            load_snapshot(tmp_path / "other.snapshot")
+
+    def test_manager(self, tmp_path):
+        m = Manager()
+        m.apographe = make_places()
+        m.save("snapshot", str(tmp_path / "gazetteer"))
+        assert (tmp_path / "gazetteer" / "all.snapshot").exists()
+        m.save("snapshot", str(tmp_path / "mine.snapshot"))
+        m2 = Manager()
+        m2.load(str(tmp_path / "mine.snapshot"))
+        assert list(m2.apographe.keys()) == list(m.apographe.keys())
+
+    def test_manager_collisions(self, tmp_path):
+        m = Manager()
+        m.apographe = make_places()
+        m.save("snapshot", str(tmp_path / "mine.snapshot"))
+        m2 = Manager()
+        m2.apographe["zucchabar"] = Place(id="internal", title="Internal")
+        m2.load(str(tmp_path / "mine.snapshot"))
+        # places already loaded are kept and colliding snapshot places are rekeyed
+        assert m2.apographe["zucchabar"].id == "internal"
+        assert m2.apographe["295374"].properties.title == "Zucchabar"
+        assert len(m2.apographe) == len(m.apographe) + 1
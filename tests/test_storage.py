@@ -0,0 +1,199 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.storage module
+"""
+
+from apographe.linked_places_format import dump, dumps
+from apographe.manager import Manager
+from apographe.place import LazyPlace, Place
+from apographe.storage import (
+    iter_read_places,
+    MANIFEST_NAME,
+    pool_size,
+    read_manifest,
+    read_places,
+    shard_index,
+    write_places,
+    write_shards,
+)
+import pytest
+
+
+def write_gazetteer(where, number: int = 12):
+    """Write number one-place LPF files, with colliding IDs and titles."""
+    for i in range(number):
+        place = Place(
+            id=f"place-{i % 3}",
+            title=f"Place {i % 5}",
+            names=[{"toponym": f"Name {i}", "language_tag": "la"}],
+            geometry={"type": "Point", "coordinates": [float(i), 36.0]},
+        )
+        with open(where / f"file-{i}.json", "w", encoding="utf-8") as fp:
+            dump(place, fp, ensure_ascii=False)
+        del fp
+
+
+class TestStorage:
+    def test_pool_size(self):
+        assert pool_size(3) == 3
+        assert pool_size(0) >= 1
+        with pytest.raises(ValueError):
+            pool_size(-1)
+
+    def test_read_places(self, tmp_path):
+        write_gazetteer(tmp_path, 1)
+        places = read_places(tmp_path / "file-0.json")
+        assert isinstance(places[0], Place)
+        places = read_places(tmp_path / "file-0.json", lazy=True)
+        assert isinstance(places[0], LazyPlace)
+        assert places[0].names.name_strings == ["Name 0"]
+
+    def test_parallel(self, tmp_path):
+        write_gazetteer(tmp_path)
+        filepaths = sorted(tmp_path.glob("*.json"))
+        serial = list(iter_read_places(filepaths, processes=1))
+        parallel = list(iter_read_places(filepaths, processes=2))
+        assert [fp for fp, places in parallel] == filepaths
+        for (fp1, places1), (fp2, places2) in zip(serial, parallel):
+            assert [p.asdict()["id"] for p in places1] == [
+                p.asdict()["id"] for p in places2
+            ]
+            assert places1[0].names.names[0].language_tag == "la"
+            assert places2[0].names.names[0].script_subtag == "Latn"
+
+    def test_manager_load(self, tmp_path):
+        write_gazetteer(tmp_path)
+        serial = Manager()
+        serial.load(str(tmp_path))
+        parallel = Manager()
+        parallel.load(str(tmp_path), processes=2)
+        assert len(serial.apographe) == 12
+        assert list(serial.apographe.keys()) == list(parallel.apographe.keys())
+        for k, place in serial.apographe.items():
+            assert parallel.apographe[k].names.name_strings == place.names.name_strings
+
+    def test_write_places(self, tmp_path):
+        places = [
+            Place(
+                id=f"place-{i}",
+                title=f"Place {i}",
+                names=[{"toponym": f"Ἄβδηρα {i}"}],
+            )
+            for i in range(10)
+        ]
+        for processes in [1, 2]:
+            where = tmp_path / str(processes)
+            where.mkdir()
+            items = [(where / f"{p.id}.json", p) for p in places]
+            assert write_places(items, processes=processes, writers=3) == 10
+            for p in places:
+                with open(where / f"{p.id}.json", "r", encoding="utf-8") as fp:
+                    expected = dumps(p, ensure_ascii=False, indent=4, sort_keys=True)
+                    assert fp.read() == expected
+                del fp
+            assert sorted(where.iterdir()) == sorted([fp for fp, p in items])
+        # two places may not be written to the same file
+        items = [(tmp_path / "same.json", p) for p in places[:2]]
+        with pytest.raises(ValueError):
+            write_places(items)
+        assert not (tmp_path / "same.json").exists()
+
+    def test_manager_save(self, tmp_path):
+        (tmp_path / "in").mkdir()
+        write_gazetteer(tmp_path / "in")
+        m = Manager()
+        m.load(str(tmp_path / "in"))
+        m.save("each", str(tmp_path / "serial"))
+        m.save("each", str(tmp_path / "parallel"), processes=2)
+        serial = sorted((tmp_path / "serial").iterdir())
+        assert len(serial) == len(m.apographe)
+        for fp in serial:
+            assert fp.read_bytes() == (tmp_path / "parallel" / fp.name).read_bytes()
+
+    def test_manager_save_collisions(self, tmp_path):
+        m = Manager()
+        for key in ["Place One", "place-one", "place one"]:
+            m.apographe[key] = Place(id=key, title=key)
+        m.save("each", str(tmp_path))
+        assert sorted([fp.name for fp in tmp_path.iterdir()]) == [
+            "place-one-2.json",
+            "place-one-3.json",
+            "place-one.json",
+        ]
+        titles = {read_places(fp)[0].properties.title for fp in tmp_path.iterdir()}
+        assert titles == {"Place One", "place-one", "place one"}
+
+    def test_shard_index(self):
+        assert shard_index("pleiades:295374", 7) == shard_index("pleiades:295374", 7)
+        assert {shard_index(f"place-{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+    def test_write_shards(self, tmp_path):
+        places = {
+            f"place-{i}": Place(id=f"place-{i}", title=f"Place {i}") for i in range(25)
+        }
+        assert write_shards(tmp_path, places, shard_size=10) == (3, 3)
+        manifest = read_manifest(tmp_path)
+        assert manifest["places"] == 25
+        assert sum([s["places"] for s in manifest["shards"]]) == 25
+        assert sorted([p.name for p in tmp_path.iterdir()]) == sorted(
+            [MANIFEST_NAME] + [s["file"] for s in manifest["shards"]]
+        )
+        # unchanged shards are not rewritten
+        assert write_shards(tmp_path, places, shard_size=10, processes=2) == (0, 3)
+        places["place-3"].properties.title = "Changed"
+        assert write_shards(tmp_path, places, shard_size=10) == (1, 3)
+        # the shard count is kept as the places shrink, and grows with them
+        del places["place-3"]
+        assert write_shards(tmp_path, places, shard_size=100)[1] == 3
+        places.update({f"extra-{i}": Place(id=f"extra-{i}") for i in range(20)})
+        assert write_shards(tmp_path, places, shard_size=10) == (5, 5)
+        assert len(list(tmp_path.glob("shard-*.json"))) == 5
+
+    def test_manager_shards(self, tmp_path):
+        (tmp_path / "in").mkdir()
+        write_gazetteer(tmp_path / "in")
+        m = Manager()
+        m.load(str(tmp_path / "in"))
+        m.save("shards", str(tmp_path / "shards"), shard_size=2)
+        assert read_manifest(tmp_path / "shards")["places"] == len(m.apographe)
+        m2 = Manager()
+        m2.load(str(tmp_path / "shards"), processes=2)
+        assert sorted(m2.apographe.keys()) == sorted(m.apographe.keys())
+        for k, place in m.apographe.items():
+            assert m2.apographe[k].names.name_strings == place.names.name_strings
+
+    def test_shards_reloaded(self, tmp_path):
+        (tmp_path / "in").mkdir()
+        write_gazetteer(tmp_path / "in")
+        m = Manager()
+        m.load(str(tmp_path / "in"))
+        m.save("shards", str(tmp_path / "shards"), shard_size=2)
+        m2 = Manager()
+        m2.load(str(tmp_path / "shards"))
+        count = len(read_manifest(tmp_path / "shards")["shards"])
+        # reloaded places that have not changed are not rewritten
+        written = write_shards(tmp_path / "shards", m2.apographe, shard_size=2)
+        assert written == (0, count)
+        content = (tmp_path / "shards" / "shard-00000.json").read_text("utf-8")
+        assert "id_internal" not in content
+
+    def test_shards_collisions(self, tmp_path):
+        (tmp_path / "in").mkdir()
+        write_gazetteer(tmp_path / "in")
+        m = Manager()
+        m.load(str(tmp_path / "in"))
+        m.save("shards", str(tmp_path / "shards"), shard_size=2)
+        m2 = Manager()
+        m2.apographe["place-0"] = Place(id="internal", title="Internal")
+        m2.load(str(tmp_path / "shards"))
+        # places already loaded are kept and colliding shard places are rekeyed
+        assert m2.apographe["place-0"].id == "internal"
+        assert len(m2.apographe) == len(m.apographe) + 1
+        rekeyed = [k for k in m2.apographe.keys() if k.startswith("shard-")]
+        assert [m2.apographe[k].id for k in rekeyed] == ["place-0"]
@@ -0,0 +1,36 @@
+#
+# This file is part of apographe
+# by Tom Elliott for the Institute for the Study of the Ancient World
+# (c) Copyright 2022 by New York University
+# Licensed under the AGPL-3.0; see LICENSE.txt file.
+#
+
+"""
+Test the apographe.text module
+"""
+
+from apographe.text import name_key, normtext, phonetic_key
+
+
+class TestNormtext:
+    def test_normtext(self):
+        assert normtext("  Zucchabar \t Miliana ") == "Zucchabar Miliana"
+
+
+class TestNameKey:
+    def test_name_key(self):
+        assert name_key("Zouchábbari (2)") == "zouchabbari"
+        assert name_key("Ζουχάββαρις") == "ζουχαββαρισ"
+        assert name_key("Łódź") == "lodz"
+        assert name_key("Straße") == "strasse"
+        assert name_key("ﬁnis") == "finis"
+        assert name_key("1, 2") == ""
+
+    def test_phonetic_key(self):
+        assert phonetic_key("zucchabar") == "zukabar"
+        assert phonetic_key("zoukhabbar") == "zukabar"
+        assert phonetic_key("hierapolis") == phonetic_key("ierapolis") == "ierapolis"
+        assert phonetic_key("philippi") == "filipi"
+        assert phonetic_key("caesarea") == "kesarea"
+        assert phonetic_key("ζουχαββαρ") == ""
+        assert phonetic_key("") == ""
@@ -9,11 +9,48 @@
 Test the apographe.web module
 """
 
-from apographe.web import BackendWeb
+from apographe.cache import response_store
+from apographe.mockserver import MockGazetteerServer
+from apographe.pleiades import Pleiades
+from apographe.scheduler import scheduler
+from apographe.web import BackendWeb, valid_uri
 import pytest
+from requests_cache import CachedSession
+from time import monotonic, sleep
+from types import SimpleNamespace
 from webiquette.webi import Webi
 
 
+class CachingInterface:
+    """Pretend to be a webiquette interface over a requests-cache session."""
+
+    def __init__(self, cached: set):
+        self.headers = {"User-Agent": "ApographeTester/0.0.1"}
+        self.session = self
+        self.cached = cached
+        self.fetched = list()
+
+    def get(self, uri, headers=None, only_if_cached=False):
+        if only_if_cached:
+            if uri in self.cached:
+                return SimpleNamespace(status_code=200, from_cache=True, uri=uri)
+            return SimpleNamespace(status_code=504, from_cache=False, uri=uri)
+        self.fetched.append(uri)
+        return SimpleNamespace(status_code=200, from_cache=False, uri=uri)
+
+
+class SessionInterface:
+    """Pretend to be a webiquette interface, over a requests-cache session."""
+
+    def __init__(self):
+        self.headers = {"User-Agent": "ApographeTester/0.0.1"}
+        # store responses but revalidate them on every use
+        self.session = CachedSession(backend="memory", expire_after=0)
+
+    def get(self, uri):
+        return self.session.get(uri, headers=self.headers)
+
+
 class TestBackendWeb:
     wb = None
 
@@ -37,3 +74,66 @@ class TestBackendWeb:
         assert config["get"]
         # search TBD
         self.wb.backend = "web"
+
+    def test_valid_uri(self):
+        assert valid_uri(
+            "https://pleiades.stoa.org/search_rss?SearchableText=Zucchabar"
+        )
+        assert valid_uri("http://localhost:8000/search_rss")
+        assert valid_uri("http://127.0.0.1:8000/search.json?q=Miliana")
+        assert not valid_uri("ftp://pleiades.stoa.org/")
+        assert not valid_uri("pleiades.stoa.org/search_rss")
+        assert not valid_uri("http://localhost:99999/")
+
+    def test_fetch_cached(self):
+        netloc = "cached.example.org"
+        wb = BackendWeb(place_netloc=netloc, search_netloc=netloc)
+        hit = f"https://{netloc}/places/1"
+        miss = f"https://{netloc}/places/2"
+        interface = CachingInterface({hit})
+        # a cache hit neither waits for the host's schedule nor reaches the host
+        assert wb._web_fetch(interface, netloc, hit).from_cache
+        assert scheduler.metrics(netloc)["requests"] == 0
+        assert interface.fetched == []
+        assert not wb._web_fetch(interface, netloc, miss).from_cache
+        assert scheduler.metrics(netloc)["requests"] == 1
+        assert interface.fetched == [miss]
+
+    def test_robots_crawl_delay(self):
+        with MockGazetteerServer(crawl_delay=1) as server:
+            for i in range(2):
+                server.add_place("pleiades", str(i), {"title": f"Place {i}"})
+            p = Pleiades(**server.gazetteer_kwargs())
+            start = monotonic()
+            for i in range(2):
+                assert p._web_get(str(i)).json() == {"title": f"Place {i}"}
+            assert monotonic() - start >= 1.0
+            m = scheduler.metrics(server.netloc)
+            assert m["crawl_delay"] == 1.0
+            assert m["concurrency"] == 1
+
+    def test_stale_while_revalidate(self):
+        with MockGazetteerServer() as server:
+            server.add_response(
+                "/places/295374/json",
+                b'{"title": "Zucchabar"}',
+                headers={"ETag": '"v1"'},
+            )
+            kwargs = server.gazetteer_kwargs()
+            kwargs["respect_robots_txt"] = False
+            p = Pleiades(**kwargs)
+            assert p.backend_configuration("web")["stale_while_revalidate"] == 0
+            p = Pleiades(stale_while_revalidate=60, revalidate_after=0, **kwargs)
+            p.backend_configuration("web")["place_interface"] = SessionInterface()
+            r = p._web_get("295374")
+            assert r.json() == {"title": "Zucchabar"}
+            assert server.stats["status"] == {200: 1}
+            # the stored copy is served at once and revalidated in the background
+            assert p._web_get("295374") is r
+            uri = f"http://{server.netloc}/places/295374/json"
+            start = monotonic()
+            while not response_store.claim(uri):
+                assert monotonic() - start < 10
+                sleep(0.01)
+            response_store.release(uri)
+            assert server.stats["status"] == {200: 1, 304: 1}